@@ -98,7 +98,7 @@ You do the same thing for the y axis...
 import math
 
 
-__all__ = ('S', 'C', 'E', 'to_S', 'to_C', 'to_E', 'Si', 'Ci', 'Ei', 'half')
+__all__ = ('S', 'C', 'E', 'to_S', 'to_C', 'to_E', 'Si', 'Ci', 'Ei', 'Sis', 'Cis', 'Eis', 'half')
 
 
 #              horz    vert
@@ -107,6 +107,11 @@ START = 1   #  LEFT    TOP
 CENTER = 2  # CENTER  MIDDLE
 END = 3     #  RIGHT  BOTTOM
 
+# A pos never changes once it's created.  So the S, C and E conversions (and + and -) return the
+# same instance each time for the same i, rather than creating a new one.  These are cached for
+# 0 <= i < Cache_size, which covers the screen.
+Cache_size = 4096
+
 
 def half(length):
     r'''Returns half the length, rounding up.
@@ -142,7 +147,25 @@ class pos:
     C(14)
     >>> S(10) - 4
     S(6)
+
+    The conversions check that they come out as integers, unless python is run with -O (which also
+    turns off the asserts).  They do half inline, to save the call.
+
+    The results come from the cache (see Cache_size):
+
+    >>> S(10).C(9) is S(12).C(5)
+    True
+    >>> S(10) + 4 is S(16) - 2
+    True
+
+    Si, Ci and Ei are the same as S, C and E (without the checks), but return the integer, so no pos
+    is needed at all:
+
+    >>> C(10).Si(9), C(10).Ci(9), C(10).Ei(9)
+    (6, 10, 14)
     '''
+    __slots__ = ('i',)
+
     def __init__(self, i):
         self.i = i
 
@@ -153,19 +176,41 @@ class pos:
         return self
 
     def __add__(self, i):
-        return self.__class__(self.i + i)
+        i += self.i
+        if i.__class__ is int and 0 <= i < Cache_size:
+            return self.cache[i] or self.cached(i)
+        return self.__class__(i)
 
     def __sub__(self, i):
-        return self.__class__(self.i - i)
+        i = self.i - i
+        if i.__class__ is int and 0 <= i < Cache_size:
+            return self.cache[i] or self.cached(i)
+        return self.__class__(i)
+
+    @classmethod
+    def cached(cls, i):
+        r'''Creates cls(i) and puts it in the cache.
+        '''
+        ans = cls.cache[i] = cls(i)
+        return ans
 
     def as_S(self):
-        return S(self.i)
+        i = self.i
+        if i.__class__ is int and 0 <= i < Cache_size:
+            return S_cache[i] or S.cached(i)
+        return S(i)
 
     def as_C(self):
-        return C(self.i)
+        i = self.i
+        if i.__class__ is int and 0 <= i < Cache_size:
+            return C_cache[i] or C.cached(i)
+        return C(i)
 
     def as_E(self):
-        return E(self.i)
+        i = self.i
+        if i.__class__ is int and 0 <= i < Cache_size:
+            return E_cache[i] or E.cached(i)
+        return E(i)
 
 class S(pos):
     r'''START pos.
@@ -182,21 +227,39 @@ class S(pos):
         >>> s - 4
         S(6)
     '''
+    __slots__ = ()
+    cache = [None] * Cache_size
+
     def S(self, length):
         return self
 
     def C(self, length):
-        ans = self.i + half(length)
-        if not isinstance(ans, int):
-            raise AssertionError(f"S({self.i}).C({length}) is not an integer, got {ans}")
+        ans = self.i + length // 2
+        if __debug__:
+            if not isinstance(ans, int):
+                raise AssertionError(f"S({self.i}).C({length}) is not an integer, got {ans}")
+        if 0 <= ans < Cache_size:
+            return C_cache[ans] or C.cached(ans)
         return C(ans)
 
     def E(self, length):
         ans = self.i + (length - 1)
-        if not isinstance(ans, int):
-            raise AssertionError(f"S({self.i}).E({length}) is not an integer, got {ans}")
+        if __debug__:
+            if not isinstance(ans, int):
+                raise AssertionError(f"S({self.i}).E({length}) is not an integer, got {ans}")
+        if 0 <= ans < Cache_size:
+            return E_cache[ans] or E.cached(ans)
         return E(ans)
 
+    def Si(self, length):
+        return self.i
+
+    def Ci(self, length):
+        return self.i + length // 2
+
+    def Ei(self, length):
+        return self.i + (length - 1)
+
 class C(pos):
     r'''CENTER pos.
 
@@ -208,21 +271,39 @@ class C(pos):
         >>> c.E(3)
         E(11)
     '''
+    __slots__ = ()
+    cache = [None] * Cache_size
+
     def S(self, length):
-        ans = self.i - half(length)
-        if not isinstance(ans, int):
-            raise AssertionError(f"C({self.i}).S({length}) is not an integer, got {ans}")
+        ans = self.i - length // 2
+        if __debug__:
+            if not isinstance(ans, int):
+                raise AssertionError(f"C({self.i}).S({length}) is not an integer, got {ans}")
+        if 0 <= ans < Cache_size:
+            return S_cache[ans] or S.cached(ans)
         return S(ans)
 
     def C(self, length):
         return self
 
     def E(self, length):
-        ans = self.i + half(length)
-        if not isinstance(ans, int):
-            raise AssertionError(f"C({self.i}).E({length}) is not an integer, got {ans}")
+        ans = self.i + length // 2
+        if __debug__:
+            if not isinstance(ans, int):
+                raise AssertionError(f"C({self.i}).E({length}) is not an integer, got {ans}")
+        if 0 <= ans < Cache_size:
+            return E_cache[ans] or E.cached(ans)
         return E(ans)
 
+    def Si(self, length):
+        return self.i - length // 2
+
+    def Ci(self, length):
+        return self.i
+
+    def Ei(self, length):
+        return self.i + length // 2
+
 class E(pos):
     r'''END pos.
 
@@ -234,21 +315,43 @@ class E(pos):
         >>> e.E(3)
         E(10)
     '''
+    __slots__ = ()
+    cache = [None] * Cache_size
+
     def S(self, length):
         ans = self.i - (length - 1)
-        if not isinstance(ans, int):
-            raise AssertionError(f"E({self.i}).S({length}) is not an integer, got {ans}")
+        if __debug__:
+            if not isinstance(ans, int):
+                raise AssertionError(f"E({self.i}).S({length}) is not an integer, got {ans}")
+        if 0 <= ans < Cache_size:
+            return S_cache[ans] or S.cached(ans)
         return S(ans)
 
     def C(self, length):
-        ans = self.i - half(length)
-        if not isinstance(ans, int):
-            raise AssertionError(f"E({self.i}).C({length}) is not an integer, got {ans}")
+        ans = self.i - length // 2
+        if __debug__:
+            if not isinstance(ans, int):
+                raise AssertionError(f"E({self.i}).C({length}) is not an integer, got {ans}")
+        if 0 <= ans < Cache_size:
+            return C_cache[ans] or C.cached(ans)
         return C(ans)
 
     def E(self, length):
         return self
 
+    def Si(self, length):
+        return self.i - (length - 1)
+
+    def Ci(self, length):
+        return self.i - length // 2
+
+    def Ei(self, length):
+        return self.i
+
+S_cache = S.cache
+C_cache = C.cache
+E_cache = E.cache
+
 
 def to_S(some_pos, length):
     return some_pos.S(length)
@@ -273,7 +376,7 @@ def Si(some_pos, length):
     10
     '''
     if isinstance(some_pos, pos):
-        return some_pos.S(length).i
+        return some_pos.Si(length)
     else:
         return some_pos
 
@@ -290,7 +393,7 @@ def Ci(some_pos, length):
     10
     '''
     if isinstance(some_pos, pos):
-        return some_pos.C(length).i
+        return some_pos.Ci(length)
     else:
         return some_pos
 
@@ -307,11 +410,35 @@ def Ei(some_pos, length):
     10
     '''
     if isinstance(some_pos, pos):
-        return some_pos.E(length).i
+        return some_pos.Ei(length)
     else:
         return some_pos
 
 
+def Sis(positions, lengths):
+    r'''Returns a list of the Si of each of the positions, relative to its length.
+
+    >>> Sis((S(10), C(10), E(10), 4), (9, 9, 5, 9))
+    [10, 6, 6, 4]
+    '''
+    return [Si(some_pos, length) for some_pos, length in zip(positions, lengths)]
+
+def Cis(positions, lengths):
+    r'''Returns a list of the Ci of each of the positions, relative to its length.
+
+    >>> Cis((S(10), C(10), E(10), 4), (9, 9, 5, 9))
+    [14, 10, 8, 4]
+    '''
+    return [Ci(some_pos, length) for some_pos, length in zip(positions, lengths)]
+
+def Eis(positions, lengths):
+    r'''Returns a list of the Ei of each of the positions, relative to its length.
+
+    >>> Eis((S(10), C(10), E(10), 4), (9, 9, 5, 9))
+    [18, 14, 10, 4]
+    '''
+    return [Ei(some_pos, length) for some_pos, length in zip(positions, lengths)]
+
 
 if __name__ == "__main__":
     import doctest
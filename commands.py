@@ -57,16 +57,53 @@ class Command:
         self.touch = touch
 
 class ControlChange(Command):
-    def __init__(self, channel, param, multiplier=1, send_msb_lsb=False):
+    r'''Sends a ControlChangeEvent each time the value changes.
+
+    If min_interval (secs) is given, this sends at most one value every min_interval secs.  Values
+    that come in faster than that are held back, and only the last one is sent once min_interval has
+    passed.
+    '''
+    def __init__(self, channel, param, multiplier=1, send_msb_lsb=False, min_interval=None):
        #print(f"ControlChange({channel=}, {param=}, {multiplier=}, {send_msb_lsb=}")
         self.channel = channel
         self.param = param
         self.multiplier = multiplier
         self.send_msb_lsb = send_msb_lsb
+        self.min_interval = min_interval
+        self.next_send_time = 0      # traffic_cop.get_time() when the next value may be sent
+        self.pending_value = None    # value held back by min_interval
+        self.alarm = None
 
     def value_change(self, value):
         r'''Returns True if screen changed.
         '''
+        if self.min_interval is not None:
+            now = traffic_cop.get_time()
+            if now < self.next_send_time:
+                if self.pending_value is None:
+                    if self.alarm is None:
+                        self.alarm = traffic_cop.set_alarm(self.next_send_time - now,
+                                                           self.send_pending)
+                    else:
+                        self.alarm.reschedule(self.next_send_time - now)
+                self.pending_value = value
+                return False
+            self.next_send_time = now + self.min_interval
+        self.send(value)
+        return False
+
+    def send_pending(self):
+        r'''Alarm fn to send the value held back by min_interval.
+
+        Returns True if screen changed.
+        '''
+        value = self.pending_value
+        self.pending_value = None
+        self.next_send_time = traffic_cop.get_time() + self.min_interval
+        self.send(value)
+        return False
+
+    def send(self, value):
        #print(f"sending ControlChangeEvent channel={self.channel}, param={hex(self.param)}, "
        #      f"value={value * self.multiplier}")
         value *= self.multiplier
@@ -78,7 +115,6 @@ class ControlChange(Command):
         else:
             midi_io.send_midi_event(
               midi_io.ControlChangeEvent(self.channel, self.param, value))
-        return False
 
 class SystemCommon(Command):
     def __init__(self, status):
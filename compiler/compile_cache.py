@@ -0,0 +1,143 @@
+# compile_cache.py
+
+r'''The on-disk cache used by compiler.py --incremental.
+
+The cache keeps:
+
+    - each YAML document, parsed, by the hash of its text.  So only the documents that were edited
+      are parsed again.
+    - each widget's generated code, init_params and draw_params, by the widget's key.
+
+A widget's key is the hash of its name, its spec, its geometry fold (see fold.py), the attrs that
+lean.py has to keep, and the keys of the widgets it depends on (any string in its spec that names a
+widget compiled before it, or a widget_stub).  So editing a widget changes its key, and the keys of everything using it, and those
+are the only widgets compiled again.  The other widgets come out of the cache as a cached_widget
+(see widgets.py), which is all that the widgets using them need.
+
+The cache is thrown away if any of the compiler's .py files change.
+'''
+
+import os
+import re
+import pickle
+import hashlib
+from collections import namedtuple
+
+from yaml import load
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+__all__ = "compile_cache cache_entry".split()
+
+
+Document_separator = re.compile(r'^---[ \t]*$', re.MULTILINE)
+
+cache_entry = namedtuple("cache_entry", "code init_params draw_params skip")
+
+
+def digest(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def compiler_version():
+    r'''Returns the hash of the compiler's source code.
+    '''
+    hash = hashlib.sha1()
+    compiler_dir = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(compiler_dir)):
+        if filename.endswith('.py'):
+            with open(os.path.join(compiler_dir, filename), 'rb') as file:
+                hash.update(file.read())
+    return hash.hexdigest()
+
+def gen_strings(spec):
+    r'''Generates all of the str values in spec (not the keys), at any depth.
+    '''
+    if isinstance(spec, str):
+        yield spec
+    elif isinstance(spec, dict):
+        for value in spec.values():
+            yield from gen_strings(value)
+    elif isinstance(spec, list):
+        for value in spec:
+            yield from gen_strings(value)
+
+class compile_cache:
+    def __init__(self, filename):
+        self.filename = filename
+        self.version = compiler_version()
+        self.documents = {}        # {text hash: pickled document} from the last run
+        self.widgets = {}          # {key: cache_entry} from the last run
+        try:
+            with open(filename, 'rb') as file:
+                cache = pickle.load(file)
+            if cache['version'] == self.version:
+                self.documents = cache['documents']
+                self.widgets = cache['widgets']
+            else:
+                print("compile_cache: compiler changed, cache ignored")
+        except FileNotFoundError:
+            pass
+        self.new_documents = {}    # for the next run
+        self.new_widgets = {}
+        self.keys = {}             # {name: key} of the widgets and widget_stubs seen this run
+        self.parsed = self.hits = self.misses = 0
+
+    def load_documents(self, yaml_filename):
+        r'''Generates the documents in yaml_filename, only parsing the ones that have changed.
+
+        The documents are new copies, so the compiler is free to change them.
+        '''
+        with open(yaml_filename, "r") as yaml_file:
+            text = yaml_file.read()
+        for document_text in Document_separator.split(text):
+            text_hash = digest(document_text)
+            pickled = self.new_documents.get(text_hash) or self.documents.get(text_hash)
+            if pickled is None:
+                pickled = pickle.dumps(load(document_text, Loader=SafeLoader))
+                self.parsed += 1
+            self.new_documents[text_hash] = pickled
+            document = pickle.loads(pickled)
+            if document is not None:
+                yield document
+
+    def add_stub(self, name, args):
+        self.keys[name] = digest(repr((name, args)))
+
+    def widget_key(self, name, spec, fold=None, lean_key=None):
+        r'''Returns the key for the widget.  Must be called before the spec is compiled.
+        '''
+        hash = hashlib.sha1(repr((name, spec, fold, lean_key)).encode())
+        for dep in sorted(set(gen_strings(spec)).intersection(self.keys.keys())):
+            hash.update(f"{dep}={self.keys[dep]}".encode())
+        key = self.keys[name] = hash.hexdigest()
+        return key
+
+    def lookup(self, key):
+        r'''Returns the cache_entry for the widget, or None.
+        '''
+        entry = self.widgets.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.new_widgets[key] = entry
+            return entry
+        self.misses += 1
+        return None
+
+    def add(self, key, entry):
+        self.new_widgets[key] = entry
+
+    def save(self):
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, 'wb') as file:
+            pickle.dump(dict(version=self.version,
+                             documents=self.new_documents,
+                             widgets=self.new_widgets),
+                        file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, self.filename)
+
+    def stats(self):
+        return (f"compile_cache: parsed {self.parsed} of {len(self.new_documents)} documents, "
+                f"widgets: {self.hits} cached, {self.misses} compiled")
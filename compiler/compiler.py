@@ -1,49 +1,112 @@
 # compiler.py
 
+import sys
+import os
+import io
+import time
+import pickle
 import argparse
+import tempfile
+import subprocess
 
 from yaml import safe_load_all
 
 from indenter import indenter
 from widgets import *
+from compile_cache import *
+from lean import *
 
 
-def read_yaml(yaml_filename, trace_widgets):
-    with open(yaml_filename, "r") as yaml_file:
-        for document in safe_load_all(yaml_file):
-            process(document, trace_widgets)
+Fold_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fold.py")
 
-def process(document, trace_widgets):
+Module_widgets = {}     # {module_name: [widget_name]}, for fold.py
+
+
+def read_yaml(yaml_filename, trace_widgets, cache=None, folds=None, lean=None):
+    r'''Compiles all of the modules in yaml_filename.
+
+    If cache is given (a compile_cache), only the widgets that changed since the last run (or that
+    depend on widgets that changed) are compiled, the rest come out of the cache.
+
+    If folds is given (from measure_folds), the widgets in it get a Folded table (see fold.py).
+
+    If lean is given (a lean_classes), the widget classes get __slots__, and lose the attrs only
+    used in __init__ (see lean.py).
+    '''
+    if cache is None:
+        with open(yaml_filename, "r") as yaml_file:
+            for document in safe_load_all(yaml_file):
+                process(document, trace_widgets, folds=folds, lean=lean)
+    else:
+        for document in cache.load_documents(yaml_filename):
+            process(document, trace_widgets, cache, folds, lean)
+        cache.save()
+
+def measure_folds(roots=None):
+    r'''Runs fold.py on the modules just generated (in the current directory).
+
+    Returns the folds, {class_name: fold}.
+    '''
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folds_filename = os.path.join(temp_dir, "folds")
+        command = [sys.executable, Fold_py]
+        if roots is not None:
+            command.extend(('--roots', roots))
+        command.append(folds_filename)
+        command.extend(f"{module_name}={','.join(names)}"
+                       for module_name, names in Module_widgets.items())
+        if subprocess.run(command).returncode:
+            sys.exit("compiler: --fold failed, nothing folded")
+        with open(folds_filename, 'rb') as folds_file:
+            return pickle.load(folds_file)
+
+def process(document, trace_widgets, cache=None, folds=None, lean=None):
     if 'module' in document:
         filename = document['module'] + '.py'
         print()
         print("module", filename)
-        with open(filename, 'w') as out_file:
-            output = indenter(out_file, width=94)
-            output.print("#", filename)
+        text = io.StringIO()
+        output = indenter(text, width=94)
+        output.print("#", filename)
+        output.print()
+        if 'import' in document:
+            for imp in document['import']:
+                output.print(imp)
             output.print()
-            if 'import' in document:
-                for imp in document['import']:
-                    output.print(imp)
-                output.print()
-                output.print()
-            if 'include' in document:
-                text = document['include'].rstrip()
-                output.print(text)
-                output.print()
-            if 'widget_stubs' in document:
-                for name, args in document['widget_stubs'].items():
-                    Widgets[name] = widget_stub(name, layout=args.get('layout', ()),
-                                                      appearance=args.get('appearance', ()))
-            words = compile(document, output, trace_widgets)
             output.print()
-            output.print_head(f"__all__ = (", first_comma=False)
-            for word in words + document.get('add_to_all', []):
-                output.print_arg(f'"{word}"')
-            output.print_tail(')')
+        if 'include' in document:
+            output.print(document['include'].rstrip())
             output.print()
+        if 'widget_stubs' in document:
+            for name, args in document['widget_stubs'].items():
+                Widgets[name] = widget_stub(name, layout=args.get('layout', ()),
+                                                  appearance=args.get('appearance', ()))
+                if cache is not None:
+                    cache.add_stub(name, args)
+        words = compile(document, output, trace_widgets, cache, folds, lean)
+        Module_widgets[document['module']] = words
+        output.print()
+        output.print_head(f"__all__ = (", first_comma=False)
+        for word in words + document.get('add_to_all', []):
+            output.print_arg(f'"{word}"')
+        output.print_tail(')')
+        output.print()
+        write_if_changed(filename, text.getvalue())
+
+def write_if_changed(filename, text):
+    r'''Doesn't touch filename if it already has text in it.
+    '''
+    try:
+        with open(filename, 'r') as in_file:
+            if in_file.read() == text:
+                print("  unchanged")
+                return
+    except FileNotFoundError:
+        pass
+    with open(filename, 'w') as out_file:
+        out_file.write(text)
 
-def compile(document, output, trace_widgets):
+def compile(document, output, trace_widgets, cache=None, folds=None, lean=None):
     words = []
     for name in document.keys():
         if name not in 'module import include add_to_all widget_stubs'.split():
@@ -51,30 +114,82 @@ def compile(document, output, trace_widgets):
             if spec.get('skip', False):
                 continue
             trace = name in trace_widgets  # turns on trace: from yaml
+            fold = folds.get(name) if folds is not None else None
+            if cache is not None:
+                key = cache.widget_key(name, spec, fold, lean and lean.key)
+                if not trace:   # always compile traced widgets, to get the trace output
+                    entry = cache.lookup(key)
+                    if entry is not None:
+                        Widgets[name] = cached_widget(name, entry.init_params, entry.draw_params)
+                        if entry.code:
+                            output.print(entry.code, end='')
+                        if not entry.skip:
+                            words.append(name)
+                        continue
             print("  compiling", name)
+            text = io.StringIO()
+            widget_output = indenter(text, width=output.width)
             spec_copy = spec.copy()
             for cls in Widget_types:
                 cls_name = cls.__name__
                 if cls_name in spec_copy:
-                    widget = cls(name, spec_copy, output, trace)
+                    widget = cls(name, spec_copy, widget_output, trace)
                     break
             else:
                 raise ValueError(f"compile: unknown spec type for {name=}")
+            widget.fold = fold
             widget.generate_widget()
+            code = text.getvalue()
+            if code and lean is not None and widget.use_self:
+                code = lean(code, output.width)
+            if code:
+                output.print(code, end='')
             if not widget.skip:
                 words.append(name)
+            if cache is not None:
+                cache.add(key, cache_entry(code, widget.init_params(),
+                                           widget.draw_params(), widget.skip))
     return words
 
 
 def run():
     parser = argparse.ArgumentParser()
     parser.add_argument("--trace", '-t', nargs='+', default=(), help="list of widgets to trace")
+    parser.add_argument("--incremental", '-i', action='store_true', default=False,
+                        help="only compile the widgets that changed since the last --incremental")
+    parser.add_argument("--cache", '-c', default=".compile_cache",
+                        help="cache file for --incremental, default %(default)s")
+    parser.add_argument("--fold", '-f', action='store_true', default=False,
+                        help="measure the widgets with fold.py, then compile again with the "
+                             "geometry folded into Folded tables")
+    parser.add_argument("--fold-roots", metavar="MODULE.NAME",
+                        help="more calls for --fold to measure, e.g., exp_console.Panel_specs")
+    parser.add_argument("--no-lean", dest='lean', action='store_false', default=True,
+                        help="don't give the widget classes __slots__, or drop the attrs only "
+                             "used in __init__")
     parser.add_argument("yaml_file")
 
     args = parser.parse_args()
     print("args", args)
 
-    read_yaml(args.yaml_file, args.trace)
+    start_time = time.perf_counter()
+    cache = compile_cache(args.cache) if args.incremental else None
+    lean = lean_classes.from_files(args.yaml_file) if args.lean else None
+    if args.fold:
+        # fold.py measures all of the attrs, so these are compiled without lean
+        read_yaml(args.yaml_file, args.trace, cache)
+        print()
+        print("measuring folds")
+        folds = measure_folds(args.fold_roots)
+        read_yaml(args.yaml_file, args.trace, cache, folds, lean)
+    else:
+        read_yaml(args.yaml_file, args.trace, cache, lean=lean)
+    if cache is not None:
+        print()
+        print(cache.stats())
+    if lean is not None:
+        print(lean.stats())
+    print(f"compiled in {(time.perf_counter() - start_time) * 1000:.0f} mSec")
 
 
 
@@ -0,0 +1,187 @@
+# fold.py
+
+r'''Measures the geometry of the generated widgets, for compiler.py --fold.
+
+    python fold.py [--roots module.name] folds_file module=widget,widget... module=widget,widget...
+
+This runs in its own process, with local_midi and headless standing in for alsa_midi and pyray (so
+the font metrics come from headless.Font, which measures the same as raylib).  It imports the
+(unfolded) generated modules from the current directory, and calls each widget with its default
+args, twice, with different names.  Every widget __init__ run during this is recorded.  The widgets
+that need args (e.g., placeholders) fail, and are just skipped.
+
+The --roots are more calls to make (twice, in the same way), to cover the args the program really
+uses.  module.name is a list of (widget, kwargs), or a dict of these lists (e.g.,
+exp_console.Panel_specs).
+
+For each widget class, the result is what the compiler needs to generate its Folded table:
+
+    {class_name: (key_pnames, list_pnames, attr_values)}
+
+where attr_values is {key: {attr: value_source}}.  The key is the tuple of the args to __init__
+(all but name and trace, lists as tuples), for the calls where these were all constants.  The attrs
+are the ones that came out the same every time for that key, and that have an immutable constant
+value (value_source is its repr, or Vector2(x, y)).
+
+The folds are pickled into folds_file.
+'''
+
+import sys
+import os
+import pickle
+import inspect
+from collections import defaultdict
+
+
+Not_in_key = frozenset(('self', 'name', 'trace'))
+
+class unfoldable(Exception):
+    pass
+
+class no_font_metrics(Exception):
+    pass
+
+def freeze(value):
+    r'''Returns value as a hashable constant, with lists as tuples.
+
+    Raises unfoldable if it isn't a constant.
+    '''
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return tuple(freeze(v) for v in value)
+    raise unfoldable
+
+def value_source(value, Vector2):
+    r'''Returns the source code for value, or None if it can't be folded.
+    '''
+    if isinstance(value, Vector2):
+        return f"Vector2({value.x!r}, {value.y!r})"
+    if isinstance(value, list):
+        return None   # mutable, can't share one list between the instances
+    try:
+        return repr(freeze(value))
+    except unfoldable:
+        return None
+
+def get_attrs(obj):
+    r'''Returns {attr: value} for obj, from its __slots__ (see lean.py), or its __dict__.
+    '''
+    attrs = dict(getattr(obj, '__dict__', ()))
+    for attr in getattr(obj.__class__, '__slots__', ()):
+        if attr != '__dict__' and hasattr(obj, attr):
+            attrs[attr] = getattr(obj, attr)
+    return attrs
+
+def instrument(cls, records):
+    r'''Wraps cls.__init__ to append (args, attrs) to records for each call.
+    '''
+    init = cls.__init__
+    signature = inspect.signature(init)
+
+    def __init__(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        records.append((dict(bound.arguments), get_attrs(self)))
+
+    cls.__init__ = __init__
+
+def fold(records, Vector2):
+    r'''Returns key_pnames, list_pnames, attr_values for one class's records.
+    '''
+    key_pnames = None
+    list_pnames = set()
+    values = defaultdict(dict)   # {key: {attr: value_source or None}}
+    counts = defaultdict(int)    # {key: number of records}
+    for args, attrs in records:
+        if key_pnames is None:
+            key_pnames = tuple(pname for pname in args if pname not in Not_in_key)
+        try:
+            key = tuple(freeze(args[pname]) for pname in key_pnames)
+        except unfoldable:
+            continue
+        list_pnames.update(pname for pname in key_pnames if isinstance(args[pname], list))
+        counts[key] += 1
+        key_values = values[key]
+        for attr, value in attrs.items():
+            source = value_source(value, Vector2)
+            if attr not in key_values:
+                key_values[attr] = source
+            elif key_values[attr] != source:
+                key_values[attr] = None    # depends on something other than the key
+    # only the keys seen under both names, so the names can't have made a difference
+    attr_values = {key: {attr: source for attr, source in key_values.items() if source is not None}
+                   for key, key_values in values.items() if counts[key] > 1}
+    return key_pnames, list_pnames, attr_values
+
+def gen_roots(roots):
+    r'''Generates (widget, kwargs) from roots, a list of these or a dict of lists of these.
+    '''
+    if isinstance(roots, dict):
+        for calls in roots.values():
+            yield from calls
+    else:
+        yield from roots
+
+def measure(module_widgets, roots_name=None):
+    r'''module_widgets is {module_name: [widget_name]}.
+    '''
+    import importlib
+    import local_midi
+    local_midi.install()
+    import headless
+    headless.install()
+    if headless.ImageFont is None:
+        # headless would just guess at the text sizes, and these would end up in the Folded tables
+        raise no_font_metrics("Pillow is not installed, so headless.Font can't measure text the "
+                              "way raylib does.  Install Pillow to use --fold.")
+    import screen
+
+    records = defaultdict(list)   # {class_name: [(args, attrs)]}
+    widgets = []
+    for module_name, names in module_widgets.items():
+        module = importlib.import_module(module_name)
+        for name in names:
+            widget = getattr(module, name)
+            if isinstance(widget, type):
+                instrument(widget, records[name])
+            widgets.append(widget)
+    calls = [(widget, {}) for widget in widgets]
+    if roots_name is not None:
+        roots_module, roots_attr = roots_name.rsplit('.', 1)
+        calls.extend(gen_roots(getattr(importlib.import_module(roots_module), roots_attr)))
+    with screen.Screen_class():       # loads the Fonts
+        for widget, kwargs in calls:
+            for name in "fold a", "fold b":
+                try:
+                    widget(name=name, **kwargs)
+                except Exception as e:
+                    print(f"fold: {widget.__name__}({kwargs}) failed, not folded: {e!r}")
+                    break
+    return {name: fold(class_records, headless.Vector2)
+            for name, class_records in records.items() if class_records}
+
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    roots_name = None
+    if args[0] == '--roots':
+        roots_name = args[1]
+        del args[:2]
+    folds_file = args[0]
+    module_widgets = {}
+    for arg in args[1:]:
+        module_name, names = arg.split('=', 1)
+        module_widgets[module_name] = names.split(',') if names else []
+
+    # the generated modules, then the console's modules, rather than the compiler's
+    sys.path[0] = os.getcwd()
+    sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        folds = measure(module_widgets, roots_name)
+    except no_font_metrics as e:
+        sys.exit(f"fold.py: {e}")
+    with open(folds_file, 'wb') as file:
+        pickle.dump(folds, file, pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,124 @@
+# lean.py
+
+r'''Makes the generated widget classes leaner, for compiler.py (unless --no-lean).
+
+Each class gets __slots__, so its instances don't each carry a __dict__.
+
+And the attrs that are only used in __init__ become local variables in __init__, so the instances
+don't keep them at all.  These are mostly the params copied down to a child widget (e.g.,
+border__background__width), and the intermediate values in the computed init exps (e.g., a
+static_text's msize).
+
+This works on the generated code of each class, rather than on the computed_init and computed_draw
+vars, because the includes and the fold tables also read and set attrs, and those are only known
+by their code.  An attr set in __init__ is dropped if:
+
+    - the class doesn't use self.<attr> anywhere outside of __init__,
+    - <attr> isn't already a local name in __init__ (e.g., a param),
+    - it isn't in Always_kept, and
+    - it isn't in keep.
+
+Keep is every .<attr> in the yaml file (the exps and includes of the other widgets) and in the
+hand-written modules next to it (see lean_classes.from_files), since these may read the attr.
+
+The placeholder widgets are set with setattr, so the classes with placeholders also get a
+__dict__ slot.
+'''
+
+import os
+import io
+import re
+import hashlib
+
+from indenter import indenter
+
+
+__all__ = "lean_classes".split()
+
+
+Always_kept = frozenset('name trace width height x_pos y_pos'.split())
+
+Self_attr = re.compile(r'\bself\.(\w+)')
+Set_attr = re.compile(r'^ *self\.(\w+) = ', re.MULTILINE)
+Set_attrs = re.compile(r'^ *\(((?:self\.\w+, )*self\.\w+)\) = ', re.MULTILINE)  # Folded tables
+Attr_ref = re.compile(r'\.([A-Za-z_]\w*)')
+Module_name = re.compile(r'^module:\s*(\w+)', re.MULTILINE)
+Class_attr = re.compile(r'^    (?:def (\w+)|(\w+) = )', re.MULTILINE)
+
+
+class lean_classes:
+    r'''Called on the generated code of one class, returns the leaner code.
+    '''
+    def __init__(self, keep):
+        self.keep = frozenset(keep)
+        self.key = hashlib.sha1(' '.join(sorted(self.keep)).encode()).hexdigest()
+        self.num_dropped = 0
+        self.num_classes = 0
+
+    @classmethod
+    def from_files(cls, yaml_filename):
+        r'''Keeps every .<attr> in yaml_filename, and in the .py files in its directory (but not
+        the modules generated from it).
+        '''
+        with open(yaml_filename, "r") as yaml_file:
+            text = yaml_file.read()
+        keep = set(Attr_ref.findall(text))
+        generated = {module_name + '.py' for module_name in Module_name.findall(text)}
+        directory = os.path.dirname(os.path.abspath(yaml_filename))
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.py') and filename not in generated:
+                with open(os.path.join(directory, filename), "r") as py_file:
+                    keep.update(Attr_ref.findall(py_file.read()))
+        return cls(keep)
+
+    def __call__(self, code, width=94):
+        lines = code.split('\n')
+        init_start, init_end = self.find_init(lines)
+        init_code = '\n'.join(lines[init_start:init_end])
+        other_code = '\n'.join(line for line in lines[:init_start] + lines[init_end:]
+                               if not line.lstrip().startswith('#'))
+        used_outside = set(Self_attr.findall(other_code))
+        set_attrs = Set_attr.findall(init_code)
+        for attrs in Set_attrs.findall(init_code):
+            set_attrs.extend(Self_attr.findall(attrs))
+        dropped = [attr for attr in dict.fromkeys(set_attrs)
+                   if attr not in used_outside and attr not in Always_kept
+                   and attr not in self.keep
+                   and not re.search(rf'(?<![\w.]){attr}\b', init_code)]
+        if dropped:
+            code = re.sub(rf"\bself\.({'|'.join(dropped)})\b", r'\1', code)
+        self.num_dropped += len(dropped)
+        self.num_classes += 1
+        return self.add_slots(code, width)
+
+    def stats(self):
+        return f"lean: dropped {self.num_dropped} attrs from {self.num_classes} classes"
+
+    def find_init(self, lines):
+        r'''Returns the start and end line numbers of the __init__ method.
+        '''
+        start = next(i for i, line in enumerate(lines) if line.startswith("    def __init__("))
+        for end in range(start + 1, len(lines)):
+            line = lines[end]
+            if line.startswith("    ") and not line.startswith("     "):
+                return start, end
+        return start, len(lines)
+
+    def add_slots(self, code, width):
+        r'''Adds __slots__ after the class line.
+        '''
+        class_line, body = code.split('\n', 1)
+        class_attrs = set(name for names in Class_attr.findall(body) for name in names)
+        slots = [attr for attr in dict.fromkeys(Self_attr.findall(body))
+                 if attr not in class_attrs]
+        if "setattr(self," in body:
+            slots.append("__dict__")
+        text = io.StringIO()
+        output = indenter(text, width)
+        output.indent()
+        output.print_head("__slots__ = (", first_comma=False)
+        for attr in slots:
+            output.print_arg(f'"{attr}"')
+        output.print_tail(')')
+        output.print()
+        return f"{class_line}\n{text.getvalue()}{body}"
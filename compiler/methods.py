@@ -6,7 +6,7 @@ from variable import *
 from tsort import tsort
 
 
-__all__ = "init_method specialize_fn draw_method clear_method".split()
+__all__ = "init_method specialize_fn draw_method flatten_method clear_method".split()
 
 
 class method:
@@ -141,7 +141,8 @@ class init_method(method):
         #print(f"{self.method_name}.load_create_widget(variable): {init_name=}")
         if init_name in self.widget.include:
             #print(f"{self.method_name}.load_create_widget(variable): {init_name=} found!")
-            self.output.print_block(self.widget.include.pop(init_name))
+            # popped by gen_computed, this may be loaded twice (see gen_folded)
+            self.output.print_block(self.widget.include[init_name])
         self.output.print_head(f"{variable.sname} = {variable.widget_name}(", first_comma=False)
         for arg in variable.args:
             self.output.print_arg(arg)
@@ -172,12 +173,49 @@ class init_method(method):
         # force generation of all computed names so that draw has access to them too.
         needed = set(self.widget.computed_init.gen_names())
 
-        for variable in tsort(self.computed_init, needed, self.trace):
+        variables = list(tsort(self.computed_init, needed, self.trace))
+        fold = self.widget.get_fold(variables)
+        if fold is None:
+            for variable in variables:
+                variable.load(self)
+            self.widget.init_calls()
+        else:
+            self.gen_folded(variables, *fold)
+        for variable in variables:
+            if isinstance(variable, computed_create_widget):
+                self.widget.include.pop(f"init_{variable.child_name}", None)
+
+    def gen_folded(self, variables, key_exps, snames, values):
+        r'''Generates the computed_init variables and init_calls with a fast path that gets the
+        snames from the Folded table, when the args are in it.
+        '''
+        self.output.print("try:")
+        self.output.indent()
+        self.output.print_args("folded = self.Folded.get((", key_exps,
+                               tail=',))' if len(key_exps) == 1 else '))', first_comma=False)
+        self.output.deindent()
+        self.output.print("except TypeError:     # unhashable arg")
+        self.output.indent()
+        self.output.print("folded = None")
+        self.output.deindent()
+        self.output.print("if folded is None:")
+        self.output.indent()
+        for variable in variables:
             variable.load(self)
-
-    def end(self):
         self.widget.init_calls()
+        self.output.deindent()
+        self.output.print("else:")
+        self.output.indent()
+        self.output.print_args("(", snames, tail=") = folded", first_comma=False)
+        for variable in variables:
+            if variable.sname not in snames:
+                variable.load(self)
+        if not all(f"self.{attr}" in snames for attr in self.widget.init_calls_attrs):
+            self.widget.init_calls()
+        self.output.deindent()
+        self.widget.folded = snames, values
 
+    def end(self):
         # FIX: what makes sense here?
         if self.widget.use_self:
             self.output.print("if self.trace:")
@@ -252,6 +290,36 @@ class draw_method(method):
         if 'draw_end' in self.widget.include:
             self.output.print_block(self.widget.include.pop('draw_end'))
 
+class flatten_method(draw_method):
+    r'''Generates flatten(self, ops, x_pos, y_pos, ...), which appends the widget's display list ops
+    to ops rather than drawing it (see display_list.py).
+
+    Must be generated after the draw_method, which does the computed_draw init.
+    '''
+    method_name = 'flatten'
+
+    def start(self):
+        self.output.print_head(f"def {self.method_name}(self, ops", first_comma=True)
+        for variable in self.gen_params():
+            self.output.print_arg(variable.as_param())
+        self.output.print_tail('):')
+
+    def gen_computed(self):
+        for variable in tsort(self.computed_draw, self.widget.flatten_needed(), self.trace):
+            variable.load(self)
+
+    def end(self):
+        if self.widget.flatten_fallback:
+            # draw code that flatten doesn't know about, so it's drawn by calling its draw
+            self.output.print("ops.append((display_list.draw_op, (self, self.x_pos, self.y_pos), "
+                              "0, 0))")
+            return
+        if 'flatten_before' in self.widget.include:
+            self.output.print_block(self.widget.include.pop('flatten_before'))
+        self.widget.output_flatten_calls(self)
+        if 'flatten_end' in self.widget.include:
+            self.output.print_block(self.widget.include.pop('flatten_end'))
+
 class clear_method(method):
     method_name = 'clear'
     param_vars = ()
@@ -5,10 +5,11 @@ from itertools import chain
 
 from methods import *
 from vars import *
+from variable import computed_create_widget
 
 
 __all__ = "raylib_call stacked column row panel specializes " \
-          "widget_stub Widget_types Widgets".split()
+          "widget_stub cached_widget Widget_types Widgets".split()
 
 
 Widgets = {}
@@ -27,9 +28,12 @@ class widget:
     element_widgets = ()   # widget names, excluding placeholders, used by translate_exp
     vars = (shortcuts, layout, appearance)
     computed_vars = (computed_init, computed_draw)
-    methods = (init_method, draw_method, clear_method)
+    methods = (init_method, draw_method, flatten_method, clear_method)
     use_ename = True
     use_self = True
+    fold = None            # from fold.py, set by compiler.compile for --fold
+    folded = None          # (snames, {key: [value_source]}) for the Folded table, see get_fold
+    init_calls_attrs = ()  # the attrs set by init_calls
 
     def __init__(self, name, spec, output, trace):
         r'''
@@ -50,6 +54,11 @@ class widget:
 
         self.include = self.spec.pop('include', {})
 
+        # draw code that flatten can't do, unless the include also has the flatten code for it
+        self.flatten_fallback = ('draw_before' in self.include or 'draw_end' in self.include) \
+                            and 'flatten_before' not in self.include \
+                            and 'flatten_end' not in self.include
+
         # create helpers
         if shortcuts not in self.vars:
             self.shortcuts = shortcuts({}, self, self.trace)
@@ -186,6 +195,33 @@ class widget:
         return {variable.ename: variable.sname
                 for variable in self.computed_draw.gen_variables()}
 
+    def get_fold(self, variables):
+        r'''Returns (key_exps, snames, values) for folding __init__, or None.
+
+        variables are the computed_init variables, in the order they are generated.  snames are the
+        ones (and init_calls_attrs) that fold.py found to be constants for every key in self.fold.
+        values is {key: [value_source]}, in snames order.
+        '''
+        if self.fold is None or not self.use_self:
+            return None
+        key_pnames, list_pnames, attr_values = self.fold
+        if not attr_values:
+            return None
+        attrs = [variable.sname[5:] for variable in variables
+                 if not isinstance(variable, computed_create_widget) and
+                    variable.sname.startswith("self.")]
+        attrs.extend(self.init_calls_attrs)
+        attrs = [attr for attr in dict.fromkeys(attrs)
+                 if all(attr in values for values in attr_values.values())]
+        if not attrs:
+            return None
+        # not tuple() on anything but a list, it might be an iterator that __init__ needs
+        key_exps = [f"tuple({pname}) if isinstance({pname}, list) else {pname}"
+                    if pname in list_pnames else pname
+                    for pname in key_pnames]
+        return (key_exps, [f"self.{attr}" for attr in attrs],
+                {key: [values[attr] for attr in attrs] for key, values in attr_values.items()})
+
     def generate_widget(self):
         self.start_class()
 
@@ -199,6 +235,7 @@ class widget:
         self.output.print_block(template.substitute(name=self.name))
 
         self.draw_method.gen_method()
+        self.flatten_method.gen_method()
         self.clear_method.gen_method()
 
         self.end_class()
@@ -210,6 +247,17 @@ class widget:
         self.output.indent()
 
     def end_class(self):
+        if self.folded is not None:
+            snames, values = self.folded
+            self.output.print(f"# compiler.py --fold: {{({', '.join(self.fold[0])}): "
+                              f"({', '.join(snames)})}}")
+            self.output.print("Folded = {")
+            self.output.indent()
+            for key, value_sources in values.items():
+                self.output.print(f"{key!r}: ({', '.join(value_sources)},),")
+            self.output.deindent()
+            self.output.print("}")
+            self.output.print()
         self.output.deindent()
 
     def init_calls(self):
@@ -218,6 +266,12 @@ class widget:
     def draw_needed(self):
         return ()
 
+    def flatten_needed(self):
+        return ()
+
+    def output_flatten_calls(self, method):
+        pass
+
     def clear_calls(self):
         r'''Return True if something was added.
         '''
@@ -230,6 +284,17 @@ class raylib_call(widget):
         raylib_call = self.spec.pop('raylib_call')
         self.raylib_fn = raylib_call.pop('name')    # something defined in pyray (raylib) library
         self.raylib_args = raylib_args(raylib_call.pop('args'), self, self.trace)
+
+        # optional [x, y, width, height] drawn on by the raylib_fn, passed to screen.damage
+        self.damage_args = raylib_args(raylib_call.pop('damage', ()), self, self.trace)
+
+        # optional [op, x, y] for flatten, op is one of the ops in display_list.py
+        display_op = raylib_call.pop('display_op', None)
+        if display_op is None:
+            self.flatten_fallback = True
+        else:
+            self.display_op = display_op[0]
+            self.display_args = raylib_args(display_op[1:], self, self.trace)
         if raylib_call:
             print(f"unknown keys in 'raylib_call' section for {self.name}, {tuple(raylib_call.keys())}")
 
@@ -238,10 +303,29 @@ class raylib_call(widget):
         for variable in self.raylib_args.gen_variables():
             self.output.print_arg(variable.exp)
         self.output.print_tail(")")
+        if self.damage_args.enames:
+            self.output.print_head("screen.damage(", first_comma=False)
+            for variable in self.damage_args.gen_variables():
+                self.output.print_arg(variable.exp)
+            self.output.print_tail(")")
 
     def draw_needed(self):
         needs = set()
         self.raylib_args.init(self.draw_method, needs)
+        self.damage_args.init(self.draw_method, needs)
+        return needs
+
+    def output_flatten_calls(self, method):
+        self.output.print_head(f"ops.append((display_list.{self.display_op}, self",
+                               first_comma=True)
+        for variable in self.display_args.gen_variables():
+            self.output.print_arg(variable.exp)
+        self.output.print_tail("))")
+
+    def flatten_needed(self):
+        needs = set()
+        if not self.flatten_fallback:
+            self.display_args.init(self.flatten_method, needs)
         return needs
 
 class composite(widget):
@@ -250,6 +334,7 @@ class composite(widget):
     x_pos_arg = "e_x_pos"
     y_pos_arg = "e_y_pos"
     placeholders_allowed = True
+    init_calls_attrs = ('width', 'height')
 
     def __init__(self, name, spec, output, trace):
         #print(f"{name}.__init__: {elements=}")
@@ -310,13 +395,16 @@ class composite(widget):
     def draw_needed(self):
         return self.needed_draw_names
 
-    def output_draw_calls(self, method):
+    def flatten_needed(self):
+        return self.needed_draw_names
+
+    def output_draw_calls(self, method, call="draw(", first_comma=False):
         self.output.print(f"e_x_pos = {self.e_x_pos}")
         self.output.print(f"e_y_pos = {self.e_y_pos}")
         draw_available = self.draw_available()
         for name, widget in self.elements:
             if widget is not None:
-                self.output.print_head(f"self.{name}.draw(", first_comma=False)
+                self.output.print_head(f"self.{name}.{call}", first_comma=first_comma)
                 self.output.print_arg("x_pos=" + self.x_pos_arg.format(name=name))
                 self.output.print_arg("y_pos=" + self.y_pos_arg.format(name=name))
                 for pname in widget.draw_params():
@@ -332,13 +420,17 @@ class composite(widget):
                    for info in self.placeholders["$name"]:
                        name, _widget = info.copy().popitem()
                        widget = getattr(self, name)
-                       widget.draw(x_pos=e_x_pos, y_pos=e_y_pos)
+                       widget.${call}x_pos=e_x_pos, y_pos=e_y_pos)
                 """)
-                self.output.print_block(template.substitute(name=name))
+                self.output.print_block(template.substitute(
+                                          name=name, call=call + (', ' if first_comma else '')))
                 self.output.indent()
                 self.inc_draw_pos("widget")
                 self.output.deindent()
 
+    def output_flatten_calls(self, method):
+        self.output_draw_calls(method, call="flatten(ops", first_comma=True)
+
     def inc_draw_pos(self, sname):
         pass
 
@@ -396,6 +488,7 @@ class panel(composite):
     x_pos_arg = "e_x_pos + self.{name}_x_offset"
     y_pos_arg = "e_y_pos + self.{name}_y_offset"
     placeholders_allowed = False
+    init_calls_attrs = ()
 
     def init_calls(self):
         pass
@@ -457,4 +550,25 @@ class widget_stub:
     def draw_params(self):
         return []
 
+class cached_widget:
+    r'''Stands in for a widget whose code came from the compile_cache.
+
+    The widgets using it only need its init_params and draw_params.
+    '''
+    def __init__(self, name, init_params, draw_params):
+        self.name = name
+        self._init_params = init_params
+        self._draw_params = draw_params
+
+    def __repr__(self):
+        return f"<cached_widget: {self.name}>"
+
+    def init_params(self):
+        r'''Returns {pname: default_exp}
+        '''
+        return self._init_params
+
+    def draw_params(self):
+        return self._draw_params
+
 Widget_types = (raylib_call, stacked, column, row, panel, specializes)
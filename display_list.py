@@ -0,0 +1,172 @@
+# display_list.py
+
+r'''Flat display lists, to draw a whole panel without going down through its tree of widgets.
+
+A widget's draw calls its children's draw, which call theirs, and so on down to the raylib calls,
+converting the x_pos/y_pos alignment objects at each level.  But once a panel's position is known,
+everything in it is at a fixed offset from that.  So the compiler also generates a flatten method
+for each widget class:
+
+    widget.flatten(ops, x_pos=None, y_pos=None, <appearance>=None...)
+
+This does what draw does, except that rather than drawing, it appends ops to the ops list.  Each op
+is:
+
+    (fn, target, dx, dy)
+
+which is drawn by fn(target, x + dx, y + dy), where x, y is the upper left corner of the panel.  The
+fns are the *_op functions below.  The target is normally the widget, which the fn gets everything
+that can change (color, text, ...) from when it's called.  The raylib_call widgets name their op in
+layout.yaml (display_op), along with the two position ints passed to it.
+
+Display_list.draw then draws the panel in one loop over its ops.
+
+The flatten methods also set each widget's x_pos, y_pos (and appearance), as draw does.  The touch
+objects and sprites use these, so a Display_list is flattened again if its panel is drawn somewhere
+else.  The widgets' draw methods are still used for everything else (e.g., the touch objects
+redrawing a button or moving a slider's knob).
+
+    draw(widget, x_pos, y_pos)
+
+draws a widget through its Display_list, creating it the first time.
+'''
+
+import math
+
+from pyray import *
+
+from alignment import S, C, E, half
+import screen
+import text_cache
+
+
+Display_lists = {}      # {widget: Display_list}, see draw
+
+
+class Display_list:
+    def __init__(self, widget):
+        self.widget = widget
+        self.ops = None
+        self.position = None    # (x_pos, y_pos) it was flattened for
+        self.x = self.y = None  # upper left corner for position
+        self.num_flattens = 0
+
+    def __repr__(self):
+        return f"<Display_list {self.widget.name}: {len(self.ops or ())} ops>"
+
+    def flatten(self, x_pos, y_pos):
+        widget = self.widget
+        ops = []
+        widget.flatten(ops, x_pos, y_pos)
+        x = x_pos.Si(widget.width)
+        y = y_pos.Si(widget.height)
+        self.ops = [(fn, target, dx - x, dy - y) for fn, target, dx, dy in ops]
+        self.position = x_pos, y_pos
+        self.x = x
+        self.y = y
+        self.num_flattens += 1
+
+    def draw(self, x_pos=None, y_pos=None):
+        r'''Draws the widget at x_pos, y_pos.
+
+        If these are None, it's drawn where it was last drawn.
+        '''
+        if self.ops is None:
+            self.flatten(x_pos, y_pos)
+        elif x_pos is not None or y_pos is not None:
+            last_x_pos, last_y_pos = self.position
+            if x_pos is None:
+                x_pos = last_x_pos
+            if y_pos is None:
+                y_pos = last_y_pos
+            if x_pos.__class__ is not last_x_pos.__class__ or x_pos.i != last_x_pos.i or \
+               y_pos.__class__ is not last_y_pos.__class__ or y_pos.i != last_y_pos.i:
+                self.flatten(x_pos, y_pos)
+        x = self.x
+        y = self.y
+        for fn, target, dx, dy in self.ops:
+            fn(target, x + dx, y + dy)
+
+def draw(widget, x_pos=None, y_pos=None):
+    r'''Draws widget through its Display_list (see Display_list.draw).
+    '''
+    display_list = Display_lists.get(widget)
+    if display_list is None:
+        display_list = Display_lists[widget] = Display_list(widget)
+    display_list.draw(x_pos, y_pos)
+
+
+def start_offset(a_pos, length):
+    r'''Returns a_pos.S(length).i - a_pos.i.
+
+        >>> start_offset(S(10), 5), start_offset(C(10), 5), start_offset(E(10), 5)
+        (0, -2, -4)
+    '''
+    return a_pos.Si(length) - a_pos.i
+
+def draw_widget_text(widget, text, x, y):
+    if widget.cached:
+        text_cache.draw_text(widget.font, text, (x, y), widget.size, widget.spacing, widget.color)
+    else:
+        draw_text_ex(widget.font, text, (x, y), widget.size, widget.spacing, widget.color)
+
+
+# The ops.  Each is called with (target, x, y).
+
+def rect_op(widget, x_left, y_top):
+    width = widget.width
+    height = widget.height
+    draw_rectangle(x_left, y_top, width, height, widget.color)
+    screen.damage(x_left, y_top, width, height)
+
+def circle_op(widget, x_center, y_middle):
+    width = widget.width
+    height = widget.height
+    draw_circle(x_center, y_middle, widget.radius, widget.color)
+    screen.damage(x_center - half(width), y_middle - half(height), width, height)
+
+def text_op(widget, x_left, y_top):
+    draw_widget_text(widget, str(widget.text), x_left, y_top)
+    screen.damage(x_left, y_top, widget.width, widget.height)
+
+def dynamic_text_op(widget, x_center, y):
+    r'''The text is centered on x_center, and aligned on y the same way as widget.y_pos.
+
+    Its size comes from the text, which may have changed since it was flattened.
+    '''
+    text = widget.text
+    if widget.cached:
+        msize = text_cache.measure_text(widget.font, text, widget.size, widget.spacing)
+    else:
+        msize = measure_text_ex(widget.font, text, widget.size, widget.spacing)
+    draw_width = int(math.ceil(msize.x))
+    draw_height = int(math.ceil(msize.y))
+    x_left = x_center - half(draw_width)
+    y_top = y + start_offset(widget.y_pos, draw_height)
+    draw_widget_text(widget, str(text), x_left, y_top)
+    screen.damage(x_left, y_top, draw_width, draw_height)
+
+def sprite_op(target, x, y):
+    r'''Target is (widget, x_pos, y_pos).  Saves the background under widget.sprite.
+
+    Something else may have moved the widget since (e.g., a slider's knob), so this puts it back.
+    '''
+    widget, x_pos, y_pos = target
+    widget.x_pos = x_pos
+    widget.y_pos = y_pos
+    widget.sprite.save_pos(x_pos, y_pos)
+
+def touch_op(touch, x, y):
+    touch.activate()
+
+def draw_op(target, x, y):
+    r'''Target is (widget, x_pos, y_pos).  For widgets whose draw can't be flattened.
+    '''
+    widget, x_pos, y_pos = target
+    widget.draw(x_pos, y_pos)
+
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,12 +1,19 @@
 # exp_console.py
 
+import sys
 import time
 from collections import defaultdict
 
 from alignment import *
 import screen
+import texture
+import sprite
+import display_list
 from controls import *
 import traffic_cop
+import latency
+import touch_input
+import text_cache
 
 
 Screens = dict(     # {screen_name: [panel]}
@@ -22,6 +29,10 @@ Player = None
 Screen_menu = None
 Current_screen = None
 
+# {screen_name: (Texture, [touch])}, the screen's image without any sprites (see
+# sprite.restore_backgrounds) and the touch objects activated by its panels.
+Screen_cache = {}
+
 def load_new_screen():
     if screen.New_screen is None:
         return False
@@ -30,93 +41,177 @@ def load_new_screen():
     return True
 
 def load_screen(name):
+    r'''Draws the named screen.
+
+    The first time, all of the panels are drawn from scratch, then a copy of the screen is saved in
+    Screen_cache.  After that, the screen is loaded by drawing the saved copy, then reactivating the
+    panels' touch objects (which draws their current values).  The Player and Screen_menu are always
+    redrawn.
+    '''
     global Current_screen
-    hgap = 2
-    left_gap = 2
-    top_gap = 2
    #start_time = time.clock_gettime(time.CLOCK_MONOTONIC)
-    with screen.Screen.update(from_scratch=True):
+    build_screen(name)
+    cached = Screen_cache.get(name)
+    with screen.Screen.update(from_scratch=cached is None):
         if Current_screen is not None:
             Player.clear()
             Screen_menu.clear()
             for panel in Screens[Current_screen]:
                 panel.clear()
-        x = S(left_gap)
-        y = S(top_gap)
-        def draw(panel):
-            nonlocal x, y
-            panel.draw(x, y)
-            x += hgap + panel.width
-        draw(Player)
-        for i, panel in enumerate(Screens[name], 1):
-            draw(panel)
-            if i == 4:
-                x = S(left_gap)
-                y = S(540)
-                draw(Screen_menu)
+        if cached is None:
+            touches = draw_screen(name)
+            image = texture.Texture(f"Screen_cache {name}", screen.Screen.width,
+                                    screen.Screen.height, fillcolor=None)
+            with image.draw_on_texture():
+                screen.Screen.render_texture.draw_rect(0, screen.Screen.height - 1,
+                                                       screen.Screen.width, screen.Screen.height)
+            sprite.restore_backgrounds(image)
+            Screen_cache[name] = image, touches
+        else:
+            image, touches = cached
+            screen.Screen.damage_all()
+            image.draw()
+            for touch in touches:
+                touch.activate()
+            display_list.draw(Player)
+            display_list.draw(Screen_menu)
         Current_screen = name
    #elapsed_time = time.clock_gettime(time.CLOCK_MONOTONIC) - start_time
    #print(f"load_screen took: {elapsed_time:.03} secs")
 
-def run():
-    global Player, Screen_menu
+def draw_screen(name):
+    r'''Draws the Player, Screen_menu and the named screen's panels.
+
+    Each panel is drawn from its flattened display list (see display_list.py).
+
+    Returns a list of the touch objects activated by the panels.
+    '''
+    hgap = 2
+    left_gap = 2
+    top_gap = 2
+    dispatcher = screen.Screen.Touch_dispatcher
+    touches = []
+    x = S(left_gap)
+    y = S(top_gap)
+    def draw(panel, save_touches=True):
+        nonlocal x, y
+        registered = set(dispatcher.widgets)
+        display_list.draw(panel, x, y)
+        if save_touches:
+            touches.extend(touch for touch in dispatcher.widgets if touch not in registered)
+        x += hgap + panel.width
+    draw(Player, save_touches=False)
+    for i, panel in enumerate(Screens[name], 1):
+        draw(panel)
+        if i == 4:
+            x = S(left_gap)
+            y = S(540)
+            draw(Screen_menu, save_touches=False)
+    return touches
+
+def invalidate_screen(name=None):
+    r'''Drops the saved copy of the named screen (all screens if name is None).
+
+    Only close_screen_cache calls this now.  Everything on the panels that changes is drawn by a
+    touch object, which doesn't draw while its screen isn't shown and draws its current value when
+    reactivated.  Anything added to a panel that changes its look some other way must call this,
+    or the saved copy will show the old look.
+    '''
+    names = list(Screen_cache) if name is None else [name]
+    for name in names:
+        if name in Screen_cache:
+            image, _ = Screen_cache.pop(name)
+            image.close()
+
+@screen.register_quit
+def close_screen_cache(screen_obj=None):
+    invalidate_screen()
+
+# (panel_fn, kwargs) for each panel on each screen, in Screens order.
+Panel_specs = dict(
+    home=[
+        (note, dict(title="Staff 1", cc_channel=2, cc_param_offset=120)),
+        (note, dict(title="Staff 2", cc_channel=2, cc_param_offset=124)),
+        (note, dict(title="Slur Start", cc_channel=3, cc_param_offset=0)),
+        (note, dict(title="Slur Middle", cc_channel=3, cc_param_offset=4)),
+        (note, dict(title="Slur End", cc_channel=3, cc_param_offset=8)),
+        (note, dict(title="Staccato", cc_channel=2, cc_param_offset=12)),
+        (note, dict(title="Staccatissimo", cc_channel=2, cc_param_offset=20)),
+        (note, dict(title="Strong Accent", cc_channel=2, cc_param_offset=0)),
+    ],
+    misc=[
+        (note, dict(title="Accent", cc_channel=2, cc_param_offset=4)),
+        (note, dict(title="Tenuto", cc_channel=2, cc_param_offset=8)),
+        (note, dict(title="Detached Legato", cc_channel=2, cc_param_offset=16)),
+        (grace_note, dict(title="Grace", cc_channel=2, cc_param_offset=80)),
+        (grace_note, dict(title="Grace Slash", cc_channel=2, cc_param_offset=84)),
+        (trill, {}),
+        (fermata, {}),
+        (player2, {}),
+    ],
+    voice=[(note, dict(title=f"Voice {i}", cc_channel=2, cc_param_offset=84 + 4 * i))
+           for i in range(1, 9)],
+    chord=[(note, dict(title=f"Chord {i}", cc_channel=2, cc_param_offset=48 + 4 * i))
+           for i in range(1, 8)],
+    arpeggiate=[(note, dict(title=f"Arpeggiate {i}", cc_channel=2, cc_param_offset=20 + 4 * i))
+                for i in range(1, 8)],
+)
+
+Built_screens = set()   # names of the screens in Screens whose panels have all been created
+Builder = None          # build_screens generator, see run
+
+def build_screens(names):
+    r'''Generator that creates the panels for the names screens, one panel per step.
+
+    Yields False (no screen change) after each panel.
+
+    A step can't be cut short, so a touch may wait Idle_slice plus one step (see traffic_cop).  Most
+    of a panel's time used to go to its sliders' value texts, making and measuring every value's
+    text.  These are now shared by all of the sliders with the same scale_fn and values (see
+    text_cache.value_texts and widest_text), so only the first panel using a new scale_fn pays for
+    them.  Headless on x86, with home built first (run's background_build), a step takes 0.2-0.3
+    mSec and at most 0.6 mSec (the first panels with new scale_fns), not counting the garbage
+    collector.  Not measured on the Pi.
+    '''
+    printed = set()
+    for name in names:
+        for panel_fn, kwargs in Panel_specs[name]:
+            panel = panel_fn(**kwargs)
+            if panel_fn not in printed:
+                print(f"{panel_fn.__name__}: width={panel.width}, height={panel.height}")
+                printed.add(panel_fn)
+            Screens[name].append(panel)
+            yield False
+        Built_screens.add(name)
+
+def build_screen(name):
+    r'''Makes sure that the named screen's panels have all been created.
+
+    The panels are created by the Builder, so the screens before this one (in Screens order) that
+    haven't been built yet are also built.
+    '''
+    while name not in Built_screens:
+        next(Builder, None)     # the last screen is added as the Builder finishes
+
+def run(background_build=False):
+    r'''Shows the home screen and runs the traffic_cop.
+
+    If background_build is True, only the home screen is built before it's shown.  The other screens
+    are built with traffic_cop idle tasks, or when they are first loaded.
+    '''
+    global Player, Screen_menu, Builder
 
     Player = player()
     print(f"player: width={Player.width}, height={Player.height}")
     Screen_menu = screens()
     print(f"screens: width={Screen_menu.width}, height={Screen_menu.height}")
 
-    n = note(title="Staff 1", cc_channel=2, cc_param_offset=120)
-    print(f"note: width={n.width}, height={n.height}")
-
-    Screens["home"].append(n)
-    Screens["home"].append(note(title="Staff 2", cc_channel=2, cc_param_offset=124))
-    Screens["home"].append(note(title="Slur Start", cc_channel=3, cc_param_offset=0))
-    Screens["home"].append(note(title="Slur Middle", cc_channel=3, cc_param_offset=4))
-    Screens["home"].append(note(title="Slur End", cc_channel=3, cc_param_offset=8))
-    Screens["home"].append(note(title="Staccato", cc_channel=2, cc_param_offset=12))
-    Screens["home"].append(note(title="Staccatissimo", cc_channel=2, cc_param_offset=20))
-    Screens["home"].append(note(title="Strong Accent", cc_channel=2, cc_param_offset=0))
-
-    Screens["misc"].append(note(title="Accent", cc_channel=2, cc_param_offset=4))
-    Screens["misc"].append(note(title="Tenuto", cc_channel=2, cc_param_offset=8))
-    Screens["misc"].append(note(title="Detached Legato", cc_channel=2, cc_param_offset=16))
-    Screens["misc"].append(grace_note(title="Grace", cc_channel=2, cc_param_offset=80))
-    Screens["misc"].append(grace_note(title="Grace Slash", cc_channel=2, cc_param_offset=84))
-    t = trill()
-    print(f"trill: width={t.width}, height={t.height}")
-    Screens["misc"].append(t)
-    f = fermata()
-    print(f"fermata: width={f.width}, height={f.height}")
-    Screens["misc"].append(f)
-    p2 = player2()
-    print(f"player2: width={p2.width}, height={p2.height}")
-    Screens["misc"].append(p2)
-
-    Screens["voice"].append(note(title="Voice 1", cc_channel=2, cc_param_offset=88))
-    Screens["voice"].append(note(title="Voice 2", cc_channel=2, cc_param_offset=92))
-    Screens["voice"].append(note(title="Voice 3", cc_channel=2, cc_param_offset=96))
-    Screens["voice"].append(note(title="Voice 4", cc_channel=2, cc_param_offset=100))
-    Screens["voice"].append(note(title="Voice 5", cc_channel=2, cc_param_offset=104))
-    Screens["voice"].append(note(title="Voice 6", cc_channel=2, cc_param_offset=108))
-    Screens["voice"].append(note(title="Voice 7", cc_channel=2, cc_param_offset=112))
-    Screens["voice"].append(note(title="Voice 8", cc_channel=2, cc_param_offset=116))
-
-    Screens["chord"].append(note(title="Chord 1", cc_channel=2, cc_param_offset=52))
-    Screens["chord"].append(note(title="Chord 2", cc_channel=2, cc_param_offset=56))
-    Screens["chord"].append(note(title="Chord 3", cc_channel=2, cc_param_offset=60))
-    Screens["chord"].append(note(title="Chord 4", cc_channel=2, cc_param_offset=64))
-    Screens["chord"].append(note(title="Chord 5", cc_channel=2, cc_param_offset=68))
-    Screens["chord"].append(note(title="Chord 6", cc_channel=2, cc_param_offset=72))
-    Screens["chord"].append(note(title="Chord 7", cc_channel=2, cc_param_offset=76))
-
-    Screens["arpeggiate"].append(note(title="Arpeggiate 1", cc_channel=2, cc_param_offset=24))
-    Screens["arpeggiate"].append(note(title="Arpeggiate 2", cc_channel=2, cc_param_offset=28))
-    Screens["arpeggiate"].append(note(title="Arpeggiate 3", cc_channel=2, cc_param_offset=32))
-    Screens["arpeggiate"].append(note(title="Arpeggiate 4", cc_channel=2, cc_param_offset=36))
-    Screens["arpeggiate"].append(note(title="Arpeggiate 5", cc_channel=2, cc_param_offset=40))
-    Screens["arpeggiate"].append(note(title="Arpeggiate 6", cc_channel=2, cc_param_offset=44))
-    Screens["arpeggiate"].append(note(title="Arpeggiate 7", cc_channel=2, cc_param_offset=48))
+    Builder = build_screens(Screens.keys())
+    if background_build:
+        build_screen("home")
+        traffic_cop.add_idle_task(Builder)
+    else:
+        traffic_cop.finish_idle_task(Builder)
 
     load_screen("home")
     traffic_cop.load_new_screen = load_new_screen
@@ -127,11 +222,34 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', '-l', action='store_true', default=False,
+                        help="collect latency stats, kill -USR1 to dump them")
+    parser.add_argument('--fps', type=float, default=30,
+                        help="max screen updates per second, 0 for no limit")
+    parser.add_argument('--vsync', action='store_true', default=False,
+                        help="pace screen updates to the display's vsync (use with --fps 0)")
+    parser.add_argument('--raw-touch', action='store_true', default=False,
+                        help="decode touch events without libevdev")
+    parser.add_argument('--touch-thread', action='store_true', default=False,
+                        help="read touch events on a background thread")
+    parser.add_argument('--background-build', '-b', action='store_true', default=False,
+                        help="show the home screen first, build the other screens while idle")
 
     args = parser.parse_args()
 
+    if args.latency:
+        latency.enable()
+
+    traffic_cop.set_frame_rate(args.fps or None)
+    touch_input.Raw_decoder = args.raw_touch
+    touch_input.Threaded_reader = args.touch_thread
+
     # screen: width=1920 (20.75" == 0.0108"/pixel, height=1080 (11.11/16" == 0.0108"/pixel)
-    with screen.Screen_class():
+    with screen.Screen_class(vsync=args.vsync):
         print(f"{screen.Screen.width=}, {screen.Screen.height=}")
-        run()
+        run(args.background_build)
+
 
+    if args.latency:
+        latency.dump()
+        print(text_cache.stats(), file=sys.stderr)
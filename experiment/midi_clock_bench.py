@@ -0,0 +1,126 @@
+# midi_clock_bench.py
+
+r'''Times midi_io.process_midi_events on a recorded MIDI input stream.
+
+To record (this reads from midi_io's ALSA client, so connect the clock source to it first):
+
+    python midi_clock_bench.py --record clocks.txt --secs 30
+
+Each line of the recording is: batch_number event_type_name.  The events in one batch were read by
+one read_midi_events call.
+
+To replay:
+
+    python midi_clock_bench.py clocks.txt
+
+Without a recording, a steady clock stream is made up (--bpm, --secs, --batch).
+
+The replay runs the events through process_midi_events twice: once in the recorded batches, and once
+one event per call (what you get with one read per event).
+'''
+
+import sys
+import os
+import time
+import select
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midi_io
+
+
+Replayable = {
+    'CLOCK': midi_io.ClockEvent,
+    'START': midi_io.StartEvent,
+    'STOP': midi_io.StopEvent,
+    'CONTINUE': midi_io.ContinueEvent,
+}
+
+
+def record(filename, secs):
+    end = time.time() + secs
+    num_events = 0
+    with open(filename, "w") as f:
+        batch = 0
+        while time.time() < end:
+            ready, _, _ = select.select([midi_io.Client._fd], [], [], end - time.time())
+            if ready:
+                events = midi_io.read_midi_events()
+                for event in events:
+                    print(batch, midi_io.Event_type_names[event.type], file=f)
+                num_events += len(events)
+                batch += 1
+    print(f"recorded {num_events} events in {batch} batches")
+
+
+def load(filename):
+    batches = defaultdict(list)
+    skipped = 0
+    with open(filename) as f:
+        for line in f:
+            batch, type_name = line.split()
+            if type_name in Replayable:
+                batches[int(batch)].append(Replayable[type_name]())
+            else:
+                skipped += 1
+    if skipped:
+        print(f"skipped {skipped} events that can't be replayed")
+    return [batches[i] for i in sorted(batches)]
+
+
+def make_up(bpm, secs, batch):
+    num_clocks = int(bpm / 60 * midi_io.Clocks_per_qtr * secs)
+    clocks = [midi_io.ClockEvent() for _ in range(num_clocks)]
+    return [clocks[i: i + batch] for i in range(0, num_clocks, batch)]
+
+
+Notifications = 0
+
+def notify(spp):
+    global Notifications
+    Notifications += 1
+    return True
+
+
+def replay(batches):
+    global Notifications
+    Notifications = 0
+    midi_io.set_midi_spp(0)
+    start_time = time.perf_counter()
+    for events in batches:
+        midi_io.process_midi_events(events, time.time())
+    return time.perf_counter() - start_time, Notifications
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', '-r', metavar='FILE')
+    parser.add_argument('--secs', '-s', type=float, default=30)
+    parser.add_argument('--bpm', type=float, default=200)
+    parser.add_argument('--batch', '-b', type=int, default=4,
+                        help="events per batch for the made up stream")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('recording', nargs='?')
+
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.secs)
+        sys.exit(0)
+
+    if args.recording:
+        batches = load(args.recording)
+    else:
+        batches = make_up(args.bpm, args.secs, args.batch)
+    singles = [[event] for events in batches for event in events]
+    num_events = len(singles)
+
+    midi_io.notify_location_fn(notify)
+    for i in range(args.repeat):
+        for name, stream in ("batched", batches), ("one per call", singles):
+            elapsed, notifications = replay(stream)
+            print(f"{name:>12}: {num_events} events in {len(stream)} calls, "
+                  f"{notifications} notifications, {elapsed * 1000:.2f} mSec, "
+                  f"{elapsed / num_events * 1e6:.2f} uSec/event")
@@ -0,0 +1,60 @@
+# screen_cache_check.py
+
+r'''Checks that showing a screen again from exp_console's Screen_cache gives exactly the pixels of
+drawing it from scratch.
+
+    python screen_cache_check.py                # the generated modules in the current directory
+    python screen_cache_check.py dir            # the generated modules in dir
+
+This runs against a headless Screen (see headless.py), with local_midi standing in for alsa_midi.
+For each screen, it draws the screen from scratch (with an empty Screen_cache), shows another
+screen, then shows the first one again from its cached copy, and compares the two.  E.g., home ->
+misc -> home.
+
+Prints the number of pixels that differ for each screen, and exits with status 1 if any do.
+'''
+
+import sys
+import os
+
+
+def check(directory):
+    r'''Returns {screen_name: number of pixels that differ}.
+    '''
+    sys.path[0] = directory
+    sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import local_midi
+    local_midi.install()
+    import headless
+    headless.install()
+    import screen
+    import exp_console
+
+    def pixels():
+        return screen.Screen.render_texture.texture.texture.pixels[..., :3].copy()
+
+    results = {}
+    with screen.Screen_class():
+        exp_console.Player = exp_console.player()
+        exp_console.Screen_menu = exp_console.screens()
+        exp_console.Builder = exp_console.build_screens(exp_console.Screens.keys())
+        names = list(exp_console.Screens)
+        for name in names:
+            exp_console.build_screen(name)
+        for i, name in enumerate(names):
+            other = names[i - 1] if i else names[1]
+            exp_console.invalidate_screen()
+            exp_console.load_screen(name)
+            from_scratch = pixels()
+            exp_console.load_screen(other)
+            exp_console.load_screen(name)
+            results[name] = int((pixels() != from_scratch).any(axis=-1).sum())
+    return results
+
+
+
+if __name__ == "__main__":
+    results = check(os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else os.getcwd()))
+    for name, num_pixels in results.items():
+        print(f"{name:12}{num_pixels:10} pixels differ")
+    sys.exit(1 if any(results.values()) else 0)
@@ -1,9 +1,21 @@
 # sysex_send.py
 
+import sys
+import os
 import time
 
+from yaml import safe_load
 from alsa_midi import SequencerClient, SysExEvent, PortCaps
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import measure_map
+
+
+# Sends Test_msg_file as YAML, or as binary measure_map SYSEX messages with:
+#
+#     python sysex_send.py binary clocks_per_measure part_duration_clocks
+
 
 Test_msg_file = "measures.yaml"
 
@@ -24,9 +36,16 @@ for port in Client.list_ports(output=True):
 else:
     print("Didn't find sysex_recv port")
 
-print(f"{Test_msg=}")
-
-Client.event_output(SysExEvent(Test_msg), port=Port)
+if len(sys.argv) > 1 and sys.argv[1] == "binary":
+    measures = safe_load(Test_msg.decode("ASCII"))
+    messages = measure_map.encode(int(sys.argv[2]), int(sys.argv[3]),
+                                  measures["skips"], measures["odd_durations"])
+    for msg in messages:
+        print(f"{msg=}")
+        Client.event_output(SysExEvent(msg), port=Port)
+else:
+    print(f"{Test_msg=}")
+    Client.event_output(SysExEvent(Test_msg), port=Port)
 Client.drain_output()
 
 time.sleep(20)
@@ -0,0 +1,103 @@
+# touch_decode_bench.py
+
+r'''Compares the libevdev Touch_generator to the Raw_touch_generator.
+
+Creates a virtual multitouch device through uinput (so this has to run as root), writes the same
+stream of two finger touch/move/release events to it for each generator, and times how long each
+generator takes to decode them into SlotEvents.
+'''
+
+import sys
+import os
+import time
+import argparse
+import libevdev
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import touch_input
+
+
+class Counting_dispatcher:
+    def __init__(self):
+        self.count = 0
+
+    def dispatch(self, event):
+        self.count += 1
+        return False
+
+
+def create_device():
+    dev = libevdev.Device()
+    dev.name = "touch_decode_bench"
+    dev.enable(libevdev.INPUT_PROP_DIRECT)
+    dev.enable(libevdev.EV_KEY.BTN_TOUCH)
+    absinfo = libevdev.InputAbsInfo(minimum=0, maximum=32767)
+    dev.enable(libevdev.EV_ABS.ABS_X, absinfo)
+    dev.enable(libevdev.EV_ABS.ABS_Y, absinfo)
+    dev.enable(libevdev.EV_ABS.ABS_MT_SLOT, libevdev.InputAbsInfo(minimum=0, maximum=9))
+    dev.enable(libevdev.EV_ABS.ABS_MT_TRACKING_ID, libevdev.InputAbsInfo(minimum=0, maximum=65535))
+    dev.enable(libevdev.EV_ABS.ABS_MT_POSITION_X, absinfo)
+    dev.enable(libevdev.EV_ABS.ABS_MT_POSITION_Y, absinfo)
+    return dev.create_uinput_device()
+
+
+def gen_frames(num_moves):
+    r'''Generates lists of InputEvents, one list per SYN_REPORT frame.
+    '''
+    E = libevdev.InputEvent
+    ABS = libevdev.EV_ABS
+    syn = E(libevdev.EV_SYN.SYN_REPORT, 0)
+    yield [E(ABS.ABS_MT_SLOT, 0), E(ABS.ABS_MT_TRACKING_ID, 1),
+           E(ABS.ABS_MT_POSITION_X, 1000), E(ABS.ABS_MT_POSITION_Y, 1000),
+           E(ABS.ABS_MT_SLOT, 1), E(ABS.ABS_MT_TRACKING_ID, 2),
+           E(ABS.ABS_MT_POSITION_X, 20000), E(ABS.ABS_MT_POSITION_Y, 20000),
+           E(libevdev.EV_KEY.BTN_TOUCH, 1), syn]
+    for i in range(num_moves):
+        yield [E(ABS.ABS_MT_SLOT, 0), E(ABS.ABS_MT_POSITION_Y, 1000 + 10 * (i % 100)),
+               E(ABS.ABS_MT_SLOT, 1), E(ABS.ABS_MT_POSITION_X, 20000 + 10 * (i % 100)),
+               syn]
+    yield [E(ABS.ABS_MT_SLOT, 0), E(ABS.ABS_MT_TRACKING_ID, -1),
+           E(ABS.ABS_MT_SLOT, 1), E(ABS.ABS_MT_TRACKING_ID, -1),
+           E(libevdev.EV_KEY.BTN_TOUCH, 0), syn]
+
+
+def run(uinput, generator_class, frames, frames_per_read):
+    r'''Returns num SlotEvents, num events read, elapsed decode time.
+    '''
+    dispatcher = Counting_dispatcher()
+    generator = generator_class(uinput.devnode, 1920, 1080, dispatcher)
+    generator.drain_events()
+    elapsed = 0
+    num_events = 0
+    for start in range(0, len(frames), frames_per_read):
+        for frame in frames[start: start + frames_per_read]:
+            uinput.send_events(frame)
+            num_events += len(frame)
+        time.sleep(0.002)   # let the kernel deliver them
+        start_time = time.perf_counter()
+        generator.process_events(generator.device_fd)
+        elapsed += time.perf_counter() - start_time
+    generator.close()
+    return dispatcher.count, num_events, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--moves', '-m', type=int, default=5000)
+    parser.add_argument('--frames-per-read', '-f', type=int, default=8,
+                        help="SYN_REPORT frames queued per process_events call")
+    parser.add_argument('--repeat', '-r', type=int, default=3)
+
+    args = parser.parse_args()
+
+    frames = list(gen_frames(args.moves))
+    uinput = create_device()
+    time.sleep(0.5)   # give udev a chance to set up the devnode
+    for i in range(args.repeat):
+        for generator_class in touch_input.Touch_generator, touch_input.Raw_touch_generator:
+            slot_events, num_events, elapsed = \
+              run(uinput, generator_class, frames, args.frames_per_read)
+            print(f"{generator_class.__name__:>20}: {num_events} input_events -> "
+                  f"{slot_events} SlotEvents in {elapsed * 1000:.1f} mSec, "
+                  f"{elapsed / num_events * 1e6:.2f} uSec/input_event")
@@ -0,0 +1,244 @@
+# touch_replay.py
+
+r'''Records touch sessions from the touch device, and replays them through the touch input path.
+
+To record (reads screen.Touch_device_path, so this has to run on the Pi):
+
+    python touch_replay.py --record session.trec --secs 30
+
+The recording is Header, then one Record per struct input_event: the microseconds since the first
+event, type, code and value.  That's half the size of the kernel's struct input_event.
+
+To replay:
+
+    python touch_replay.py session.trec              # in real time
+    python touch_replay.py --fast session.trec       # as fast as the pipe will take them
+
+The replay runs against a headless Screen (see headless.py).  A writer thread writes the recorded
+events, as struct input_events stamped with the time they are written, into a pipe.  The read end of
+the pipe is registered with traffic_cop.register_read, so the events go through the real
+traffic_cop.run select loop, Raw_touch_generator.gen_slot_events and the Screen's Touch_dispatcher.
+
+The report has the input_events/sec, the dispatch latency percentiles (from when each event was
+written to when its SlotEvent was dispatched), and the moves coalesced vs delivered.
+'''
+
+import sys
+import os
+import time
+import struct
+import threading
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import headless
+headless.install()
+
+import screen
+import traffic_cop
+import touch_input
+from touch_input import (Input_event, EV_SYN, EV_ABS, SYN_REPORT, ABS_MT_SLOT,
+                         ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TRACKING_ID)
+
+
+Header = b'TREC\x01'                 # format version 1
+Record = struct.Struct('<IHHi')      # usec since first event, type, code, value
+
+
+def record(path, filename, secs):
+    r'''Records the struct input_events from the device at path for secs seconds.
+    '''
+    num_events = 0
+    first_usec = None
+    with open(path, "rb", buffering=0) as device, open(filename, "wb") as f:
+        f.write(Header)
+        os.set_blocking(device.fileno(), False)
+        end = time.time() + secs
+        buffer = bytearray(Input_event.size * 64)
+        while time.time() < end:
+            num_bytes = device.readinto(buffer)
+            if not num_bytes:
+                time.sleep(0.001)
+                continue
+            for sec, usec, type, code, value in Input_event.iter_unpack(buffer[:num_bytes]):
+                usec += sec * 1000000
+                if first_usec is None:
+                    first_usec = usec
+                f.write(Record.pack(usec - first_usec, type, code, value))
+                num_events += 1
+    print(f"recorded {num_events} input_events")
+
+
+def load(filename):
+    r'''Returns a list of (usec, type, code, value).
+    '''
+    with open(filename, "rb") as f:
+        data = f.read()
+    if not data.startswith(Header):
+        raise ValueError(f"load: {filename} is not a touch recording")
+    return list(Record.iter_unpack(memoryview(data)[len(Header):]))
+
+
+def count_moves(events):
+    r'''Returns the number of moves in events, one per slot per SYN_REPORT frame.
+    '''
+    moves = 0
+    slot = 0
+    moved = set()      # slots moved in this frame
+    touched = set()    # slots touched or released in this frame
+    for _, type, code, value in events:
+        if type == EV_ABS:
+            if code == ABS_MT_SLOT:
+                slot = value
+            elif code == ABS_MT_TRACKING_ID:
+                touched.add(slot)
+            elif code in (ABS_MT_POSITION_X, ABS_MT_POSITION_Y):
+                moved.add(slot)
+        elif type == EV_SYN and code == SYN_REPORT:
+            moves += len(moved - touched)
+            moved.clear()
+            touched.clear()
+    return moves
+
+
+class Writer(threading.Thread):
+    r'''Writes the events into the pipe as struct input_events, then closes it.
+
+    In real time, unless fast.  Each event is stamped with the time it's written.
+    '''
+    def __init__(self, events, write_fd, fast):
+        super().__init__(daemon=True)
+        self.events = events
+        self.write_fd = write_fd
+        self.fast = fast
+        self.done = False
+        self.start_time = self.end_time = None
+
+    def run(self):
+        self.start_time = time.time()
+        i = 0
+        while i < len(self.events):
+            if not self.fast:
+                delay = self.start_time + self.events[i][0] / 1000000 - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            # write all of the events that are due together
+            now = time.time()
+            j = i + 1
+            if self.fast:
+                j = min(i + 64, len(self.events))
+            else:
+                while j < len(self.events) and \
+                      self.start_time + self.events[j][0] / 1000000 <= now:
+                    j += 1
+            # the device delivers whole frames, so finish the frame (up to its SYN_REPORT)
+            while j < len(self.events) and self.events[j - 1][1:3] != (EV_SYN, SYN_REPORT):
+                j += 1
+            sec = int(now)
+            usec = int((now - sec) * 1000000)
+            os.write(self.write_fd,
+                     b''.join(Input_event.pack(sec, usec, type, code, value)
+                              for _, type, code, value in self.events[i:j]))
+            i = j
+        self.end_time = time.time()
+        self.done = True
+        os.close(self.write_fd)
+
+
+class Replay_touch_generator(touch_input.Raw_touch_generator):
+    r'''A Raw_touch_generator reading from the read end of a pipe, rather than the touch device.
+
+    Records the dispatch latency of each SlotEvent, and stops the traffic_cop once the Writer is
+    done and the pipe is drained.
+    '''
+    def __init__(self, read_fd, writer, width, height, touch_dispatch, num_slots=10,
+                 buffer_events=64):
+        self.writer = writer
+        self.num_slots = num_slots
+        super().__init__(read_fd, width, height, touch_dispatch, buffer_events=buffer_events)
+        self.latencies = []         # secs
+        self.actions = dict(touch=0, move=0, release=0)
+
+    def open_device(self, read_fd):
+        r'''Opens the read end of the pipe.  A pipe has no slots to ask about, so num_slots is left
+        as given.
+        '''
+        self.device_fd = open(read_fd, "rb")
+        os.set_blocking(read_fd, False)
+        self.raw_fd = self.device_fd.raw
+
+    def resync(self):
+        r'''A pipe doesn't drop events.
+        '''
+        return []
+
+    def process_events(self, file):
+        done = self.writer.done   # if done now, everything is in the pipe
+        changed = super().process_events(file)
+        if done:
+            traffic_cop.unregister_read(self.device_fd)
+            self.closed = True
+            traffic_cop.stop()
+        return changed
+
+    def dispatch_events(self, events):
+        change_done = False
+        latencies = self.latencies
+        actions = self.actions
+        for event in events:
+            change_done |= self.touch_dispatch.dispatch(event)
+            latencies.append(time.time() - event.sec)
+            actions[event.action] += 1
+        return change_done
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def replay(events, fast):
+    with screen.Screen_class():
+        read_fd, write_fd = os.pipe()
+        writer = Writer(events, write_fd, fast)
+        generator = Replay_touch_generator(read_fd, writer, screen.Screen.width,
+                                           screen.Screen.height, screen.Screen.Touch_dispatcher)
+        # start the writer from inside traffic_cop.run, after it drains the Touch_generator
+        traffic_cop.set_alarm(0, lambda: writer.start() or False)
+        screen.Screen.Touch_generator = generator
+        traffic_cop.run()
+        end_time = time.time()
+        generator.device_fd.close()
+
+    elapsed = end_time - writer.start_time
+    latencies = sorted(generator.latencies)
+    offered_moves = count_moves(events)
+    delivered_moves = generator.actions['move']
+    print(f"{len(events)} input_events in {elapsed:.3f} secs, {len(events) / elapsed:.0f}/sec")
+    print(f"SlotEvents: {generator.actions}")
+    if latencies:
+        print("dispatch latency mSec: " +
+              ', '.join(f"p{int(p * 100)} {percentile(latencies, p) * 1000:.3f}"
+                        for p in (0.5, 0.9, 0.99)) +
+              f", max {latencies[-1] * 1000:.3f}")
+    print(f"moves: {offered_moves} offered, {delivered_moves} delivered, "
+          f"{offered_moves - delivered_moves} coalesced")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', '-r', metavar='FILE')
+    parser.add_argument('--secs', '-s', type=float, default=30)
+    parser.add_argument('--device', '-d', default=headless.Touch_device_path)
+    parser.add_argument('--fast', '-f', action='store_true', default=False,
+                        help="replay as fast as possible, rather than in real time")
+    parser.add_argument('recording', nargs='?')
+
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.device, args.record, args.secs)
+    elif args.recording:
+        replay(load(args.recording), args.fast)
+    else:
+        parser.error("need a recording to replay, or --record")
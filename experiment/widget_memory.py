@@ -0,0 +1,107 @@
+# widget_memory.py
+
+r'''Reports the memory used by the generated widgets, per widget class.
+
+    python widget_memory.py                 # the generated modules in the current directory
+    python widget_memory.py dir_a dir_b     # the generated modules in each dir, side by side
+
+E.g., to see what compiler.py's lean (see compiler/lean.py) saves, compile layout.yaml into one dir
+with --no-lean, and into another without it, and give it both dirs.
+
+This runs against a headless Screen (see headless.py), with local_midi standing in for alsa_midi.
+It creates all of the panels in exp_console.Panel_specs, then counts the instances of each class in
+the generated modules.  An instance's bytes are sys.getsizeof of the instance, plus its __dict__ if
+it has one.  The attr values aren't counted, they are mostly shared (ints, colors, fonts) or are
+other widgets (counted under their own class).
+
+Each dir is measured in its own process, so the modules don't get mixed up.
+'''
+
+import sys
+import os
+import gc
+import pickle
+import argparse
+import subprocess
+import tempfile
+from collections import defaultdict
+
+
+def instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+def measure(directory):
+    r'''Returns {class_name: (instances, bytes)} for the generated modules in directory.
+    '''
+    sys.path[0] = directory
+    sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import local_midi
+    local_midi.install()
+    import headless
+    headless.install()
+    import screen
+    import exp_console
+
+    sizes = defaultdict(lambda: [0, 0])
+    with screen.Screen_class():
+        panels = [panel_fn(**kwargs)
+                  for calls in exp_console.Panel_specs.values()
+                  for panel_fn, kwargs in calls]
+        gc.collect()
+        generated = {name for name, module in sys.modules.items()
+                     if os.path.dirname(getattr(module, '__file__', None) or '') == directory}
+        for obj in gc.get_objects():
+            cls = obj.__class__
+            if cls.__module__ in generated:
+                class_sizes = sizes[cls.__name__]
+                class_sizes[0] += 1
+                class_sizes[1] += instance_size(obj)
+    return {name: tuple(class_sizes) for name, class_sizes in sizes.items()}
+
+def report(directories, results):
+    names = sorted(set().union(*results), key=lambda name: -results[0].get(name, (0, 0))[1])
+    print(f"{'class':24}{'instances':>10}", end='')
+    for directory in directories:
+        label = os.path.basename(os.path.normpath(directory))[-16:]
+        print(f"{label + ' bytes/inst':>24}{'total':>10}", end='')
+    print()
+    totals = [0] * len(results)
+    for name in names:
+        print(f"{name:24}{max(result.get(name, (0, 0))[0] for result in results):10}", end='')
+        for i, result in enumerate(results):
+            instances, size = result.get(name, (0, 0))
+            totals[i] += size
+            print(f"{size / instances if instances else 0:24.1f}{size:10}", end='')
+        print()
+    print(f"{'total':34}", end='')
+    for total in totals:
+        print(f"{total:34}", end='')
+    print()
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pickle', metavar='FILE', help=argparse.SUPPRESS)  # used by the subprocesses
+    parser.add_argument('directories', nargs='*')
+
+    args = parser.parse_args()
+
+    if args.pickle:
+        with open(args.pickle, 'wb') as file:
+            pickle.dump(measure(os.path.abspath(args.directories[0])), file)
+    else:
+        directories = args.directories or [os.getcwd()]
+        results = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i, directory in enumerate(directories):
+                filename = os.path.join(temp_dir, str(i))
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--pickle', filename,
+                                os.path.abspath(directory)],
+                               check=True, stdout=subprocess.DEVNULL)
+                with open(filename, 'rb') as file:
+                    results.append(pickle.load(file))
+        report(directories, results)
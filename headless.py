@@ -0,0 +1,579 @@
+# headless.py
+
+r'''A NumPy software renderer standing in for pyray, so the UI can run without a display.
+
+This implements the part of pyray used by screen, texture, sprite, text_cache and the generated
+widgets, with the same coordinate semantics as raylib:
+
+    - Drawing while in texture mode uses upper left origin coordinates, but the render_texture's
+      pixels are stored bottom row first (as OpenGL does).  So render_textures come out upside down
+      unless they are drawn with a negative source height (see Screen.draw_to_framebuffer and
+      Texture.draw_rect/invert_y).
+    - draw_texture_rec source rects are in stored pixel rows, and a negative width/height flips the
+      source.
+    - The BLEND_ALPHA, BLEND_ALPHA_PREMULTIPLY and BLEND_CUSTOM_SEPARATE blend modes do the same
+      arithmetic as the OpenGL blend functions.
+
+Circles and text are rasterized in software, so their edge pixels won't exactly match the GPU's.
+Text needs Pillow to draw the real glyphs; without it each glyph is drawn as a box with the same
+advance.
+
+To use this, call install() before importing anything that imports pyray:
+
+    import headless
+    headless.install()
+    import exp_console
+
+Or run a script under it:
+
+    python headless.py [--frames DIR] script.py [script args...]
+
+which saves each presented frame as DIR/frame_NNNNN.png (if --frames is given), so that runs can be
+diffed pixel for pixel.
+
+install() also sets screen.Touch_device_path to None, so that touch_input doesn't open the touch
+device (see touch_input.No_touch_generator).  The original path is kept in Touch_device_path.
+'''
+
+import sys
+import os
+import math
+import zlib
+import struct
+import runpy
+import argparse
+
+import numpy as np
+
+try:
+    from PIL import Image as PIL_Image, ImageDraw, ImageFont
+except ImportError:
+    ImageFont = None
+
+
+__all__ = """
+    LIGHTGRAY GRAY DARKGRAY YELLOW GOLD ORANGE PINK RED MAROON GREEN LIME DARKGREEN SKYBLUE BLUE
+    DARKBLUE PURPLE VIOLET DARKPURPLE BEIGE BROWN DARKBROWN WHITE BLACK BLANK MAGENTA RAYWHITE
+    LOG_ALL LOG_TRACE LOG_DEBUG LOG_INFO LOG_WARNING LOG_ERROR LOG_FATAL LOG_NONE
+    FLAG_VSYNC_HINT FLAG_FULLSCREEN_MODE FLAG_WINDOW_HIDDEN FLAG_MSAA_4X_HINT
+    BLEND_ALPHA BLEND_ADDITIVE BLEND_MULTIPLIED BLEND_ADD_COLORS BLEND_SUBTRACT_COLORS
+    BLEND_ALPHA_PREMULTIPLY BLEND_CUSTOM BLEND_CUSTOM_SEPARATE
+    Vector2 Texture2D RenderTexture Font Image
+    set_trace_log_level set_config_flags init_window close_window window_should_close
+    begin_drawing end_drawing begin_texture_mode end_texture_mode
+    begin_blend_mode end_blend_mode rl_set_blend_factors_separate rl_draw_render_batch_active
+    load_render_texture unload_render_texture clear_background
+    draw_rectangle draw_rectangle_v draw_circle draw_line_v draw_line_ex
+    draw_texture draw_texture_rec load_font is_font_valid measure_text_ex draw_text_ex draw_fps
+    load_image_from_texture load_image_from_screen image_crop export_image
+    check_collision_point_rec
+""".split()
+
+
+LIGHTGRAY = (200, 200, 200, 255)
+GRAY = (130, 130, 130, 255)
+DARKGRAY = (80, 80, 80, 255)
+YELLOW = (253, 249, 0, 255)
+GOLD = (255, 203, 0, 255)
+ORANGE = (255, 161, 0, 255)
+PINK = (255, 109, 194, 255)
+RED = (230, 41, 55, 255)
+MAROON = (190, 33, 55, 255)
+GREEN = (0, 228, 48, 255)
+LIME = (0, 158, 47, 255)
+DARKGREEN = (0, 117, 44, 255)
+SKYBLUE = (102, 191, 255, 255)
+BLUE = (0, 121, 241, 255)
+DARKBLUE = (0, 82, 172, 255)
+PURPLE = (200, 122, 255, 255)
+VIOLET = (135, 60, 190, 255)
+DARKPURPLE = (112, 31, 126, 255)
+BEIGE = (211, 176, 131, 255)
+BROWN = (127, 106, 79, 255)
+DARKBROWN = (76, 63, 47, 255)
+WHITE = (255, 255, 255, 255)
+BLACK = (0, 0, 0, 255)
+BLANK = (0, 0, 0, 0)
+MAGENTA = (255, 0, 255, 255)
+RAYWHITE = (245, 245, 245, 255)
+
+LOG_ALL, LOG_TRACE, LOG_DEBUG, LOG_INFO, LOG_WARNING, LOG_ERROR, LOG_FATAL, LOG_NONE = range(8)
+
+FLAG_VSYNC_HINT = 0x40
+FLAG_FULLSCREEN_MODE = 0x02
+FLAG_WINDOW_HIDDEN = 0x80
+FLAG_MSAA_4X_HINT = 0x20
+
+BLEND_ALPHA, BLEND_ADDITIVE, BLEND_MULTIPLIED, BLEND_ADD_COLORS, BLEND_SUBTRACT_COLORS, \
+  BLEND_ALPHA_PREMULTIPLY, BLEND_CUSTOM, BLEND_CUSTOM_SEPARATE = range(8)
+
+# blend factors and equations from rlgl.h
+RL_ZERO = 0
+RL_ONE = 1
+RL_SRC_COLOR = 0x0300
+RL_ONE_MINUS_SRC_COLOR = 0x0301
+RL_SRC_ALPHA = 0x0302
+RL_ONE_MINUS_SRC_ALPHA = 0x0303
+RL_DST_ALPHA = 0x0304
+RL_ONE_MINUS_DST_ALPHA = 0x0305
+RL_DST_COLOR = 0x0306
+RL_ONE_MINUS_DST_COLOR = 0x0307
+RL_FUNC_ADD = 0x8006
+RL_FUNC_SUBTRACT = 0x800A
+RL_FUNC_REVERSE_SUBTRACT = 0x800B
+
+
+class Vector2:
+    __slots__ = "x y".split()
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return f"Vector2({self.x}, {self.y})"
+
+class Texture2D:
+    r'''pixels is a height x width x 4 uint8 array, stored bottom row first for render_textures.
+    '''
+    Next_id = 1
+
+    def __init__(self, width, height):
+        self.id = Texture2D.Next_id
+        Texture2D.Next_id += 1
+        self.width = width
+        self.height = height
+        self.mipmaps = 1
+        self.format = 7       # PIXELFORMAT_UNCOMPRESSED_R8G8B8A8
+        self.pixels = np.zeros((height, width, 4), dtype=np.uint8)
+
+class RenderTexture:
+    def __init__(self, width, height):
+        self.texture = Texture2D(width, height)
+        self.id = self.texture.id
+
+class Font:
+    def __init__(self, path):
+        self.path = path
+        self.baseSize = 32
+        self.pil_fonts = {}   # {size: ImageFont}
+        self.advances = {}    # {char: advanceX at baseSize}
+
+    def pil_font(self, size):
+        r'''Returns the Pillow font scaled like raylib's, with ascent + descent == size pixels.
+        '''
+        font = self.pil_fonts.get(size)
+        if font is None:
+            ascent, descent = ImageFont.truetype(self.path, 1000).getmetrics()
+            font = self.pil_fonts[size] = \
+              ImageFont.truetype(self.path, max(1, round(size * 1000 / (ascent + descent))))
+        return font
+
+    def advance(self, c):
+        r'''Returns raylib's advanceX for c: the advance in font units times
+        stbtt_ScaleForPixelHeight(baseSize), truncated to an int.
+
+        load_font only loads ' ' through '~', anything else measures as '?' (as in raylib).
+        '''
+        advance = self.advances.get(c)
+        if advance is None:
+            if not ' ' <= c <= '~':
+                advance = self.advance('?')
+            else:
+                # at Units_size pixels per em, Pillow's lengths are in font units
+                units_font = self.pil_font_units()
+                ascent, descent = units_font.getmetrics()
+                advance = int(units_font.getlength(c) * self.baseSize / (ascent + descent))
+            self.advances[c] = advance
+        return advance
+
+    def pil_font_units(self):
+        font = self.pil_fonts.get('units')
+        if font is None:
+            font = self.pil_fonts['units'] = ImageFont.truetype(self.path, Units_size)
+        return font
+
+Units_size = 2048   # units per em of the DejaVu fonts
+
+class Image:
+    r'''data is a height x width x 4 uint8 array.
+    '''
+    def __init__(self, data):
+        self.data = data
+        self.height, self.width = data.shape[:2]
+        self.mipmaps = 1
+        self.format = 7
+
+
+Framebuffer = None     # height x width x 4 uint8 array, top row first
+Target = None          # the array being drawn on, top row first (a flipped view for render_textures)
+Texture_mode = None    # RenderTexture being drawn on, or None
+Drawing = False        # between begin_drawing and end_drawing
+Blend_mode = BLEND_ALPHA
+Blend_factors = RL_SRC_ALPHA, RL_ONE_MINUS_SRC_ALPHA, RL_ONE, RL_ONE_MINUS_SRC_ALPHA, \
+                RL_FUNC_ADD, RL_FUNC_ADD
+
+Frames_presented = 0   # end_drawing calls
+Frame_dir = None       # save each presented frame here as a png, if not None
+
+Touch_device_path = None   # screen.Touch_device_path before install set it to None
+
+
+def set_trace_log_level(level):
+    pass
+
+def set_config_flags(flags):
+    pass
+
+def init_window(width, height, title):
+    global Framebuffer, Frames_presented
+    Framebuffer = np.zeros((height, width, 4), dtype=np.uint8)
+    Framebuffer[..., 3] = 255
+    Frames_presented = 0
+
+def close_window():
+    global Framebuffer
+    Framebuffer = None
+
+def window_should_close():
+    return False
+
+def set_target():
+    global Target
+    if Texture_mode is not None:
+        Target = Texture_mode.texture.pixels[::-1]
+    elif Drawing:
+        Target = Framebuffer
+    else:
+        Target = None
+
+def begin_drawing():
+    global Drawing
+    Drawing = True
+    set_target()
+
+def end_drawing():
+    global Drawing, Frames_presented
+    Drawing = False
+    set_target()
+    if Frame_dir is not None:
+        write_png(os.path.join(Frame_dir, f"frame_{Frames_presented:05}.png"), Framebuffer)
+    Frames_presented += 1
+
+def begin_texture_mode(render_texture):
+    global Texture_mode
+    Texture_mode = render_texture
+    set_target()
+
+def end_texture_mode():
+    global Texture_mode
+    Texture_mode = None
+    set_target()
+
+def begin_blend_mode(mode):
+    global Blend_mode
+    Blend_mode = mode
+
+def end_blend_mode():
+    global Blend_mode
+    Blend_mode = BLEND_ALPHA
+
+def rl_set_blend_factors_separate(src_rgb, dst_rgb, src_alpha, dst_alpha, eq_rgb, eq_alpha):
+    global Blend_factors
+    Blend_factors = src_rgb, dst_rgb, src_alpha, dst_alpha, eq_rgb, eq_alpha
+
+def rl_draw_render_batch_active():
+    pass
+
+def load_render_texture(width, height):
+    return RenderTexture(width, height)
+
+def unload_render_texture(render_texture):
+    render_texture.texture.pixels = None
+
+def clear_background(color):
+    Target[...] = color
+
+def factor(factor, src, dst):
+    if factor == RL_ZERO:
+        return 0.0
+    if factor == RL_ONE:
+        return 1.0
+    if factor == RL_SRC_COLOR:
+        return src
+    if factor == RL_ONE_MINUS_SRC_COLOR:
+        return 1.0 - src
+    if factor == RL_SRC_ALPHA:
+        return src[..., 3:4]
+    if factor == RL_ONE_MINUS_SRC_ALPHA:
+        return 1.0 - src[..., 3:4]
+    if factor == RL_DST_ALPHA:
+        return dst[..., 3:4]
+    if factor == RL_ONE_MINUS_DST_ALPHA:
+        return 1.0 - dst[..., 3:4]
+    if factor == RL_DST_COLOR:
+        return dst
+    if factor == RL_ONE_MINUS_DST_COLOR:
+        return 1.0 - dst
+    raise ValueError(f"headless: unknown blend factor {factor:#x}")
+
+def equation(equation, src, dst):
+    if equation == RL_FUNC_ADD:
+        return src + dst
+    if equation == RL_FUNC_SUBTRACT:
+        return src - dst
+    if equation == RL_FUNC_REVERSE_SUBTRACT:
+        return dst - src
+    raise ValueError(f"headless: unknown blend equation {equation:#x}")
+
+def blend(dst, src):
+    r'''Blends src (float 0-1 RGBA, broadcastable to dst) onto dst (uint8 RGBA array view).
+    '''
+    if dst.size == 0:
+        return
+    d = dst.astype(np.float32) / 255
+    src = np.broadcast_to(src, d.shape)
+    sa = src[..., 3:4]
+    if Blend_mode == BLEND_ALPHA:
+        out = src * sa + d * (1 - sa)
+    elif Blend_mode == BLEND_ALPHA_PREMULTIPLY:
+        out = src + d * (1 - sa)
+    elif Blend_mode == BLEND_ADDITIVE:
+        out = src * sa + d
+    elif Blend_mode == BLEND_MULTIPLIED:
+        out = src * d + d * (1 - sa)
+    elif Blend_mode == BLEND_ADD_COLORS:
+        out = src + d
+    elif Blend_mode == BLEND_SUBTRACT_COLORS:
+        out = d - src
+    elif Blend_mode in (BLEND_CUSTOM, BLEND_CUSTOM_SEPARATE):
+        src_rgb, dst_rgb, src_alpha, dst_alpha, eq_rgb, eq_alpha = Blend_factors
+        def f(fac):
+            return np.broadcast_to(np.asarray(factor(fac, src, d), dtype=np.float32), d.shape)
+        out = np.empty_like(d)
+        out[..., :3] = equation(eq_rgb, src[..., :3] * f(src_rgb)[..., :3],
+                                d[..., :3] * f(dst_rgb)[..., :3])
+        out[..., 3:] = equation(eq_alpha, sa * f(src_alpha)[..., 3:],
+                                d[..., 3:] * f(dst_alpha)[..., 3:])
+    else:
+        raise ValueError(f"headless: unknown blend mode {Blend_mode}")
+    dst[...] = np.clip(out * 255 + 0.5, 0, 255).astype(np.uint8)
+
+def as_float(color):
+    r'''Colors with less than 4 components get 0 for the rest, as pyray's cffi structs do.
+    '''
+    color = tuple(color)
+    return np.array(color + (0,) * (4 - len(color)), dtype=np.float32) / 255
+
+def clip(x_left, y_top, x_right, y_bottom):
+    r'''Returns the rect (right and bottom exclusive) clipped to the Target, or None if empty.
+    '''
+    height, width = Target.shape[:2]
+    x_left = max(x_left, 0)
+    y_top = max(y_top, 0)
+    x_right = min(x_right, width)
+    y_bottom = min(y_bottom, height)
+    if x_left >= x_right or y_top >= y_bottom:
+        return None
+    return x_left, y_top, x_right, y_bottom
+
+def draw_rectangle(x, y, width, height, color):
+    rect = clip(x, y, x + width, y + height)
+    if rect is not None:
+        x_left, y_top, x_right, y_bottom = rect
+        blend(Target[y_top:y_bottom, x_left:x_right], as_float(color))
+
+def draw_rectangle_v(position, size, color):
+    x, y = xy(position)
+    width, height = xy(size)
+    draw_rectangle(round(x), round(y), round(width), round(height), color)
+
+def coverage_blend(x_left, y_top, coverage, color):
+    r'''Blends color onto the Target at x_left, y_top, with alpha scaled by coverage (0-1 array).
+    '''
+    height, width = coverage.shape
+    rect = clip(x_left, y_top, x_left + width, y_top + height)
+    if rect is None:
+        return
+    x1, y1, x2, y2 = rect
+    coverage = coverage[y1 - y_top: y2 - y_top, x1 - x_left: x2 - x_left]
+    src = np.empty(coverage.shape + (4,), dtype=np.float32)
+    src[...] = as_float(color)
+    src[..., 3] *= coverage
+    blend(Target[y1:y2, x1:x2], src)
+
+def draw_circle(center_x, center_y, radius, color):
+    x_left = math.floor(center_x - radius)
+    y_top = math.floor(center_y - radius)
+    size = math.ceil(2 * radius) + 2
+    ys, xs = np.mgrid[0:size, 0:size]
+    dist2 = (xs + x_left + 0.5 - center_x) ** 2 + (ys + y_top + 0.5 - center_y) ** 2
+    coverage_blend(x_left, y_top, (dist2 <= radius * radius).astype(np.float32), color)
+
+def draw_line_v(start, end, color):
+    draw_line_ex(start, end, 1.0, color)
+
+def draw_line_ex(start, end, thick, color):
+    x1, y1 = xy(start)
+    x2, y2 = xy(end)
+    half = thick / 2
+    x_left = math.floor(min(x1, x2) - half)
+    y_top = math.floor(min(y1, y2) - half)
+    width = math.ceil(max(x1, x2) + half) - x_left + 1
+    height = math.ceil(max(y1, y2) + half) - y_top + 1
+    ys, xs = np.mgrid[0:height, 0:width]
+    px = xs + x_left + 0.5
+    py = ys + y_top + 0.5
+    dx = x2 - x1
+    dy = y2 - y1
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return
+    # pixel centers within half of the thickness of the line segment, measured across the line
+    t = ((px - x1) * dx + (py - y1) * dy) / length2
+    across = np.abs((px - x1) * dy - (py - y1) * dx) / math.sqrt(length2)
+    inside = (t >= 0) & (t <= 1) & (across <= half)
+    coverage_blend(x_left, y_top, inside.astype(np.float32), color)
+
+def xy(v):
+    if isinstance(v, Vector2):
+        return v.x, v.y
+    return v[0], v[1]
+
+def draw_texture(texture, x, y, tint):
+    draw_texture_rec(texture, (0, 0, texture.width, texture.height), (x, y), tint)
+
+def draw_texture_rec(texture, source, position, tint):
+    r'''Same as raylib: source is in stored pixel rows, a negative width or height flips it.
+    '''
+    sx, sy, sw, sh = (round(v) for v in source)
+    x, y = (round(v) for v in xy(position))
+    flip_x = sw < 0
+    flip_y = sh < 0
+    sw = abs(sw)
+    sh = abs(sh)
+    pixels = texture.pixels[max(sy, 0): sy + sh, max(sx, 0): sx + sw]
+    if flip_y:
+        pixels = pixels[::-1]
+    if flip_x:
+        pixels = pixels[:, ::-1]
+    rect = clip(x, y, x + pixels.shape[1], y + pixels.shape[0])
+    if rect is None:
+        return
+    x1, y1, x2, y2 = rect
+    src = pixels[y1 - y: y2 - y, x1 - x: x2 - x].astype(np.float32) / 255
+    src *= as_float(tint)
+    blend(Target[y1:y2, x1:x2], src)
+
+def load_font(path):
+    return Font(path)
+
+def is_font_valid(font):
+    return ImageFont is None or os.path.exists(font.path)
+
+def glyph_advances(font, text, size):
+    if ImageFont is None:
+        return [0.6 * size] * len(text)
+    return [font.advance(c) * size / font.baseSize for c in text]
+
+def measure_text_ex(font, text, size, spacing):
+    r'''Same as raylib: the sum of the glyph advances (at baseSize, see Font.advance) scaled to
+    size, plus spacing between them, by size.
+    '''
+    if not text:
+        return Vector2(0.0, 0.0)
+    if ImageFont is None:
+        width = sum(glyph_advances(font, text, size))
+    else:
+        width = sum(font.advance(c) for c in text) * size / font.baseSize
+    return Vector2(width + spacing * (len(text) - 1), float(size))
+
+def draw_text_ex(font, text, position, size, spacing, color):
+    size = round(size)
+    x, y = xy(position)
+    advances = glyph_advances(font, text, size)
+    if ImageFont is None:
+        for c, advance in zip(text, advances):
+            if not c.isspace():
+                draw_rectangle(round(x + 1), round(y + size // 4), max(round(advance) - 2, 1),
+                               size // 2, color)
+            x += advance + spacing
+        return
+    pil_font = font.pil_font(size)
+    for c, advance in zip(text, advances):
+        if not c.isspace():
+            mask = PIL_Image.new('L', (math.ceil(advance) + size, size * 2))
+            ImageDraw.Draw(mask).text((0, 0), c, font=pil_font, fill=255)
+            coverage = np.asarray(mask, dtype=np.float32) / 255
+            coverage_blend(round(x), round(y), coverage, color)
+        x += advance + spacing
+
+def draw_fps(x, y):
+    pass
+
+def load_image_from_texture(texture):
+    return Image(texture.pixels.copy())
+
+def load_image_from_screen():
+    return Image(Framebuffer.copy())
+
+def image_crop(image, crop):
+    x, y, width, height = (round(v) for v in crop)
+    image.data = image.data[y: y + height, x: x + width].copy()
+    image.height, image.width = image.data.shape[:2]
+
+def export_image(image, filename):
+    write_png(filename, image.data)
+    return True
+
+def check_collision_point_rec(point, rec):
+    x, y = xy(point)
+    rx, ry, width, height = rec
+    return rx <= x < rx + width and ry <= y < ry + height
+
+def write_png(filename, pixels):
+    r'''Writes pixels (height x width x 4 uint8, top row first) as an RGBA png file.
+    '''
+    height, width = pixels.shape[:2]
+    raw = b''.join(b'\x00' + pixels[row].tobytes() for row in range(height))
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw)))
+        f.write(chunk(b'IEND', b''))
+
+
+def install():
+    r'''Makes "import pyray" get this module.
+
+    Must be called before anything that imports pyray is imported.
+    '''
+    me = sys.modules[__name__]
+    if sys.modules.setdefault('pyray', me) is not me:
+        raise RuntimeError("headless.install: pyray has already been imported")
+    global Touch_device_path
+    import screen
+    Touch_device_path = screen.Touch_device_path
+    screen.Touch_device_path = None
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', '-f', metavar='DIR',
+                        help="save each presented frame as a png in DIR")
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+
+    args = parser.parse_args()
+
+    if args.frames:
+        os.makedirs(args.frames, exist_ok=True)
+        Frame_dir = args.frames
+    install()
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    runpy.run_path(args.script, run_name="__main__")
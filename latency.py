@@ -0,0 +1,207 @@
+# latency.py
+
+r'''Low overhead latency instrumentation for the traffic_cop.run loop.
+
+This is off by default.  While off, the only cost is a check of latency.Enabled in a few places.
+
+enable(ring_size=1024)   # start collecting, also installs a SIGUSR1 handler that calls dump
+disable()
+dump(file=sys.stderr)    # print a summary of everything collected so far
+reset()                  # throw away everything collected so far
+
+Each thing timed gets its own Recorder, found by name.  A Recorder keeps the last ring_size samples
+(in a preallocated array) for percentiles, and a histogram of all samples since the last reset in
+power of 2 microsecond buckets.
+
+traffic_cop.run times:
+
+    - select: time spent waiting in Sel.select
+    - read:<fn> and write:<fn>: each read_fn/write_fn call
+    - alarm:<fn>: each alarm fn call
+    - draw_to_framebuffer
+    - load_new_screen
+
+Input sources call note_input(source, event_time) when they change the Screen.  The next present
+(presented(), called by traffic_cop after draw_to_framebuffer) records the time from the oldest
+event_time noted for each source to the present in the "<source>_to_photon" Recorder.  The
+event_times are time.time() based (CLOCK_REALTIME), which matches the kernel's evdev timestamps
+(SlotEvent.sec).
+
+Counters are simple named event counts (e.g., "syn_dropped") shown by dump.  These are kept even
+when not Enabled.
+
+    >>> r = Recorder("test", 4)
+    >>> for ms in (1, 2, 3, 4, 5):
+    ...     r.add(ms / 1000)
+    >>> r.count, len(r.recent())
+    (5, 4)
+    >>> r.percentile(0.5)
+    0.004
+    >>> r.max
+    0.005
+'''
+
+import sys
+import time
+import signal
+from array import array
+
+
+__all__ = "Enabled enable disable dump reset record record_fn note_input presented count " \
+          "Counters Recorder".split()
+
+
+Enabled = False
+Ring_size = 1024
+Num_buckets = 24             # bucket i is [2**(i-1), 2**i) usecs, the last bucket is open ended
+
+now = time.perf_counter      # used for all durations
+
+Recorders = {}               # {name: Recorder}
+Fn_recorders = {}            # {(prefix, fn): Recorder}, saves building names on each call
+Pending_inputs = {}          # {source: oldest event_time not yet presented}
+Counters = {}                # {name: count}
+
+
+class Recorder:
+    def __init__(self, name, size):
+        self.name = name
+        self.samples = array('d', bytes(8 * size))     # ring of the last size samples in secs
+        self.buckets = array('Q', bytes(8 * Num_buckets))
+        self.reset()
+
+    def reset(self):
+        self.index = 0        # where the next sample goes in samples
+        self.count = 0        # total samples since reset
+        self.total = 0.0
+        self.max = 0.0
+        for i in range(Num_buckets):
+            self.buckets[i] = 0
+
+    def add(self, secs):
+        self.samples[self.index] = secs
+        self.index += 1
+        if self.index >= len(self.samples):
+            self.index = 0
+        self.count += 1
+        self.total += secs
+        if secs > self.max:
+            self.max = secs
+        self.buckets[min(int(secs * 1000000).bit_length(), Num_buckets - 1)] += 1
+
+    def recent(self):
+        r'''Returns the samples still in the ring, oldest first.
+        '''
+        if self.count < len(self.samples):
+            return self.samples[:self.count]
+        return self.samples[self.index:] + self.samples[:self.index]
+
+    def percentile(self, fraction):
+        r'''Of the samples still in the ring.
+        '''
+        recent = sorted(self.recent())
+        if not recent:
+            return 0.0
+        return recent[min(int(fraction * len(recent)), len(recent) - 1)]
+
+    def dump(self, file):
+        if not self.count:
+            return
+        recent = sorted(self.recent())
+        def pct(fraction):
+            return recent[min(int(fraction * len(recent)), len(recent) - 1)] * 1000
+        print(f"{self.name}: n={self.count}, mean={self.total / self.count * 1000:.3f}, "
+              f"p50={pct(0.5):.3f}, p90={pct(0.9):.3f}, p99={pct(0.99):.3f}, "
+              f"max={self.max * 1000:.3f} mSec", file=file)
+        hist = ', '.join(f"<{bucket_limit(i)}:{n}" for i, n in enumerate(self.buckets) if n)
+        print(f"    usec histogram: {hist}", file=file)
+
+
+def bucket_limit(i):
+    if i == Num_buckets - 1:
+        return "inf"
+    return 1 << i
+
+def get_recorder(name):
+    recorder = Recorders.get(name)
+    if recorder is None:
+        recorder = Recorders[name] = Recorder(name, Ring_size)
+    return recorder
+
+def record(name, start_time):
+    r'''Records now() - start_time under name.
+
+    Only call this when Enabled.
+    '''
+    get_recorder(name).add(now() - start_time)
+
+def record_fn(prefix, fn, start_time):
+    r'''Records now() - start_time under "prefix:fn name".
+
+    Only call this when Enabled.
+    '''
+    recorder = Fn_recorders.get((prefix, fn))
+    if recorder is None:
+        name = f"{prefix}:{getattr(fn, '__qualname__', fn)}"
+        recorder = Fn_recorders[prefix, fn] = get_recorder(name)
+    recorder.add(now() - start_time)
+
+def note_input(source, event_time):
+    r'''Notes that an input from source, at event_time (time.time() based), changed the Screen.
+
+    Only the oldest event_time per source is kept until the next presented().
+    Only call this when Enabled.
+    '''
+    if source not in Pending_inputs:
+        Pending_inputs[source] = event_time
+
+def presented():
+    r'''Called by traffic_cop just after the Screen has been drawn to the framebuffer.
+
+    Only call this when Enabled.
+    '''
+    if Pending_inputs:
+        photon_time = time.time()
+        for source, event_time in Pending_inputs.items():
+            get_recorder(f"{source}_to_photon").add(photon_time - event_time)
+        Pending_inputs.clear()
+
+def count(name, n=1):
+    Counters[name] = Counters.get(name, 0) + n
+
+def reset():
+    for recorder in Recorders.values():
+        recorder.reset()
+    Pending_inputs.clear()
+    Counters.clear()
+
+def dump(file=None):
+    if file is None:
+        file = sys.stderr
+    print(f"latency.dump: {Enabled=}, times in mSec", file=file)
+    for name in sorted(Recorders):
+        Recorders[name].dump(file)
+    for name in sorted(Counters):
+        print(f"{name}: {Counters[name]}", file=file)
+
+def sigusr1(signum, frame):
+    dump()
+
+def enable(ring_size=1024):
+    r'''Starts collecting.  ring_size only applies to Recorders created after this.
+    '''
+    global Enabled, Ring_size
+    Ring_size = ring_size
+    signal.signal(signal.SIGUSR1, sigusr1)
+    Enabled = True
+
+def disable():
+    global Enabled
+    Enabled = False
+    Pending_inputs.clear()
+
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
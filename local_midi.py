@@ -0,0 +1,385 @@
+# local_midi.py
+
+r'''An in-process stand-in for alsa_midi, so midi_io can run without ALSA.
+
+midi_io creates its SequencerClient when it's imported, and anything importing commands or controls
+imports midi_io.  So this works like headless.py: call install() before importing anything that
+imports alsa_midi, and "import alsa_midi" gets this module.
+
+    import local_midi
+    local_midi.install()
+    import exp_console
+
+Or run a script under it:
+
+    python local_midi.py [--bpm BPM] [--jitter MSEC] [--delay SECS] [--measure-map FILE]
+                         script.py [script args...]
+
+This can be combined with headless.py to run with neither a display nor ALSA (in the directory
+with the modules generated by compiler/compiler.py):
+
+    python local_midi.py --bpm 200 headless.py exp_console.py
+
+local_midi has to go first, because headless.install imports screen, which imports midi_io.
+
+SequencerClient implements what midi_io uses of alsa_midi's SequencerClient: _fd, create_port,
+list_ports, event_input_pending, event_input, event_output, drain_output and close.  It has no
+connections to anything else.  Instead:
+
+    - Input events are given to it by send_input (from any thread).  Each call writes a byte into a
+      pipe, whose read end is _fd, so the traffic_cop select loop wakes up as it would for ALSA.
+    - Events sent by event_output are buffered until drain_output, which moves them to the
+      client's output deque (the last Max_output of them) and passes them to its output_fn, if set.
+      num_output and num_drains count them.
+
+If a bpm is given (to install, or --bpm), each SequencerClient gets a Clock_generator thread that
+sends it CLOCK events at that tempo, with random jitter (+/- jitter mSec, uniform) added to each
+clock's time.  The first clock is sent delay seconds after the client is created, to give the
+Screen time to come up.  This exercises the clock -> spp -> display path without a player.
+
+The SPP display needs a measure map before any clocks, so the Clock_generator first sends one, as
+the player does when a song is selected (see measure_map.py).  This is Default_measure_map, unless
+--measure-map gives a YAML file with the clocks_per_measure, part_duration_clocks, skips and
+odd_durations (see spp_helpers.calibrate_spp).
+
+Only the events that midi_io and commands use are here.  The EventType and PortCaps values are the
+ALSA sequencer's, as in alsa_midi.
+'''
+
+import sys
+import os
+import time
+import random
+import threading
+import runpy
+import argparse
+from enum import IntEnum, IntFlag
+from collections import deque
+
+from yaml import safe_load
+
+from measure_map import encode as encode_measure_map
+
+
+__all__ = """
+    EventType PortCaps SequencerClient Port PortInfo Event
+    StartEvent StopEvent ContinueEvent ClockEvent SystemEvent ControlChangeEvent
+    RegisteredParameterChangeEvent NonRegisteredParameterChangeEvent NoteOnEvent NoteOffEvent
+    SongPositionPointerEvent SongSelectEvent SysExEvent
+""".split()
+
+
+Max_output = 10000          # drained output events kept in SequencerClient.output
+
+Clock_bpm = None            # set by install, starts a Clock_generator for each SequencerClient
+Clock_jitter = 0            # mSec
+Clock_delay = 2             # secs before the first clock
+Clock_measure_map = None    # set by install, the calibrate_spp args sent before the first clock
+
+Clocks_per_qtr = 24
+
+
+class EventType(IntEnum):
+    SYSTEM = 0
+    RESULT = 1
+    NOTE = 5
+    NOTEON = 6
+    NOTEOFF = 7
+    KEYPRESS = 8
+    CONTROLLER = 10
+    PGMCHANGE = 11
+    CHANPRESS = 12
+    PITCHBEND = 13
+    CONTROL14 = 14
+    NONREGPARAM = 15
+    REGPARAM = 16
+    SONGPOS = 20
+    SONGSEL = 21
+    QFRAME = 22
+    TIMESIGN = 23
+    KEYSIGN = 24
+    START = 30
+    CONTINUE = 31
+    STOP = 32
+    SETPOS_TICK = 33
+    SETPOS_TIME = 34
+    TEMPO = 35
+    CLOCK = 36
+    TICK = 37
+    TUNE_REQUEST = 40
+    RESET = 41
+    SENSING = 42
+    SYSEX = 130
+    NONE = 255
+
+
+class PortCaps(IntFlag):
+    READ = 1 << 0
+    WRITE = 1 << 1
+    SYNC_READ = 1 << 2
+    SYNC_WRITE = 1 << 3
+    DUPLEX = 1 << 4
+    SUBS_READ = 1 << 5
+    SUBS_WRITE = 1 << 6
+    NO_EXPORT = 1 << 7
+
+
+class Event:
+    r'''Base class for the events.  Subclasses set type and the names of their args.
+    '''
+    type = EventType.NONE
+    arg_names = ()
+
+    def __init__(self, *args, source=None, **kwargs):
+        for name, value in zip(self.arg_names, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+        self.source = source    # (client_id, port_id), or None
+
+    def __repr__(self):
+        args = ', '.join(repr(getattr(self, name, None)) for name in self.arg_names)
+        return f"{self.__class__.__name__}({args})"
+
+class StartEvent(Event):
+    type = EventType.START
+
+class StopEvent(Event):
+    type = EventType.STOP
+
+class ContinueEvent(Event):
+    type = EventType.CONTINUE
+
+class ClockEvent(Event):
+    type = EventType.CLOCK
+
+class SystemEvent(Event):
+    type = EventType.SYSTEM
+    arg_names = ('event', 'result')
+
+class ControlChangeEvent(Event):
+    type = EventType.CONTROLLER
+    arg_names = ('channel', 'param', 'value')
+
+class RegisteredParameterChangeEvent(Event):
+    type = EventType.REGPARAM
+    arg_names = ('channel', 'param', 'value')
+
+class NonRegisteredParameterChangeEvent(Event):
+    type = EventType.NONREGPARAM
+    arg_names = ('channel', 'param', 'value')
+
+class NoteOnEvent(Event):
+    type = EventType.NOTEON
+    arg_names = ('note', 'channel', 'velocity')
+
+class NoteOffEvent(Event):
+    type = EventType.NOTEOFF
+    arg_names = ('note', 'channel', 'velocity')
+
+class SongPositionPointerEvent(Event):
+    type = EventType.SONGPOS
+    arg_names = ('channel', 'value')
+
+class SongSelectEvent(Event):
+    type = EventType.SONGSEL
+    arg_names = ('channel', 'value')
+
+class SysExEvent(Event):
+    type = EventType.SYSEX
+    arg_names = ('data',)
+
+
+class PortInfo:
+    def __init__(self, client_id, port_id, name, client_name):
+        self.client_id = client_id
+        self.port_id = port_id
+        self.name = name
+        self.client_name = client_name
+
+class Port:
+    r'''A port on a SequencerClient.  There's nothing to connect to, so connections are just noted.
+    '''
+    def __init__(self, client, port_id, name, caps):
+        self.client = client
+        self.port_id = port_id
+        self.name = name
+        self.caps = caps
+        self.connected_to = []
+        self.connected_from = []
+
+    def connect_to(self, port_info):
+        self.connected_to.append(port_info)
+
+    def connect_from(self, port_info):
+        self.connected_from.append(port_info)
+
+    def close(self):
+        self.client.ports.remove(self)
+
+
+class SequencerClient:
+    Next_client_id = 128
+
+    def __init__(self, client_name):
+        self.client_name = client_name
+        self.client_id = SequencerClient.Next_client_id
+        SequencerClient.Next_client_id += 1
+        self.ports = []
+        self.input = deque()
+        self._fd, self.wake_fd = os.pipe()
+        os.set_blocking(self._fd, False)
+        self.output_buffer = []
+        self.output = deque(maxlen=Max_output)
+        self.output_fn = None   # called with each list of events drained
+        self.num_output = 0
+        self.num_drains = 0
+        self.clock = None
+        if Clock_bpm is not None:
+            self.clock = Clock_generator(self, Clock_bpm, Clock_jitter, Clock_delay,
+                                         Clock_measure_map)
+            self.clock.start()
+
+    def create_port(self, name, caps, *args, **kwargs):
+        port = Port(self, len(self.ports), name, caps)
+        self.ports.append(port)
+        return port
+
+    def list_ports(self, *args, **kwargs):
+        r'''There aren't any other clients.
+        '''
+        return []
+
+    def send_input(self, *events):
+        r'''Queues events for event_input, and wakes up anybody selecting on _fd.
+
+        Thread safe.
+        '''
+        self.input.extend(events)
+        os.write(self.wake_fd, b'\0')
+
+    def event_input_pending(self, fetch_sequencer=True):
+        r'''Returns the number of events waiting for event_input.
+        '''
+        if fetch_sequencer:
+            # clear the wakeups, any send_input after this will wake the select loop again.
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        return len(self.input)
+
+    def event_input(self, *args, **kwargs):
+        r'''Returns the next input event, or None if there aren't any.
+        '''
+        if self.input:
+            return self.input.popleft()
+        return None
+
+    def event_output(self, event, *args, port=None, **kwargs):
+        self.output_buffer.append(event)
+
+    def drain_output(self):
+        events = self.output_buffer
+        self.output_buffer = []
+        self.output.extend(events)
+        self.num_output += len(events)
+        self.num_drains += 1
+        if self.output_fn is not None:
+            self.output_fn(events)
+        return 0
+
+    def close(self):
+        if self.clock is not None:
+            self.clock.stop()
+            self.clock = None
+        os.close(self._fd)
+        os.close(self.wake_fd)
+
+
+# calibrate_spp args: 100 measures of 4/4
+Default_measure_map = (4 * Clocks_per_qtr, 100 * 4 * Clocks_per_qtr, [(1, '1'), (2, '2')], {})
+
+def load_measure_map(filename):
+    r'''Returns the calibrate_spp args from a YAML file.
+    '''
+    with open(filename, "r") as yaml_file:
+        info = safe_load(yaml_file)
+    return (info['clocks_per_measure'], info['part_duration_clocks'],
+            [(measure_number, str(name)) for measure_number, name in info['skips']],
+            {str(name): duration for name, duration in info.get('odd_durations', {}).items()})
+
+class Clock_generator(threading.Thread):
+    r'''Sends CLOCK events to client at bpm quarter notes per minute.
+
+    The measure_map (calibrate_spp args) is sent first, as SYSEX events.
+
+    Each clock is sent at its scheduled time plus a random jitter of +/- jitter mSec, so the jitter
+    doesn't accumulate.  num_clocks counts the clocks sent.
+    '''
+    def __init__(self, client, bpm, jitter=0, delay=0, measure_map=Default_measure_map):
+        super().__init__(daemon=True)
+        self.client = client
+        self.period = 60 / (bpm * Clocks_per_qtr)
+        self.jitter = jitter / 1000
+        self.delay = delay
+        self.measure_map = measure_map
+        self.num_clocks = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        start_time = time.time() + self.delay
+        while True:
+            due = start_time + self.num_clocks * self.period
+            if self.jitter:
+                due += random.uniform(-self.jitter, self.jitter)
+            if self.stopped.wait(max(0, due - time.time())):
+                break
+            if self.num_clocks == 0:
+                for message in encode_measure_map(*self.measure_map):
+                    self.client.send_input(SysExEvent(message))
+            self.client.send_input(ClockEvent())
+            self.num_clocks += 1
+
+    def stop(self):
+        self.stopped.set()
+
+
+def install(bpm=None, jitter=0, delay=2, measure_map=Default_measure_map):
+    r'''Makes "import alsa_midi" get this module.
+
+    If bpm is given, each SequencerClient gets a Clock_generator (see the module docstring).
+
+    Must be called before anything that imports alsa_midi is imported.
+    '''
+    global Clock_bpm, Clock_jitter, Clock_delay, Clock_measure_map
+    me = sys.modules[__name__]
+    if sys.modules.setdefault('alsa_midi', me) is not me:
+        raise RuntimeError("local_midi.install: alsa_midi has already been imported")
+    Clock_bpm = bpm
+    Clock_jitter = jitter
+    Clock_delay = delay
+    Clock_measure_map = measure_map
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bpm', type=float, help="send CLOCK events at this tempo")
+    parser.add_argument('--jitter', '-j', type=float, default=0,
+                        help="+/- mSec of random jitter on each clock")
+    parser.add_argument('--delay', '-d', type=float, default=2,
+                        help="secs before the first clock")
+    parser.add_argument('--measure-map', '-m', metavar='FILE',
+                        help="YAML measure map to send before the first clock")
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+
+    args = parser.parse_args()
+
+    install(args.bpm, args.jitter, args.delay,
+            Default_measure_map if args.measure_map is None else load_measure_map(args.measure_map))
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    runpy.run_path(args.script, run_name="__main__")
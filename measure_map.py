@@ -0,0 +1,245 @@
+# measure_map.py
+
+r'''The binary measure map sent by the player in SYSEX messages when a song is selected.
+
+The measure map is what calibrate_spp needs: clocks_per_measure, part_duration_clocks, skips and
+odd_durations (see spp_helpers.calibrate_spp).  This used to be sent as a YAML document, which is
+slow to parse on the main loop.  YAML is still accepted (see decode_sysex).
+
+Each SYSEX message is:
+
+    F0 7D 4D <version> <chunk_index> <num_chunks> <7-bit packed data> F7
+
+7D is the MIDI non-commercial manufacturer id, 4D is 'M'.  The data is split across num_chunks
+messages, which are concatenated in chunk_index order before decoding.
+
+The data, before 7-bit packing, is (all little endian):
+
+    clocks_per_measure    u32
+    part_duration_clocks  u32
+    num_skips             u16
+    num_odd_durations     u16
+    skips                 num_skips of: measure_number u16, name
+    odd_durations         num_odd_durations of: name, duration_clocks u32
+
+where each name is: length u8, ASCII chars.
+
+The 7-bit packing is the usual MIDI one: each group of up to 7 bytes is sent as a byte with the
+high bits of the group (bit i for byte i), followed by the group's bytes with their high bits
+cleared.
+
+    >>> skips = [(1, '1'), (2, '2-1'), (18, '2-2'), (33, '18-2')]
+    >>> odd_durations = {'1': 12, '51': 36}
+    >>> messages = encode(96, 7200, skips, odd_durations, max_chunk_bytes=16)
+    >>> len(messages)
+    3
+    >>> all(b < 0x80 for m in messages for b in m[1:-1])
+    True
+    >>> assembler = Assembler()
+    >>> [assembler.add(m) for m in messages[:-1]]
+    [None, None]
+    >>> assembler.add(messages[-1])
+    Measure_map(clocks_per_measure=96, part_duration_clocks=7200, skips=[(1, '1'), (2, '2-1'), (18, '2-2'), (33, '18-2')], odd_durations={'1': 12, '51': 36})
+    >>> decode_sysex(b"clocks_per_measure: 96\npart_duration_clocks: 7200\nskips: [[1, '1']]\nodd_durations: {}\n")
+    Measure_map(clocks_per_measure=96, part_duration_clocks=7200, skips=[[1, '1']], odd_durations={})
+'''
+
+import struct
+from collections import namedtuple
+from yaml import safe_load, YAMLError
+
+
+__all__ = "Measure_map encode decode Assembler decode_sysex".split()
+
+
+Version = 1
+Manufacturer_id = 0x7D   # non-commercial
+Format_id = 0x4D         # 'M'
+Header = bytes((0xF0, Manufacturer_id, Format_id))
+Max_chunk_bytes = 240    # unpacked data bytes per SYSEX message
+
+Counts = struct.Struct('<IIHH')
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+
+
+Measure_map = namedtuple("Measure_map",
+                         "clocks_per_measure part_duration_clocks skips odd_durations")
+
+
+def pack_7bit(data):
+    r'''Packs 8-bit data into 7-bit bytes.
+
+        >>> pack_7bit(bytes((0x81, 2, 0xFF)))
+        b'\x05\x01\x02\x7f'
+    '''
+    packed = bytearray()
+    for i in range(0, len(data), 7):
+        group = data[i: i + 7]
+        high_bits = 0
+        for j, b in enumerate(group):
+            if b & 0x80:
+                high_bits |= 1 << j
+        packed.append(high_bits)
+        packed.extend(b & 0x7F for b in group)
+    return bytes(packed)
+
+def unpack_7bit(packed):
+    r'''The inverse of pack_7bit.
+
+        >>> unpack_7bit(b'\x05\x01\x02\x7f')
+        b'\x81\x02\xff'
+    '''
+    data = bytearray()
+    for i in range(0, len(packed), 8):
+        high_bits = packed[i]
+        for j, b in enumerate(packed[i + 1: i + 8]):
+            if high_bits & (1 << j):
+                b |= 0x80
+            data.append(b)
+    return bytes(data)
+
+def encode_name(name):
+    name = name.encode("ASCII")
+    return bytes((len(name),)) + name
+
+def encode(clocks_per_measure, part_duration_clocks, skips, odd_durations,
+           max_chunk_bytes=Max_chunk_bytes):
+    r'''Returns a list of complete SYSEX messages (bytes, F0 through F7) for the measure map.
+    '''
+    data = bytearray(Counts.pack(clocks_per_measure, part_duration_clocks,
+                                 len(skips), len(odd_durations)))
+    for measure_number, name in skips:
+        data += U16.pack(measure_number)
+        data += encode_name(name)
+    for name, duration in odd_durations.items():
+        data += encode_name(name)
+        data += U32.pack(duration)
+    chunks = [data[i: i + max_chunk_bytes] for i in range(0, len(data), max_chunk_bytes)]
+    if len(chunks) > 0x7F:
+        raise ValueError(f"encode: measure map too big, {len(data)} bytes needs {len(chunks)} "
+                         f"chunks, increase max_chunk_bytes")
+    return [Header + bytes((Version, i, len(chunks))) + pack_7bit(chunk) + b'\xF7'
+            for i, chunk in enumerate(chunks)]
+
+def decode(data):
+    r'''Decodes the (unpacked, concatenated) data into a Measure_map.
+    '''
+    clocks_per_measure, part_duration_clocks, num_skips, num_odd_durations = \
+      Counts.unpack_from(data, 0)
+    offset = Counts.size
+
+    def get_name():
+        nonlocal offset
+        length = data[offset]
+        name = data[offset + 1: offset + 1 + length].decode("ASCII")
+        offset += 1 + length
+        return name
+
+    skips = []
+    for _ in range(num_skips):
+        measure_number, = U16.unpack_from(data, offset)
+        offset += U16.size
+        skips.append((measure_number, get_name()))
+    odd_durations = {}
+    for _ in range(num_odd_durations):
+        name = get_name()
+        odd_durations[name], = U32.unpack_from(data, offset)
+        offset += U32.size
+    return Measure_map(clocks_per_measure, part_duration_clocks, skips, odd_durations)
+
+def is_measure_map(message):
+    return message.startswith(Header) or message.startswith(Header[1:])
+
+class Assembler:
+    r'''Collects the chunks of a measure map as their SYSEX messages come in.
+    '''
+    def __init__(self):
+        self.chunks = {}   # {chunk_index: unpacked data}
+        self.num_chunks = None
+
+    def add(self, message):
+        r'''Adds one SYSEX message (with or without the F0 and F7).
+
+        Returns the Measure_map once all of the chunks are in, else None.
+
+        A message that can't be decoded (a different version, a short or garbled chunk) is printed
+        and ignored, and the chunks collected so far are dropped:
+
+            >>> assembler = Assembler()
+            >>> messages = encode(96, 7200, [(1, '1'), (2, '2')], {}, max_chunk_bytes=8)
+            >>> assembler.add(messages[0])
+            >>> assembler.add(messages[1][:3] + bytes((Version + 1,)) + messages[1][4:])
+            Assembler.add: unsupported measure map version 2 -- ignored
+            >>> assembler.chunks, assembler.num_chunks
+            ({}, None)
+            >>> assembler.add(messages[0][:4])
+            Assembler.add: ValueError: not enough values to unpack (expected 3, got 1) -- ignored
+            >>> [assembler.add(m) for m in messages]
+            [None, None, Measure_map(clocks_per_measure=96, part_duration_clocks=7200, skips=[(1, '1'), (2, '2')], odd_durations={})]
+        '''
+        try:
+            if message[0] == 0xF0:
+                message = message[1:]
+            if message[-1] == 0xF7:
+                message = message[:-1]
+            version, chunk_index, num_chunks = message[2:5]
+            if version != Version:
+                print(f"Assembler.add: unsupported measure map version {version} -- ignored")
+                self.reset()
+                return None
+            if num_chunks != self.num_chunks or chunk_index == 0:
+                # start of a new measure map
+                self.chunks = {}
+                self.num_chunks = num_chunks
+            self.chunks[chunk_index] = unpack_7bit(message[5:])
+            if len(self.chunks) < num_chunks:
+                return None
+            data = b''.join(self.chunks[i] for i in range(num_chunks))
+            self.reset()
+            return decode(data)
+        except (ValueError, IndexError, KeyError, struct.error) as e:
+            print(f"Assembler.add: {e.__class__.__name__}: {e} -- ignored")
+            self.reset()
+            return None
+
+    def reset(self):
+        r'''Drops the chunks collected so far.
+        '''
+        self.chunks = {}
+        self.num_chunks = None
+
+def decode_sysex(message, assembler=None):
+    r'''Decodes a measure map SYSEX message, binary or YAML.
+
+    Returns the Measure_map, or None if this is a binary chunk and more chunks are needed, or if the
+    message can't be decoded (which is printed and ignored).
+
+        >>> decode_sysex(b"clocks_per_measure: 96\n")
+        decode_sysex: KeyError: 'part_duration_clocks' -- ignored
+    '''
+    if is_measure_map(message):
+        if assembler is None:
+            assembler = Default_assembler
+        return assembler.add(message)
+    try:
+        if message[0] == 0xF0:
+            message = message[1:]
+        if message[-1] == 0xF7:
+            message = message[:-1]
+        measure_info = safe_load(message.decode("ASCII"))
+        return Measure_map(measure_info["clocks_per_measure"],
+                           measure_info["part_duration_clocks"],
+                           measure_info["skips"],
+                           measure_info["odd_durations"])
+    except (ValueError, IndexError, KeyError, TypeError, YAMLError) as e:
+        print(f"decode_sysex: {e.__class__.__name__}: {e} -- ignored")
+        return None
+
+Default_assembler = Assembler()
+
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -3,7 +3,6 @@
 import sys
 import os
 import time
-from yaml import safe_load
 from alsa_midi import (SequencerClient, PortCaps, EventType,
                        StartEvent, StopEvent, ContinueEvent, ClockEvent,
                        SystemEvent,               # (event, result), i.e. (status_byte, data_byte)
@@ -16,18 +15,26 @@ from alsa_midi import (SequencerClient, PortCaps, EventType,
 
 import screen
 import traffic_cop
+import latency
 from scale_fns import *
 from spp_helpers import calibrate_spp
+import measure_map
 
 Trace = False
 
 # Event_type_names[event.type] -> name
 Event_type_names = {e_value.value: e_value.name for e_value in EventType}
 
+CLOCK = EventType.CLOCK
+
+# These flush the output as soon as they're sent (see send_midi_event).
+Transport_types = frozenset((EventType.START, EventType.STOP, EventType.CONTINUE, EventType.SONGPOS))
+
 Clocks_per_qtr = 24
 Clocks_per_whole = Clocks_per_qtr * 4
 Clocks_per_spp = Clocks_per_whole // 16
 
+# This is local_midi's stand-in if local_midi.install() was called first.
 Client = SequencerClient("Exp Console")
 print("Client:", Client.client_id)
 Port = Client.create_port("Player Control",
@@ -60,12 +67,15 @@ def init(screen):
     if Trace:
         print("midi_io.init")
     traffic_cop.register_read(Client._fd, get_midi_events)
+    traffic_cop.register_end_of_loop(flush_output)
 
 @screen.register_quit2
 def quit(screen):
     if Trace:
         print("midi_io.quit")
     traffic_cop.unregister_read(Client._fd)
+    traffic_cop.unregister_end_of_loop(flush_output)
+    flush_output()
     Port.close()
     Client.close()
 
@@ -115,99 +125,172 @@ def set_midi_spp(spp):
     Clock_count = spp * Clocks_per_spp
 
 def get_midi_events(_fd):
-    global Clock_running, Clock_count, Beats, Beat_type, Clocks_per_beat_type, Spp_per_beat_type
-    global End_spp, End_spp_fn
+    r'''This is registered with the traffic_cop module as the read_fn for the Client.
 
+    Returns True if the screen was changed.
+    '''
     if Trace:
         print("midi_io.get_midi_events")
     start_time = time.time()
+    return process_midi_events(read_midi_events(), start_time)
+
+def read_midi_events():
+    r'''Reads all of the events pending on Client.  Returns a list of them.
+    '''
+    events = []
     num_pending = Client.event_input_pending(True) # w/False, often 0, but there's still an event.
                                                    # w/True, always at least 1, but often more
-    pending_time = time.time()
-    #print("event_input_pending took", pending_time - start_time)
-    #print(f"{num_pending=}")
-    screen_changed = False
     while num_pending:
-        num_pending -= 1
-       #print("calling Client.event_input()")
-        event = Client.event_input()
-       #print(f"Client.event_input() -> {Event_type_names[event.type]}")
-        input_time = time.time()
-       #print("event_input took", input_time - pending_time)
-        match event.type:
-            case EventType.CLOCK:
-                Clock_count += 1
-                if Clock_count % Clocks_per_spp == 0:
-                    spp = get_spp()
-                    if Notify_location_fn(spp):
-                        screen_changed = True
-                    if spp >= End_spp:
-                        fn = End_spp_fn
-                        End_spp = 1000000000
-                        End_spp_fn = false
-                        if fn(spp):
-                            screen_changed = True
-            case EventType.START:
-                # FIX: Not going to see these anymore...
-                print("Got", event, "source", event.source)
-                Clock_count = 0
-                spp = get_spp()
-                if Notify_location_fn(spp):
+        for _ in range(num_pending):
+            events.append(Client.event_input())
+        num_pending = Client.event_input_pending(False)  # anything left in the input buffer
+    return events
+
+def process_midi_events(events, start_time):
+    r'''Processes a list of input events (from read_midi_events).
+
+    start_time is the time.time() when the events were read, for latency.
+
+    CLOCK events are the vast majority, so these are just counted here.  Each run of them is then
+    applied by advance_clock, which only does something if an spp boundary has been crossed.
+    Everything else goes to process_midi_event.
+
+    Returns True if the screen was changed.
+    '''
+    screen_changed = False
+    clocks = 0
+    for event in events:
+        if event.type == CLOCK:
+            clocks += 1
+        else:
+            if clocks:
+                screen_changed |= advance_clock(clocks, start_time)
+                clocks = 0
+            screen_changed |= process_midi_event(event)
+    if clocks:
+        screen_changed |= advance_clock(clocks, start_time)
+    return screen_changed
+
+def advance_clock(clocks, start_time):
+    r'''Adds clocks to Clock_count.
+
+    Calls Notify_location_fn (once) if this gets to a new spp, and End_spp_fn if it gets to End_spp.
+
+    Returns True if the screen was changed.
+    '''
+    global Clock_count, End_spp, End_spp_fn
+    old_spp = Clock_count // Clocks_per_spp
+    Clock_count += clocks
+    spp = Clock_count // Clocks_per_spp
+    if spp == old_spp:
+        return False
+    screen_changed = False
+    if Notify_location_fn(spp):
+        screen_changed = True
+        if latency.Enabled:
+            latency.note_input("midi_clock", start_time)
+    if spp >= End_spp:
+        fn = End_spp_fn
+        End_spp = 1000000000
+        End_spp_fn = false
+        if fn(spp):
+            screen_changed = True
+    return screen_changed
+
+def process_midi_event(event):
+    r'''Processes one input event, other than CLOCK.
+
+    Returns True if the screen was changed.
+    '''
+    global Clock_running, Clock_count, Beats, Beat_type, Clocks_per_beat_type, Spp_per_beat_type
+    global End_spp, End_spp_fn
+
+    screen_changed = False
+    match event.type:
+        case EventType.CLOCK:
+            return advance_clock(1, time.time())
+        case EventType.START:
+            # FIX: Not going to see these anymore...
+            print("Got", event, "source", event.source)
+            Clock_count = 0
+            spp = get_spp()
+            if Notify_location_fn(spp):
+                screen_changed = True
+            if spp >= End_spp:
+                fn = End_spp_fn
+                End_spp = 1000000000
+                End_spp_fn = false
+                if fn(spp):
+                    screen_changed = True
+            Clock_running = True
+        case EventType.STOP:
+            # FIX: Not going to see these anymore...
+            print("Got", event, "source", event.source, "Clock_count", Clock_count)
+            Clock_running = False
+        case EventType.CONTINUE:
+            # FIX: Not going to see these anymore...
+            print("Got", event, "source", event.source)
+            Clock_running = True
+       #case EventType.SONGPOS:
+       #    spp = event.value
+       #    set_spp(spp)
+       #    screen_changed = True
+       #case EventType.SONGSEL:
+       #    song_num = event.value
+        case EventType.SYSTEM:
+            match event.event:
+                case 0xF4:  # tempo
+                    bpm = Tempo_scale.scale_rounded(event.result)
+                    #print(f"get_midi_events got tempo {bpm=}, {event.source=} -- ignored")
+                case 0xF5:  # time signature
+                    Beats, Beat_type = data_to_time_sig(event.result)
+                    print("Got time signature", Beats, Beat_type, "source", event.source)
+                    Clocks_per_beat_type = Clocks_per_whole // Beat_type
+                    Spp_per_beat_type = Clocks_per_beat_type // Clocks_per_spp
+                    Clocks_per_measure = Clocks_per_beat_type * Beats
+                    Spp_per_measure = Spp_per_beat_type * Beats
+                case _:
+                    print(f"Unrecognized SYSTEM event {event.event=}, {event.source=} -- ignored")
+       #case EventType.CONTROLLER:
+       #    match event.param:
+        case EventType.SYSEX:
+            # binary measure map (possibly in several chunks), or YAML from older players
+            song_measure_map = measure_map.decode_sysex(event.data)
+            if song_measure_map is not None:
+                if calibrate_spp(*song_measure_map):
                     screen_changed = True
-                if spp >= End_spp:
-                    fn = End_spp_fn
-                    End_spp = 1000000000
-                    End_spp_fn = false
-                    if fn(spp):
-                        screen_changed = True
-                Clock_running = True
-            case EventType.STOP:
-                # FIX: Not going to see these anymore...
-                print("Got", event, "source", event.source, "Clock_count", Clock_count)
-                Clock_running = False
-            case EventType.CONTINUE:
-                # FIX: Not going to see these anymore...
-                print("Got", event, "source", event.source)
-                Clock_running = True
-           #case EventType.SONGPOS:
-           #    spp = event.value
-           #    set_spp(spp)
-           #    screen_changed = True
-           #case EventType.SONGSEL:
-           #    song_num = event.value
-            case EventType.SYSTEM:
-                match event.event:
-                    case 0xF4:  # tempo
-                        bpm = Tempo_scale.scale_rounded(event.result)
-                        #print(f"get_midi_events got tempo {bpm=}, {event.source=} -- ignored")
-                    case 0xF5:  # time signature
-                        Beats, Beat_type = data_to_time_sig(event.result)
-                        print("Got time signature", Beats, Beat_type, "source", event.source)
-                        Clocks_per_beat_type = Clocks_per_whole // Beat_type
-                        Spp_per_beat_type = Clocks_per_beat_type // Clocks_per_spp
-                        Clocks_per_measure = Clocks_per_beat_type * Beats
-                        Spp_per_measure = Spp_per_beat_type * Beats
-                    case _:
-                        print(f"Unrecognized SYSTEM event {event.event=}, {event.source=} -- ignored")
-           #case EventType.CONTROLLER:
-           #    match event.param:
-            case EventType.SYSEX:
-                measure_info = safe_load(event.data.decode("ASCII"))
-                calibrate_spp(measure_info["clocks_per_measure"],
-                              measure_info["part_duration_clocks"],
-                              measure_info["skips"],
-                              measure_info["odd_durations"])
-                num_pending = Client.event_input_pending(True)
-            case _:
-                print(f"Unrecognized event.type {Event_type_names[event.type]}, "
-                      f"{event.source=} -- ignored")
+        case _:
+            print(f"Unrecognized event.type {Event_type_names[event.type]}, "
+                  f"{event.source=} -- ignored")
     return screen_changed
 
-def send_midi_event(event):
-    r'''Also calls drain_output.
+Output_pending = 0   # number of events output since the last drain_output
+
+def send_midi_event(event, flush=False):
+    r'''Buffers event in the ALSA output buffer.  It goes out on the next flush_output.
+
+    flush_output is registered with traffic_cop.register_end_of_loop, so all of the events sent
+    during one run loop iteration go out with one drain_output.
+
+    Transport events (Transport_types) are latency critical, so these (and any events buffered
+    before them, to keep the order) are flushed immediately.  Pass flush=True to do the same for any
+    other event.
     '''
+    global Output_pending
     Client.event_output(event, port=Port)
-    Client.drain_output()
+    Output_pending += 1
+    if flush or event.type in Transport_types:
+        flush_output()
+
+def flush_output():
+    r'''Sends all events buffered by send_midi_event.
+    '''
+    global Output_pending
+    if Output_pending:
+        if Trace:
+            print(f"midi_io.flush_output: {Output_pending} events")
+        Client.drain_output()
+        Output_pending = 0
 
 
 # FIX: Do we need to read from stdin?  If so, move to new module...
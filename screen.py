@@ -10,11 +10,18 @@ Your function will not be passed any arguments.
 
 Use the screen object as a context manager to close the screen at the end of the with statement.
 
+Anything drawn on the Screen's render_texture must also call screen.damage(x, y, width, height) so
+that draw_to_framebuffer knows to present that area.  The generated widgets, Texture.draw (and so
+Sprite restores) do this for you.
+
+To run without a display (or touch device), see headless.py.
+
 This module also serves as a top level module that can be safely imported into all of the other modules
 and used to get to shared global values.
 '''
 
 from operator import itemgetter
+from collections import deque
 
 from pyray import *
 
@@ -101,6 +108,57 @@ Touch_device_path = "/dev/input/by-id/usb-Siliconworks_SiW_HID_Touch_Controller-
 Font_dir = "/usr/share/fonts/truetype/dejavu"
 
 
+# If the damaged area is more than this fraction of the screen, just present the whole screen.
+Full_present_fraction = 0.5
+
+# More damaged rects than this are merged into their bounding box.
+Max_damage_rects = 16
+
+def damage(x, y, width, height):
+    r'''Records that the rectangle at x, y (upper left corner, ints) has been drawn on.
+
+    Ignored unless the Screen's render_texture is the texture currently being drawn on.
+    '''
+    if texture.Current_texture is not None and texture.Current_texture.is_screen:
+        damaged = Screen.damaged
+        if damaged is not None:
+            damaged.append((x, y, width, height))
+
+def merge_rects(rects, width, height):
+    r'''Returns a list of non-overlapping rects covering all of rects, clipped to width x height.
+
+    All rects are (x, y, width, height).  Overlapping rects (and rects that share an edge) are
+    replaced by their bounding box.  If there are more than Max_damage_rects left, they are all
+    replaced by their bounding box.
+
+        >>> merge_rects([(10, 10, 5, 5), (12, 12, 5, 5), (100, 100, 3, 3)], 1920, 1080)
+        [(10, 10, 7, 7), (100, 100, 3, 3)]
+        >>> merge_rects([(-5, 1070, 20, 20), (0, 0, 0, 4)], 1920, 1080)
+        [(0, 1070, 15, 10)]
+    '''
+    boxes = []   # [x_left, y_top, x_right + 1, y_bottom + 1]
+    for x, y, w, h in rects:
+        box = [max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)]
+        if box[0] >= box[2] or box[1] >= box[3]:
+            continue
+        merged = True
+        while merged:
+            merged = False
+            for i, other in enumerate(boxes):
+                if box[0] <= other[2] and other[0] <= box[2] and \
+                   box[1] <= other[3] and other[1] <= box[3]:
+                    box = [min(box[0], other[0]), min(box[1], other[1]),
+                           max(box[2], other[2]), max(box[3], other[3])]
+                    del boxes[i]
+                    merged = True
+                    break
+        boxes.append(box)
+    if len(boxes) > Max_damage_rects:
+        boxes = [[min(box[0] for box in boxes), min(box[1] for box in boxes),
+                  max(box[2] for box in boxes), max(box[3] for box in boxes)]]
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in boxes]
+
+
 Inits = []  # Run in ascending prio order
 Quits = []  # Run in descending prio order
 
@@ -152,16 +210,31 @@ def register_quit2(quit_fn, prio=2):
 class Screen_class:
     r'''Screen measures 20.75" wide, and 11.11/16" high.  That's 0.0108"/pixel in both dimensions.
     '''
-    def __init__(self, width=1920, height=1080, background_color=SKYBLUE, trace=False):
+    def __init__(self, width=1920, height=1080, background_color=SKYBLUE, vsync=False,
+                 framebuffers=2, trace=False):
+        r'''If vsync is True, draw_to_framebuffer waits for the display's vertical sync.
+
+        framebuffers is the number of buffers the display driver flips between.  A partial present
+        has to redraw what was damaged since the buffer being drawn into was last shown.
+        '''
         global Screen
-        print(f"{width=}, {height=}")
+        print(f"{width=}, {height=}, {vsync=}")
         self.width = width
         self.height = height
         self.center_x = (width - 1) // 2 + 1
         self.center_y = (height - 1) // 2 + 1
         self.background_color = background_color
         self.trace = trace
+
+        # damaged is a list of (x, y, width, height) drawn on since the last present, or None
+        # if the whole screen needs to be presented.  damage_history has the damaged for the last
+        # framebuffers - 1 presents.  Nothing is known to be in the framebuffers yet...
+        self.damaged = None
+        self.damage_history = deque([None] * (framebuffers - 1), maxlen=framebuffers - 1)
+
         set_trace_log_level(LOG_WARNING)
+        if vsync:
+            set_config_flags(FLAG_VSYNC_HINT)
         init_window(width, height, "Exp_console")  # width height title
         self.render_texture = texture.Texture("Screen", width, height, background_color, is_screen=True)
         #self.draw_to_framebuffer()
@@ -205,21 +278,51 @@ class Screen_class:
         If from_scratch is True, it will first clear the render_texture to the background_color.
         '''
         #print(f"Screen.update calling render_texture.draw_on_texture")
+        if from_scratch:
+            self.damage_all()
         return self.render_texture.draw_on_texture(draw_to_framebuffer=draw_to_framebuffer,
                                                    from_scratch=from_scratch)
 
+    def damage_all(self):
+        r'''The next present will be of the whole screen.
+        '''
+        self.damaged = None
+
+    def damaged_rects(self):
+        r'''Returns a list of (x, y, width, height) to present, or None for the whole screen.
+        '''
+        if self.damaged is None or not self.damaged or None in self.damage_history:
+            # An empty damaged means that something was drawn without being recorded.
+            return None
+        rects = merge_rects(self.damaged + [rect for damaged in self.damage_history
+                                                 for rect in damaged],
+                            self.width, self.height)
+        if sum(w * h for _, _, w, h in rects) > Full_present_fraction * self.width * self.height:
+            return None
+        return rects
+
     def draw_to_framebuffer(self):
-        r'''Draws the render_texture to the screen.
+        r'''Draws the damaged parts of the render_texture to the screen.
 
-        This takes ~26 mSec on rasp pi 3 B+.
+        Drawing the whole render_texture takes ~26 mSec on rasp pi 3 B+.
         '''
         assert texture.Current_texture is None, "screen.draw_to_framebuffer: Current_texture is not None"
+        rects = self.damaged_rects()
         begin_drawing()
         my_texture = self.render_texture.texture.texture
         #draw_texture(my_texture, x, y, WHITE)
         # inverted height here to flip image which reverse openGL flip wrt raylib.
-        draw_texture_rec(my_texture, (0, 0, my_texture.width, -my_texture.height), (0, 0), WHITE)
+        if rects is None:
+            draw_texture_rec(my_texture, (0, 0, my_texture.width, -my_texture.height), (0, 0),
+                             WHITE)
+            self.damage_history.append(None)
+        else:
+            for x, y, w, h in rects:
+                draw_texture_rec(my_texture, (x, my_texture.height - (y + h), w, -h), (x, y),
+                                 WHITE)
+            self.damage_history.append(self.damaged)
         end_drawing()
+        self.damaged = []
 
     def as_image(self):
         return self.render_texture.as_image()
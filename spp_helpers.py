@@ -1,6 +1,8 @@
 # spp_helpers.py
 
 from itertools import pairwise
+from bisect import bisect_right
+from array import array
 
 import midi_io
 
@@ -11,8 +13,53 @@ __all__ = "calibrate_spp Spp_control get_spp_control".split()
 Measure_spps = None  # [(spp, measure name, duration_spps, spp_offset), ...] -- in spp order, 0 relative
 Part_duration_spps = None
 
+# The columns of Measure_spps, for bisect.  Set by calibrate_spp.
+Measure_starts = None     # [spp]
+Measure_names = None      # [measure name]
+Measure_durations = None  # [duration_spps]
+Measure_offsets = None    # [spp_offset]
+
+# The "measure.beat" location labels for the song.  Set by build_labels.
+Labels = ["1.1"]          # each distinct label, in spp order, ending with "End"
+Label_indexes = array('H')  # [Labels index] for each spp in the part
+End_label_index = 0       # Labels index of "End", for spps past the part
+Labels_spp_per_beat_type = None  # midi_io.Spp_per_beat_type the Labels were built with
+
+def build_labels():
+    r'''Builds the Labels and Label_indexes tables from Measure_spps.
+
+    Called by calibrate_spp, and again if the time signature changes after that.
+    '''
+    global Labels, Label_indexes, End_label_index, Labels_spp_per_beat_type
+    Labels_spp_per_beat_type = midi_io.Spp_per_beat_type
+    Labels = []
+    label_index = {}   # {label: index}
+    Label_indexes = array('H', bytes(2 * Part_duration_spps))
+    for spp_start, name, duration, spp_offset in Measure_spps:
+        for spp in range(spp_start, min(spp_start + duration, Part_duration_spps)):
+            beats_since_start = (spp - spp_start + spp_offset) // Labels_spp_per_beat_type
+            label = f"{name}.{beats_since_start+1}"
+            index = label_index.get(label)
+            if index is None:
+                index = label_index[label] = len(Labels)
+                Labels.append(label)
+            Label_indexes[spp] = index
+    End_label_index = len(Labels)
+    Labels.append("End")
+    print(f"build_labels: {len(Labels)} labels")
+
+def get_label_index(spp):
+    r'''Returns the Labels index for spp.
+    '''
+    if Labels_spp_per_beat_type != midi_io.Spp_per_beat_type:
+        build_labels()
+    if spp >= len(Label_indexes):
+        return End_label_index
+    return Label_indexes[spp]
+
 def calibrate_spp(clocks_per_measure, part_duration_clocks, skips, odd_durations):
-    r'''skips and odd_durations are sent in yaml format from the player when a song_select is done.
+    r'''These are sent in a measure map from the player when a song_select is done (see measure_map).
+    So this can be called as calibrate_spp(*measure_map).
 
     skips is a list of (measure_number(int), measure name(str)); where measure_number starts at 1
     and increments by 1 for each measure played (counting repeated measures twice).  Measure name
@@ -27,6 +74,7 @@ def calibrate_spp(clocks_per_measure, part_duration_clocks, skips, odd_durations
     Returns True if the screen was updated.
     '''
     global Measure_spps, Part_duration_spps
+    global Measure_starts, Measure_names, Measure_durations, Measure_offsets
 
     spps_per_measure = clocks_per_measure // midi_io.Clocks_per_spp
 
@@ -80,8 +128,13 @@ def calibrate_spp(clocks_per_measure, part_duration_clocks, skips, odd_durations
           f"{Part_duration_spps=}")
     print(f"  last measure {Measure_spps[-1]}, {spp=}")
     print(f"  first measure {Measure_spps[0]}")
+    Measure_starts, Measure_names, Measure_durations, Measure_offsets = \
+      (list(column) for column in zip(*Measure_spps))
+    build_labels()
     screen_updated = False
     for spp in Spp_controls.values():
+        spp.measure_index = -1   # don't let set_spp's fast path use the last song's measures
+        spp.label_index = None   # or skip showing the new song's label
         if spp.set_spp(0):
             screen_updated = True
     midi_io.set_midi_spp(0)
@@ -100,9 +153,17 @@ class Spp_control:
         assert name not in Spp_controls, f"Spp_control({name=}): duplicate name"
         Spp_controls[name] = self
         self.display_text = display_text
+        self.spp = 0
+        self.measure_index = -1
+        self.spp_next = 0
+        self.label_index = None    # the Labels index last displayed
 
     def update_spp_display(self):
-        self.display_text.text = self.get_location()
+        if Measure_spps is None:
+            self.display_text.text = "1.1"
+        else:
+            self.label_index = get_label_index(self.spp)
+            self.display_text.text = Labels[self.label_index]
        #print(f"Spp_control({self.name}).update_spp_display: "
        #      f"spp={self.spp}, text={self.display_text.text}")
         self.display_text.draw()
@@ -114,31 +175,119 @@ class Spp_control:
             setattr(self, attr, getattr(spp, attr))
 
     def set_spp(self, spp):
-        r'''Updates the screen.
-
-        Returns True.
+        r'''Updates the screen if the location displayed changes.
+
+        Returns True if the screen was updated.
+
+        E.g., a song in 4/4 with a one beat pickup (measure 1), and measures 1-2 repeated:
+
+            >>> import io
+            >>> import sys
+            >>> from contextlib import redirect_stdout
+            >>> me = sys.modules[__name__]   # calibrate_spp sets new tables in the module
+            >>> class text_display:
+            ...     text = None
+            ...     def draw(self):
+            ...         print("draw", self.text)
+            >>> spp = Spp_control("doctest", text_display())
+            >>> with redirect_stdout(io.StringIO()):
+            ...     updated = calibrate_spp(96, 312, [(1, '1'), (3, '1-2')], {'1': 24})
+            >>> updated
+            True
+            >>> me.Measure_starts, me.Measure_names, me.Part_duration_spps, midi_io.Spp_per_beat_type
+            ([0, 4, 20, 36], ['1', '2', '1-2', '2-2'], 52, 4)
+            >>> spp.display_text.text
+            '1.4'
+            >>> [me.Labels[get_label_index(spp)] for spp in (4, 51, 52)]
+            ['2.1', '2-2.4', 'End']
+
+        Moving within the same beat doesn't redraw:
+
+            >>> spp.set_spp(3)
+            False
+
+        Playing on into the next measure (the fast path):
+
+            >>> spp.set_spp(4)
+            draw 2.1
+            True
+            >>> spp.measure_index, spp.spp_next
+            (1, 20)
+            >>> spp.set_spp(8)
+            draw 2.2
+            True
+            >>> spp.set_spp(20)
+            draw 1-2.1
+            True
+            >>> spp.measure_index, spp.spp_next
+            (2, 36)
+
+        Jumping (the bisect), on and either side of the measure starts:
+
+            >>> spp.set_spp(35)
+            draw 1-2.4
+            True
+            >>> spp.measure_index
+            2
+            >>> spp.set_spp(36)
+            draw 2-2.1
+            True
+            >>> spp.set_spp(0)
+            draw 1.4
+            True
+            >>> spp.set_spp(19)
+            draw 2.4
+            True
+            >>> spp.measure_index, spp.spp_next
+            (1, 20)
+
+        Past the end of the part:
+
+            >>> spp.set_spp(52)
+            draw End
+            True
+            >>> spp.set_spp(60)
+            False
+            >>> spp.set_spp(51)
+            draw 2-2.4
+            True
+
+        Calibrating the next song starts over, and shows its first label, even though its Labels
+        index is the same as the last one shown:
+
+            >>> spp.set_spp(0)
+            draw 1.4
+            True
+            >>> with redirect_stdout(io.StringIO()):
+            ...     updated = calibrate_spp(96, 192, [(1, '1'), (2, '2')], {})
+            >>> updated
+            True
+            >>> spp.display_text.text, spp.measure_index, spp.spp_next
+            ('1.1', 0, 16)
+            >>> del Spp_controls["doctest"]
         '''
-        # FIX: Speed up when spp changes by +1?
-        # FIX: Don't update display when it doesn't change (i.e., beat doesn't change)
        #print(f"Spp_control({self.name}).set_spp({spp=})")
         self.spp = spp
         assert Measure_spps is not None, \
                f"Spp_control({self.name}).set_spp({spp=}): Measure_spps is None"
 
-        i = spp // midi_io.Spp_per_measure
-        spp_start, name, duration, spp_offset = Measure_spps[i]
-        while spp_start > spp:
-            i -= (spp_start - spp) // midi_io.Spp_per_measure or 1
-            spp_start, name, duration, spp_offset = Measure_spps[i]
-        while i < len(Measure_spps) and spp_start <= spp:
-            i += (spp - spp_start) // midi_io.Spp_per_measure or 1
-            if i < len(Measure_spps):
-                spp_start, name, duration, spp_offset = Measure_spps[i]
-        self.measure_index = i - 1
-        if i >= len(Measure_spps):
-            self.spp_next = Part_duration_spps
-        else:
-            self.spp_next = spp_start
+        starts = Measure_starts
+        i = self.measure_index
+        if not (0 <= i < len(starts) and starts[i] <= spp < self.spp_next):
+            if spp == self.spp_next and i + 1 < len(starts):
+                # the usual case while playing: just moved into the next measure
+                i += 1
+            elif spp >= Part_duration_spps:
+                i = len(starts)     # End
+            else:
+                i = bisect_right(starts, spp) - 1
+            self.measure_index = i
+            if i + 1 < len(starts):
+                self.spp_next = starts[i + 1]
+            else:
+                self.spp_next = Part_duration_spps
+        if get_label_index(spp) == self.label_index:
+            return False
         return self.update_spp_display()
 
     def inc_measure(self, num_measures):
@@ -186,9 +335,10 @@ class Spp_control:
     def get_location(self):
         if Measure_spps is None:
             return "1.1"
-        if self.measure_index >= len(Measure_spps):
-            return "End"
-        spp_start, name, duration, spp_offset = Measure_spps[self.measure_index]
-        beats_since_start = (self.spp - spp_start + spp_offset) // midi_io.Spp_per_beat_type
-        return f"{name}.{beats_since_start+1}"
+        return Labels[get_label_index(self.spp)]
+
 
+if __name__ == "__main__":
+    # off the Pi: python local_midi.py headless.py spp_helpers.py
+    import doctest
+    doctest.testmod()
@@ -9,6 +9,9 @@ First create the sprite with the width and height to save:
 Then call save_pos each time, just prior to drawing to the screen's render_texture.
 
     sprite.save_pos(30, 30)
+
+Saved_sprites has all of the sprites holding a saved background, so that restore_backgrounds can
+take them off of a copy of the screen.
 '''
 
 from pyray import *
@@ -18,6 +21,8 @@ import texture
 import screen
 
 
+Saved_sprites = {}   # {Sprite: None}, in the order they were saved
+
 class Sprite:
     def __init__(self, width, height, dynamic_capture=False, trace=False):
         r'''Captures and restores the original screen image before its changed by the user of the class.
@@ -30,6 +35,7 @@ class Sprite:
         self.trace = trace
 
     def close(self):
+        Saved_sprites.pop(self, None)
         if self.saved_texture is not None:
             self.saved_texture.close()
             self.saved_texture = None
@@ -60,8 +66,8 @@ class Sprite:
         # not self.texture_saved or self.dynamic_capture
         #
         # capture current image in screen render_texture at x_pos, y_pos
-        x_left = x_pos.S(texture.width).i
-        y_lower = y_pos.E(texture.height).i
+        x_left = x_pos.Si(texture.width)
+        y_lower = y_pos.Ei(texture.height)
         if self.trace:
             print(f"{self} doing capture, calling saved_texture.draw_on_texture")
         with self.saved_texture.draw_on_texture():
@@ -72,9 +78,32 @@ class Sprite:
         self.last_x = x_pos
         self.last_y = y_pos
         self.texture_saved = True
+        Saved_sprites.pop(self, None)   # keep Saved_sprites in capture order
+        Saved_sprites[self] = None
 
     def reset(self):
         self.texture_saved = False
+        Saved_sprites.pop(self, None)
+
+
+def restore_backgrounds(onto):
+    r'''Draws the saved backgrounds of all of the Saved_sprites onto the Texture onto, in the reverse
+    of the order they were captured.
+
+    Onto is a copy of the screen's render_texture, made with draw_rect.  This leaves it as the screen
+    would look without the sprites drawn on it.
+
+    The copy's rows are upside down to draw on (drawing it with Texture.draw flips it back).  So each
+    background is drawn flipped, at the flipped y.
+    '''
+    onto_height = onto.texture.texture.height
+    with onto.draw_on_texture():
+        for sprite in reversed(Saved_sprites):
+            texture = sprite.saved_texture.texture.texture
+            x_left = Si(sprite.last_x, texture.width)
+            y_top = Si(sprite.last_y, texture.height)
+            draw_texture_rec(texture, (0, 0, texture.width, -texture.height),
+                             (x_left, onto_height - y_top - texture.height), WHITE)
 
 
 
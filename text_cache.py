@@ -0,0 +1,274 @@
+# text_cache.py
+
+r'''Caches for text that is drawn over and over again.
+
+    measure_text(font, text, size, spacing)
+        Same as raylib's measure_text_ex, but each text is only measured once.
+
+    value_texts(scale_fn, low_value, high_value) -> tuple of str
+        The texts displayed for low_value through high_value (e.g., by a slider).  Each is only
+        made once, and shared by everybody asking for the same scale_fn and values.
+
+    widest_text(font, texts, size, spacing)
+        The measure_text_ex size of the widest of texts (converted to str).  Each set of texts is
+        only measured once, so the sliders sharing a set of value_texts only pay for it the first
+        time.
+
+    draw_text(font, text, position, size, spacing, color)
+        Same as raylib's draw_text_ex, but each text is only rendered once, into its own
+        render_texture.  After that, drawing it is just a blit of that render_texture.
+
+    get_strip(font, size, spacing, color, texts) -> Text_strip
+        All of texts rendered into one render_texture, for widgets that show one of a fixed set
+        of texts (e.g., a slider's value).  Drawing one of them is then a single blit.  Text_strips
+        are shared by everybody asking for the same texts.
+
+    stats() -> str   # the hit/miss counts and memory used
+
+The measure_text and draw_text caches are LRU.  The rendered texts are limited to Max_bytes of
+render_textures, the measurements to Max_sizes entries.  E.g., with room for 3 rendered texts:
+
+    >>> import os
+    >>> import sys
+    >>> me = sys.modules[__name__]   # for the globals that get rebound
+    >>> font = load_font(os.path.join(screen.Font_dir, "DejaVuSans.ttf"))
+    >>> target = texture.Texture("doctest", 100, 100)
+    >>> def draw(*texts):
+    ...     with target.draw_on_texture():
+    ...         for text in texts:
+    ...             draw_text(font, text, (0, 0), 20, 1, WHITE)
+    >>> def cached():
+    ...     return [text for _, text, _, _, _ in Images]
+    >>> clear()
+    >>> draw("1")                       # the digits all render the same size
+    >>> real_max_bytes, me.Max_bytes = me.Max_bytes, 3 * me.Bytes_used
+    >>> draw("2", "3")
+    >>> cached()
+    ['1', '2', '3']
+    >>> draw("1")                       # a hit makes "1" the most recently used
+    >>> cached()
+    ['2', '3', '1']
+    >>> two = Images[next(iter(Images))]
+    >>> draw("4")
+    >>> cached()
+    ['3', '1', '4']
+    >>> two.texture is None             # the evicted render_texture has been unloaded
+    True
+    >>> me.Bytes_used == me.Max_bytes
+    True
+    >>> draw("5", "6", "3")
+    >>> cached()
+    ['5', '6', '3']
+    >>> me.Max_bytes = real_max_bytes
+    >>> clear()
+    >>> target.close()
+
+The font is identified by id, so the fonts must stay loaded while the Screen is up (as they do in
+shapes.Fonts).  Everything cached is dropped when the Screen is closed.
+
+The text is rendered into the render_texture with premultiplied alpha (the alpha isn't squared by
+the normal blending against the texture's transparent background), and blitted with
+BLEND_ALPHA_PREMULTIPLY.  So the antialiased edges come out the same as draw_text_ex.
+'''
+
+import math
+from collections import OrderedDict
+from operator import attrgetter
+from pyray import *
+
+import screen
+import texture
+
+
+__all__ = "measure_text value_texts widest_text draw_text get_strip Text_strip stats".split()
+
+
+Max_bytes = 32 * 1024 * 1024   # cap on the render_textures held by Images
+Max_sizes = 4096               # cap on the number of Sizes
+Max_strip_height = 2048        # Text_strips wrap into another column past this
+
+# blend factors from rlgl.h
+RL_ONE = 1
+RL_SRC_ALPHA = 0x0302
+RL_ONE_MINUS_SRC_ALPHA = 0x0303
+RL_FUNC_ADD = 0x8006
+
+
+Sizes = OrderedDict()    # {(id(font), text, size, spacing): Vector2}, least recently used first
+Images = OrderedDict()   # {(id(font), text, size, spacing, color): Texture}, least recently used first
+Bytes_used = 0           # by the Images render_textures
+Value_texts = {}         # {(scale_fn, low_value, high_value): texts}
+Widest = {}              # {(id(font), texts, size, spacing): Vector2}
+
+Size_hits = Size_misses = 0
+Image_hits = Image_misses = Image_evictions = 0
+
+def measure_text(font, text, size, spacing):
+    global Size_hits, Size_misses
+    key = id(font), text, size, spacing
+    msize = Sizes.get(key)
+    if msize is None:
+        Size_misses += 1
+        msize = Sizes[key] = measure_text_ex(font, text, size, spacing)
+        if len(Sizes) > Max_sizes:
+            Sizes.popitem(last=False)
+    else:
+        Size_hits += 1
+        Sizes.move_to_end(key)
+    return msize
+
+def value_texts(scale_fn, low_value, high_value):
+    key = scale_fn, low_value, high_value
+    texts = Value_texts.get(key)
+    if texts is None:
+        texts = Value_texts[key] = \
+          tuple(str(scale_fn(value)) for value in range(low_value, high_value + 1))
+    return texts
+
+def widest_text(font, texts, size, spacing):
+    key = id(font), tuple(texts), size, spacing
+    msize = Widest.get(key)
+    if msize is None:
+        msize = Widest[key] = max((measure_text_ex(font, str(text), size, spacing)
+                                   for text in key[1]),
+                                  key=attrgetter('x'))
+    return msize
+
+def draw_text(font, text, position, size, spacing, color):
+    r'''Draws text with its upper left corner at position (x, y).
+    '''
+    global Image_hits, Image_misses
+    key = id(font), text, size, spacing, tuple(color)
+    image = Images.get(key)
+    if image is None:
+        Image_misses += 1
+        image = render_text(font, text, size, spacing, color)
+        add_image(key, image)
+    else:
+        Image_hits += 1
+        Images.move_to_end(key)
+    tex = image.texture.texture
+    begin_blend_mode(BLEND_ALPHA_PREMULTIPLY)
+    draw_texture_rec(tex, (0, 0, tex.width, -tex.height), position, WHITE)
+    end_blend_mode()
+
+def render_text(font, text, size, spacing, color):
+    r'''Returns a new Texture with text drawn on it.
+    '''
+    msize = measure_text(font, text, size, spacing)
+    image = texture.Texture(f"text_cache {text!r}", int(math.ceil(msize.x)),
+                            int(math.ceil(msize.y)))
+    with image.draw_on_texture():
+        set_premultiplied_blend_mode()
+        draw_text_ex(font, text, (0, 0), size, spacing, color)
+        end_blend_mode()
+    return image
+
+def set_premultiplied_blend_mode():
+    r'''Blend mode for drawing onto a transparent texture that will be blitted with
+    BLEND_ALPHA_PREMULTIPLY.  Call end_blend_mode when done.
+    '''
+    rl_set_blend_factors_separate(RL_SRC_ALPHA, RL_ONE_MINUS_SRC_ALPHA,
+                                  RL_ONE, RL_ONE_MINUS_SRC_ALPHA,
+                                  RL_FUNC_ADD, RL_FUNC_ADD)
+    begin_blend_mode(BLEND_CUSTOM_SEPARATE)
+
+def image_bytes(image):
+    tex = image.texture.texture
+    return tex.width * tex.height * 4
+
+def add_image(key, image):
+    r'''Adds image to Images, evicting the least recently used images to stay under Max_bytes.
+    '''
+    global Bytes_used, Image_evictions
+    Images[key] = image
+    Bytes_used += image_bytes(image)
+    if Bytes_used > Max_bytes and len(Images) > 1:
+        # An evicted image may still be referenced by draws waiting in raylib's render batch.
+        rl_draw_render_batch_active()
+        while Bytes_used > Max_bytes and len(Images) > 1:
+            _, old_image = Images.popitem(last=False)
+            Bytes_used -= image_bytes(old_image)
+            old_image.close()
+            Image_evictions += 1
+
+
+class Text_strip:
+    r'''All of texts rendered into one render_texture (an atlas), one text per row.
+
+    The rows wrap into another column after Max_strip_height pixels.
+
+    sizes[i] is the (width, height) of texts[i] in pixels.
+    '''
+    def __init__(self, font, size, spacing, color, texts):
+        self.texts = texts
+        self.color = color
+        msizes = [measure_text_ex(font, text, size, spacing) for text in texts]
+        self.sizes = [(int(math.ceil(msize.x)), int(math.ceil(msize.y))) for msize in msizes]
+        row_height = max(height for _, height in self.sizes)
+        column_width = max(width for width, _ in self.sizes)
+        rows_per_column = max(1, Max_strip_height // row_height)
+        num_columns = (len(texts) + rows_per_column - 1) // rows_per_column
+        self.positions = [((i // rows_per_column) * column_width, (i % rows_per_column) * row_height)
+                          for i in range(len(texts))]
+        self.strip = texture.Texture(f"Text_strip {texts[0]!r}..{texts[-1]!r}",
+                                     num_columns * column_width,
+                                     min(len(texts), rows_per_column) * row_height)
+        with self.strip.draw_on_texture():
+            set_premultiplied_blend_mode()
+            for text, position in zip(texts, self.positions):
+                draw_text_ex(font, text, position, size, spacing, color)
+            end_blend_mode()
+
+    def close(self):
+        self.strip.close()
+
+    def draw(self, i, x_left, y_top):
+        r'''Draws texts[i] with its upper left corner at x_left, y_top (ints).
+
+        The caller does the screen.damage.
+        '''
+        tex = self.strip.texture.texture
+        x, y = self.positions[i]
+        width, height = self.sizes[i]
+        begin_blend_mode(BLEND_ALPHA_PREMULTIPLY)
+        draw_texture_rec(tex, (x, tex.height - (y + height), width, -height), (x_left, y_top), WHITE)
+        end_blend_mode()
+
+
+Strips = {}   # {(id(font), size, spacing, color, texts): Text_strip}
+
+def get_strip(font, size, spacing, color, texts):
+    r'''Returns the Text_strip for texts (a tuple of str), creating it if needed.
+    '''
+    key = id(font), size, spacing, tuple(color), texts
+    strip = Strips.get(key)
+    if strip is None:
+        strip = Strips[key] = Text_strip(font, size, spacing, color, texts)
+    return strip
+
+def stats():
+    return (f"text_cache: images {len(Images)} ({Bytes_used / (1024 * 1024):.1f}MB), "
+            f"hits {Image_hits}, misses {Image_misses}, evictions {Image_evictions}; "
+            f"sizes {len(Sizes)}, hits {Size_hits}, misses {Size_misses}; "
+            f"strips {len(Strips)}")
+
+@screen.register_quit
+def clear(screen_obj=None):
+    global Bytes_used
+    for image in Images.values():
+        image.close()
+    Images.clear()
+    Sizes.clear()
+    Value_texts.clear()
+    Widest.clear()
+    Bytes_used = 0
+    for strip in Strips.values():
+        strip.close()
+    Strips.clear()
+
+
+if __name__ == "__main__":
+    # off the Pi: python headless.py text_cache.py
+    import doctest
+    doctest.testmod()
@@ -23,11 +23,11 @@ class Texture:
         self.texture = load_render_texture(width, height)
         self.fillcolor = fillcolor
         self.is_screen = is_screen
-        if fillcolor is not None:
-            begin_texture_mode(self.texture)
-            clear_background(fillcolor)
-            end_texture_mode()
         self.as_sprite = as_sprite
+        if fillcolor is not None:
+            # this may be created while drawing on another texture
+            with self.draw_on_texture():
+                clear_background(fillcolor)
         if trace:
             fillcolor = screen.Color_names.get(fillcolor, fillcolor)
             print(f"{self}.__init__: {name=}, {width=}, {height=}, {fillcolor=}, "
@@ -129,6 +129,7 @@ class Texture:
         if self.trace:
             print(f"{self.name}.draw({x=}, {y=})")
         draw_texture(texture, x, y, WHITE)
+        screen.damage(x, y, texture.width, texture.height)
 
     def draw_rect(self, x_left, y_lower, width, height, dest_from_left=0, dest_from_bottom=0):
         r'''Draw a rect from self to another draw_on_texture.
@@ -147,6 +148,7 @@ class Texture:
                          (x_left, self.invert_y(y_lower), width, height),
                          (dest_from_left, dest_from_bottom),
                          WHITE)
+        screen.damage(dest_from_left, dest_from_bottom, width, height)
 
     def invert_y(self, y):
         return self.texture.texture.height - 1 - y
@@ -30,6 +30,7 @@ import math
 
 import screen
 import traffic_cop
+import text_cache
 
 
 __all__ = "touch_slider circle_toggle circle_one_shot circle_cycle circle_start_stop circle_radio " \
@@ -96,18 +97,23 @@ class rect_contains:
 
     def update_pos(self):
         x_pos = self.widget.x_pos
-        self.x_left = x_pos.S(self.width).i
-        self.x_center = x_pos.C(self.width).i
-        self.x_right = x_pos.E(self.width).i
+        self.x_left = x_pos.Si(self.width)
+        self.x_center = x_pos.Ci(self.width)
+        self.x_right = x_pos.Ei(self.width)
         y_pos = self.widget.y_pos
-        self.y_top = y_pos.S(self.height).i
-        self.y_bottom = y_pos.E(self.height).i
+        self.y_top = y_pos.Si(self.height)
+        self.y_bottom = y_pos.Ei(self.height)
 
     def __call__(self, x, y):
         self.last_x = x
         return self.x_left <= x <= self.x_right \
            and self.y_top <= y <= self.y_bottom
 
+    def bounds(self):
+        r'''Returns x_left, y_top, x_right, y_bottom (all inclusive) for the Touch_dispatcher's index.
+        '''
+        return self.x_left, self.y_top, self.x_right, self.y_bottom
+
     def on_left(self):
         return self.last_x <= self.x_center
 
@@ -136,6 +142,7 @@ class touch_slider(touch_rect):
         '''
         super().__init__(name, command, trace)
         self.display = display  # dynamic_text widget to display scaled values.
+        self.value_strip = None # text_cache.Text_strip of all of the display values, see update_text
 
     def attach_widget(self, widget):
         r'''Called from slider_touch.__init__ with slider_touch widget.
@@ -176,7 +183,7 @@ class touch_slider(touch_rect):
         # point to the knob's position.
 
         # self.knob.y_mid = y + self.offset
-        self.offset = self.knob.y_pos.C(self.knob.height).i - y
+        self.offset = self.knob.y_pos.Ci(self.knob.height) - y
         if self.trace:
             print(f"{self}.touch({x=}, {y=}): incremental movement {self.offset=}")
         return False
@@ -189,7 +196,7 @@ class touch_slider(touch_rect):
         knob_y = y + self.offset
         # clamp knob_y to the interval [self.slide_y_top_C, self.slide_y_bottom_C]
         knob_y = min(max(knob_y, self.slide_y_top_C.i), self.slide_y_bottom_C.i)
-        knob_y_middle = self.knob.y_pos.C(self.knob.height).i
+        knob_y_middle = self.knob.y_pos.Ci(self.knob.height)
         pixel_movement = knob_y_middle - knob_y        # positive up
         _, remainder = divmod(pixel_movement, self.tick)
         if remainder * 2 == self.tick:  # don't count the half-way point
@@ -214,7 +221,30 @@ class touch_slider(touch_rect):
         self.knob.draw(y_pos=self.slide_y_bottom_C - (self.value - self.low_value) * self.tick)
 
     def update_text(self):
-        self.display.draw(text=str(self.scale_fn(self.value)))
+        r'''Draws the display's new value with one blit from the value_strip.
+
+        The value_strip has every value's text rendered, and is shared with all of the other
+        sliders showing the same values.  It's made the first time it's needed.
+        '''
+        display = self.display
+        i = self.value - self.low_value
+        if not 0 <= i < self.num_values:
+            display.draw(text=str(self.scale_fn(self.value)))
+            return
+        strip = self.value_strip
+        if strip is None or strip.color != display.color:
+            strip = self.value_strip = \
+              text_cache.get_strip(display.font, display.size, display.spacing, display.color,
+                                   text_cache.value_texts(self.scale_fn, self.low_value,
+                                                          self.high_value))
+        display.text = strip.texts[i]
+        if display.as_sprite:
+            display.sprite.save_pos(display.x_pos, display.y_pos)
+        width, height = strip.sizes[i]
+        x_left = display.x_pos.C(display.width).Si(width)
+        y_top = display.y_pos.Si(height)
+        strip.draw(i, x_left, y_top)
+        screen.damage(x_left, y_top, width, height)
 
     def remote_change(self, channel, new_value):  # FIX: Do we really need channel here?
         r'''Called when a MIDI command is received updating the Slider's value.
@@ -254,18 +284,20 @@ class touch_button(touch):
             self.show_off()
 
     def show_on(self):
-        r'''Causes screen change.
+        r'''Causes screen change, unless not active.  Then activate2 shows it when reactivated.
         '''
-        self.widget.draw(color=self.on_color)
         self.is_on = True
-        return True
+        if self.active:
+            self.widget.draw(color=self.on_color)
+        return self.active
 
     def show_off(self):
-        r'''Causes screen change.
+        r'''Causes screen change, unless not active.  Then activate2 shows it when reactivated.
         '''
-        self.widget.draw(color=self.off_color)
         self.is_on = False
-        return True
+        if self.active:
+            self.widget.draw(color=self.off_color)
+        return self.active
 
 class rect_button(touch_button):
     def activate2(self):
@@ -283,9 +315,9 @@ class circle_contains:
 
     def update_pos(self):
         x_pos = self.widget.x_pos
-        self.x_center = x_pos.C(self.width).i
+        self.x_center = x_pos.Ci(self.width)
         y_pos = self.widget.y_pos
-        self.y_middle = y_pos.C(self.height).i
+        self.y_middle = y_pos.Ci(self.height)
 
     def __call__(self, x, y):
         x_offset = x - self.x_center
@@ -294,6 +326,14 @@ class circle_contains:
         #print(f"circle_contains({self.widget.name=}).__init__: {x_offset=}, {y_offset=}, {dist=}")
         return dist <= self.touch_radius
 
+    def bounds(self):
+        r'''Returns x_left, y_top, x_right, y_bottom (all inclusive) for the Touch_dispatcher's index.
+
+        This is the square around the touch_radius circle.
+        '''
+        r = math.ceil(self.touch_radius)
+        return self.x_center - r, self.y_middle - r, self.x_center + r, self.y_middle + r
+
 class circle_button(touch_button):
     def activate2(self):
         self.contains = circle_contains(self.widget)
@@ -346,6 +386,7 @@ class touch_one_shot:
     def __init__(self, name, command, blink_time=0.3, trace=False):
         super().__init__(name, command, trace)
         self.blink_time = blink_time
+        self.blink_alarm = None
         #self.is_on not used
 
     def activate2(self):
@@ -357,9 +398,21 @@ class touch_one_shot:
         '''
         self.run_command()
         self.show_on()
-        traffic_cop.set_alarm(self.blink_time, self.show_off)
+        # rapid touches just push the show_off back, rather than piling up more alarms.
+        if self.blink_alarm is None:
+            self.blink_alarm = traffic_cop.set_alarm(self.blink_time, self.show_off)
+        else:
+            self.blink_alarm.reschedule(self.blink_time)
         return True
 
+    def deactivate(self):
+        r'''Called by clear.
+        '''
+        if self.blink_alarm is not None:
+            # don't let show_off draw over whatever replaces us on the screen.
+            self.blink_alarm.cancel()
+        super().deactivate()
+
     def run_command(self):
         r'''Returns True is the screen has changed.
         '''
@@ -11,25 +11,76 @@ other code.
 
 To use, create a Touch_generator and then repeatedly call gen_slot_events each time the input device
 is readable.
+
+There are two decoders for the device's events.  Touch_generator goes through libevdev.  The
+Raw_touch_generator reads and decodes the kernel's struct input_events itself, which is much cheaper.
+Set Raw_decoder to True before the Screen is created to use the Raw_touch_generator.
+
+Normally the touch device is only read when traffic_cop.run gets back to its select.  Set
+Threaded_reader to True before the Screen is created to read and decode the touch events on a
+background thread (a Touch_reader) instead, so that they are read promptly even while the main thread
+is busy drawing.  The SlotEvents are still dispatched on the main thread.
+
+If screen.Touch_device_path is None (e.g., running headless), a No_touch_generator is used.
 '''
 
 import os
 import time
+import struct
+import fcntl
+import select
+import threading
+from array import array
 from operator import itemgetter
-import libevdev
+try:
+    import libevdev
+except (ImportError, OSError):
+    libevdev = None   # only the (libevdev) Touch_generator needs it
 import screen
 import traffic_cop
+import latency
 
 #for type in libevdev.types:
 #    print(type)
 #    print(type.codes)
 
 
+Raw_decoder = False     # use Raw_touch_generator rather than Touch_generator
+Threaded_reader = False # read the touch device on a background thread
+
+
+# struct input_event from <linux/input.h>: struct timeval time; __u16 type; __u16 code; __s32 value;
+Input_event = struct.Struct('llHHi')
+Long_size = struct.calcsize('l')
+
+# event types and codes from <linux/input-event-codes.h>
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+EV_MSC = 0x04
+
+SYN_REPORT = 0
+SYN_DROPPED = 3
+
+ABS_X = 0x00
+ABS_Y = 0x01
+ABS_MT_SLOT = 0x2f
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TRACKING_ID = 0x39
+
+BTN_TOUCH = 0x14a
+
+MSC_TIMESTAMP = 0x05
+
+
 class Syn_dropped(RuntimeError):
     pass
 
 
 class SlotEvent:
+    __slots__ = "slot action x y sec".split()
+
     def __init__(self, slot, action, x, y, sec):
         self.slot = slot      # touch device assigned slot number
         self.action = action  # "touch", "move", "release"
@@ -52,9 +103,17 @@ if __name__ != "__main__":
 
     @screen.register_init2
     def init_event_generator(screen_obj):
+        if screen.Touch_device_path is None:
+            screen_obj.Touch_generator = \
+              No_touch_generator(screen_obj.width, screen_obj.height, screen_obj.Touch_dispatcher,
+                                 screen_obj.trace)
+            return
+        generator_class = Raw_touch_generator if Raw_decoder else Touch_generator
         screen_obj.Touch_generator = \
-          Touch_generator(screen.Touch_device_path, screen_obj.width, screen_obj.height,
+          generator_class(screen.Touch_device_path, screen_obj.width, screen_obj.height,
                           screen_obj.Touch_dispatcher, screen_obj.trace)
+        if Threaded_reader:
+            screen_obj.Touch_generator.start_reader()
 
     @screen.register_quit2
     def close_event_generator(screen_obj):
@@ -64,28 +123,140 @@ if __name__ != "__main__":
 
 
 class Touch_dispatcher:
-    def __init__(self, trace=False):
+    r'''Sends SlotEvents to the registered touch widgets.
+
+    The registered widgets are indexed in a uniform grid of cell_size x cell_size pixel cells by the
+    bounds of their contains (which must not change while registered), so that finding the widget
+    touched only looks at the few widgets overlapping the touched cell.  Widgets whose contains
+    doesn't have a bounds method are checked on every touch.
+
+    If more than one widget contains the touch point, the first one registered gets it.
+
+    With a cell_size of 10, and two boxes overlapping in 10-14, 10-14:
+
+        >>> class box_contains:
+        ...     def __init__(self, *box):
+        ...         self.box = box
+        ...     def __call__(self, x, y):
+        ...         x_left, y_top, x_right, y_bottom = self.box
+        ...         return x_left <= x <= x_right and y_top <= y <= y_bottom
+        ...     def bounds(self):
+        ...         return self.box
+        >>> class box:
+        ...     def __init__(self, name, contains):
+        ...         self.name = name
+        ...         self.contains = contains
+        ...     def __repr__(self):
+        ...         return self.name
+        >>> a = box('a', box_contains(5, 5, 14, 14))
+        >>> b = box('b', box_contains(10, 10, 29, 19))
+        >>> d = Touch_dispatcher(cell_size=10)
+        >>> d.register(a)
+        >>> d.register(b)
+        >>> sorted(d.grid)
+        [(0, 0), (0, 1), (1, 0), (1, 1), (2, 1)]
+        >>> d.find_widget(12, 12), d.find_widget(15, 12)
+        (a, b)
+
+    The bounds are inclusive, and the touches on either side of a cell boundary:
+
+        >>> d.find_widget(9, 9), d.find_widget(10, 10), d.find_widget(14, 14), d.find_widget(15, 15)
+        (a, a, a, b)
+        >>> d.find_widget(29, 19), d.find_widget(30, 19), d.find_widget(29, 20), d.find_widget(4, 5)
+        (b, None, None, None)
+
+    Registering a again puts it after b:
+
+        >>> d.unregister(a)
+        >>> sorted(d.grid)
+        [(1, 1), (2, 1)]
+        >>> d.find_widget(9, 9), d.find_widget(12, 12)
+        (None, b)
+        >>> d.register(a)
+        >>> d.find_widget(9, 9), d.find_widget(12, 12)
+        (a, b)
+
+    A widget without bounds is checked on every touch, still in registration order:
+
+        >>> everywhere = box('everywhere', lambda x, y: True)
+        >>> d = Touch_dispatcher(cell_size=10)
+        >>> d.register(a)
+        >>> d.register(everywhere)
+        >>> d.register(b)
+        >>> d.find_widget(12, 12), d.find_widget(15, 15), d.find_widget(100, 100)
+        (a, everywhere, everywhere)
+        >>> d.unregister(everywhere)
+        >>> d.find_widget(15, 15), d.find_widget(100, 100)
+        (b, None)
+    '''
+    def __init__(self, cell_size=64, trace=False):
         self.ignore = set()
-        self.widgets = []
+        self.cell_size = cell_size
         self.assignments = {}
         self.trace = trace
+        self.clear_index()
+
+    def clear_index(self):
+        self.widgets = {}       # {widget: (seq, cells)}
+        self.grid = {}          # {(col, row): [(seq, widget)]}, in seq order
+        self.unbounded = []     # [(seq, widget)], in seq order
+        self.next_seq = 0
 
     def reset(self):
         if self.trace:
             print("Touch_dispatcher.reset")
         self.ignore = set(self.assignments.keys())
         self.assignments = {}
-        self.widgets = []
+        self.clear_index()
 
     def register(self, widget):
         if self.trace:
             print(f"Touch_dispatcher.register({widget=})")
-        self.widgets.append(widget)
+        seq = self.next_seq
+        self.next_seq += 1
+        entry = seq, widget
+        bounds = getattr(widget.contains, 'bounds', None)
+        if bounds is None:
+            cells = None
+            self.unbounded.append(entry)
+        else:
+            x_left, y_top, x_right, y_bottom = bounds()
+            cell_size = self.cell_size
+            cells = [(col, row)
+                     for col in range(x_left // cell_size, x_right // cell_size + 1)
+                     for row in range(y_top // cell_size, y_bottom // cell_size + 1)]
+            for cell in cells:
+                self.grid.setdefault(cell, []).append(entry)
+        self.widgets[widget] = seq, cells
 
     def unregister(self, widget):
         if self.trace:
             print(f"Touch_dispatcher.unregister({widget=})")
-        self.widgets.remove(widget)
+        seq, cells = self.widgets.pop(widget)
+        entry = seq, widget
+        if cells is None:
+            self.unbounded.remove(entry)
+        else:
+            for cell in cells:
+                widgets = self.grid[cell]
+                widgets.remove(entry)
+                if not widgets:
+                    del self.grid[cell]
+
+    def find_widget(self, x, y):
+        r'''Returns the first registered widget containing x, y, or None.
+        '''
+        found_seq = found = None
+        for seq, widget in self.grid.get((x // self.cell_size, y // self.cell_size), ()):
+            if widget.contains(x, y):
+                found_seq, found = seq, widget
+                break
+        for seq, widget in self.unbounded:
+            if found_seq is not None and seq > found_seq:
+                break
+            if widget.contains(x, y):
+                return widget
+        return found
 
     def dispatch(self, event):
         r'''Returns True if the screen was changed.
@@ -106,12 +277,12 @@ class Touch_dispatcher:
             print("touch: Missed release for slot", event.slot)
             self.assignments[event.slot].release()
             del self.assignments[event.slot]
-        for widget in self.widgets:
-            if widget.contains(event.x, event.y):
-                if self.trace:
-                    print(f"touch: assigning {widget=} to slot={event.slot}")
-                self.assignments[event.slot] = widget
-                return widget.touch(event.x, event.y)
+        widget = self.find_widget(event.x, event.y)
+        if widget is not None:
+            if self.trace:
+                print(f"touch: assigning {widget=} to slot={event.slot}")
+            self.assignments[event.slot] = widget
+            return widget.touch(event.x, event.y)
        #elapsed_time = time.clock_gettime(time.CLOCK_MONOTONIC) - start_time
        #print(f"touch_dispatcher.touch: {elapsed_time:.03} secs")
         if self.trace:
@@ -156,38 +327,62 @@ class Touch_dispatcher:
 class Touch_generator:
     r'''width, height in pixels.
 
-    Use gen_slot_events to get all queued events.  Delaying > 0.5 secs between calls may produce
-    SYN_DROPPED messages.
+    Use gen_slot_events to get all queued events.
+
+    If the kernel's event buffer overflows (SYN_DROPPED), the touch state is resynced from the device
+    and the SlotEvents needed to bring the Touch_dispatcher up to date are generated.  These are
+    counted in latency.Counters["syn_dropped"].
     '''
     def __init__(self, path, width, height, touch_dispatch, trace=False):
         if trace:
             print(f"{self}.__init__")
-        self.device_fd = open(path, "rb")
-        os.set_blocking(self.device_fd.fileno(), False)
-        self.device = libevdev.Device(self.device_fd)
+        self.open_device(path)
         self.x_scale = width / 32767
         self.y_scale = height / 32767
         self.trace = trace
         self.last_slot = 0
-        self.slot = self.x = self.y = self.sec = None
+        self.slot = self.x = self.y = self.sec = self.tracking_id = None
         self.action = 'move'
+        self.slot_states = {}   # {slot: [tracking_id, x, y]} for active touches, as last reported
         self.touch_dispatch = touch_dispatch
         traffic_cop.register_read(self.device_fd, self.process_events)
+        self.reader = None
         self.closed = False
 
+    def open_device(self, path):
+        r'''Opens the device at path, non-blocking, as self.device_fd.
+        '''
+        self.device_fd = open(path, "rb")
+        os.set_blocking(self.device_fd.fileno(), False)
+        self.device = libevdev.Device(self.device_fd)
+
+    def start_reader(self, queue_size=256):
+        r'''Moves the reading of the device to a Touch_reader thread.
+        '''
+        traffic_cop.unregister_read(self.device_fd)
+        self.reader = Touch_reader(self, queue_size)
+
     def close(self):
         if not self.closed:
             if self.trace:
                 print("Touch_generator.close")
+            if self.reader is None:
+                traffic_cop.unregister_read(self.device_fd)
+            else:
+                self.reader.stop()
+                self.reader = None
             self.drain_events()
-            traffic_cop.unregister_read(self.device_fd)
             self.device_fd.close()
             self.closed = True
 
     def drain_events(self):
         r'''Drain all events from the input to avoid SYN_DROPPED for the next guy.
+
+        Does nothing while a Touch_reader is running, the device belongs to its thread then.
         '''
-        for _ in self.gen_slot_events(ignore_syn_dropped=True):
+        if self.reader is not None:
+            return
+        for _ in self.gen_slot_events():
             pass
 
     def process_events(self, file):
@@ -198,16 +393,50 @@ class Touch_generator:
         Returns True if the Touch_dispatcher updated the Screen for any of the events.
         The traffic_cop uses this to determine whether to call Screen.draw_to_framebuffer().
         '''
+        return self.dispatch_events(self.gen_slot_events())
+
+    def dispatch_events(self, events):
+        r'''Sends events to the Touch_dispatcher.
+
+        Returns True if the Touch_dispatcher updated the Screen for any of the events.
+        '''
         change_done = False
-        for event in self.gen_slot_events():
-            change_done |= self.touch_dispatch.dispatch(event)
+        for event in events:
+            if self.touch_dispatch.dispatch(event):
+                change_done = True
+                if latency.Enabled:
+                    latency.note_input("touch", event.sec)
         return change_done
 
-    def gen_slot_events(self, ignore_syn_dropped=False):
+    def gen_slot_events(self):
         last_moves = {} # {slot: move_event}
+        events = self.device.events()
+        while True:
+            try:
+                yield from self.decode_events(events, last_moves)
+                break
+            except (Syn_dropped, libevdev.EventsDroppedException):
+                # libevdev discards the rest of the dropped frame and generates the events to
+                # get from its idea of the device state to the device's real state.
+                latency.count("syn_dropped")
+                if self.trace:
+                    print("gen_slot_events: SYN_DROPPED, resyncing")
+                yield from self.decode_events(self.device.sync(force=True), last_moves)
+                events = self.device.events()
+        assert self.slot is None, "gen_slot_events: expected slot is None on loop exit"
+        yield from last_moves.values()
+
+    def decode_events(self, events, last_moves):
+        r'''Generates the SlotEvents from libevdev events.
+
+        Moves are saved in last_moves, rather than generated, so that only the last move for each
+        slot is generated.
+
+        Raises Syn_dropped on SYN_DROPPED.
+        '''
         events_generated = 0
         events_skipped = 0
-        for event in self.device.events():
+        for event in events:
             # event attrs: type, code, value, sec, usec
             if event.code is None:
                 code = event.type.name
@@ -254,10 +483,10 @@ class Touch_generator:
             elif code == 'SYN_DROPPED':
                 if self.trace:
                     print("got event", code, event.value)
-                if not ignore_syn_dropped:
-                    raise Syn_dropped
+                raise Syn_dropped
             else:
                 if code == 'ABS_MT_TRACKING_ID':
+                    self.tracking_id = event.value
                     if event.value == -1:
                         self.action = 'release'
                     else:
@@ -278,10 +507,34 @@ class Touch_generator:
                 if self.slot is None:
                     self.slot = self.last_slot
                     self.sec = event.sec + event.usec / 1000000
-        assert self.slot is None, "gen_slot_events: expected slot is None on loop exit"
-        events_generated += len(last_moves)
-        yield from last_moves.values()
-        #print(f"gen_slot_events, {events_generated=}, {events_skipped=}")
+        #print(f"decode_events, {events_generated=}, {events_skipped=}")
+
+    def update_slot_state(self):
+        r'''Updates self.slot_states for the slot event being finished.
+
+        The device only sends the axes that have changed, so an axis that hasn't been sent for this
+        slot event keeps its last value for the slot.
+
+        Returns x, y in device coordinates, or None if the position isn't known.
+        '''
+        if self.action == 'release':
+            self.slot_states.pop(self.slot, None)
+            return None
+        state = self.slot_states.get(self.slot)
+        if state is None or self.action == 'touch':
+            if self.x is None:
+                print("!!!!!!!!! missing ABS_MT_POSITION_X")
+            if self.y is None:
+                print("!!!!!!!!! missing ABS_MT_POSITION_Y")
+            if self.x is None or self.y is None:
+                return None
+            self.slot_states[self.slot] = [self.tracking_id, self.x, self.y]
+            return self.x, self.y
+        if self.x is not None:
+            state[1] = self.x
+        if self.y is not None:
+            state[2] = self.y
+        return state[1], state[2]
 
     def get_slotevent(self):
         r'''Checks to see if SlotEvent is soup yet.
@@ -291,18 +544,17 @@ class Touch_generator:
         if self.slot is not None:
             if self.sec is None:
                 raise AssertionError("!!!!!!!!! missing sec: Internal Error!")
+            position = self.update_slot_state()
             if self.action == 'release':
                 slot_event = SlotEvent(self.slot, self.action, None, None, self.sec)
+            elif position is None:
+                slot_event = None
             else:
-                if self.x is None and self.action != 'release':
-                    print("!!!!!!!!! missing ABS_MT_POSITION_X")
-                if self.y is None and self.action != 'release':
-                    print("!!!!!!!!! missing ABS_MT_POSITION_Y")
                 slot_event = SlotEvent(self.slot, self.action,
-                                       int(round(self.x * self.x_scale)),
-                                       int(round(self.y * self.y_scale)),
+                                       int(round(position[0] * self.x_scale)),
+                                       int(round(position[1] * self.y_scale)),
                                        self.sec)
-            self.slot = self.sec = None
+            self.slot = self.sec = self.x = self.y = None
             self.action = 'move'
             if self.trace:
                 print(f"get_slotevent -> {slot_event=}")
@@ -312,11 +564,407 @@ class Touch_generator:
         return None
 
 
+class No_touch_generator(Touch_generator):
+    r'''Stands in for the Touch_generator when there is no touch device.
+
+    Nothing is read, but SlotEvents can still be sent to the Touch_dispatcher with dispatch_events.
+    '''
+    def __init__(self, width, height, touch_dispatch, trace=False):
+        if trace:
+            print(f"{self}.__init__")
+        self.x_scale = width / 32767
+        self.y_scale = height / 32767
+        self.trace = trace
+        self.slot_states = {}
+        self.touch_dispatch = touch_dispatch
+        self.reader = None
+        self.closed = False
+
+    def start_reader(self, queue_size=256):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def gen_slot_events(self):
+        return iter(())
 
 
+class Touch_reader:
+    r'''Runs a Touch_generator's read/decode loop on a background thread.
+
+    All of the decoding (the generator's slot, x, y, tracking_id state) is done on the reader thread.
+    Only the finished SlotEvents are handed to the main thread, through a bounded single producer,
+    single consumer ring (no locks, the reader thread only advances tail and the main thread only
+    advances head).  The reader wakes traffic_cop's select by writing to an eventfd registered there,
+    and the main thread then dispatches everything queued.
+
+    Moves are coalesced per slot, so only the latest move for each slot is dispatched.  The reader
+    does this for each batch of events it reads, before putting them in the ring.  The main thread
+    does it again for everything queued in the ring when it gets to it, in gen_slot_events.  Neither
+    lets a move get ahead of a touch or release of the same slot.
+
+    The SlotEvents keep the kernel's timestamps (sec), so latency's touch_to_photon still measures
+    from the actual touch.
+    '''
+    def __init__(self, generator, queue_size=256):
+        self.generator = generator
+        self.trace = generator.trace
+        self.ring = [SlotEvent(None, None, None, None, None) for _ in range(queue_size)]
+        self.head = 0               # next to dispatch, only advanced by the main thread
+        self.tail = 0               # next to fill, only advanced by the reader thread
+        self.wakeup_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        self.stop_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        self.stopping = False
+        traffic_cop.register_read(self.wakeup_fd, self.process_events)
+        self.thread = threading.Thread(target=self.run, name="Touch_reader", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        r'''Stops the reader thread.  Anything still queued is dropped.
+        '''
+        if self.trace:
+            print("Touch_reader.stop")
+        self.stopping = True
+        os.eventfd_write(self.stop_fd, 1)
+        self.thread.join()
+        traffic_cop.unregister_read(self.wakeup_fd)
+        os.close(self.wakeup_fd)
+        os.close(self.stop_fd)
+
+    def run(self):
+        r'''The reader thread.
+        '''
+        poll = select.poll()
+        poll.register(self.generator.device_fd, select.POLLIN)
+        poll.register(self.stop_fd, select.POLLIN)
+        pending_moves = {}      # {slot: SlotEvent}, only used by this thread
+        while True:
+            poll.poll()
+            if self.stopping:
+                break
+            queued = False
+            for event in self.generator.gen_slot_events():
+                # The generator may reuse its SlotEvents, so these are copied.
+                if event.action == 'move':
+                    pending_moves[event.slot] = \
+                      SlotEvent(event.slot, 'move', event.x, event.y, event.sec)
+                else:
+                    move = pending_moves.pop(event.slot, None)
+                    if move is not None:
+                        self.put(move)
+                    self.put(event)
+                queued = True
+            for move in pending_moves.values():
+                self.put(move)
+            pending_moves.clear()
+            if queued:
+                os.eventfd_write(self.wakeup_fd, 1)
+
+    def put(self, event):
+        r'''Called by the reader thread to add event to the ring.
+
+        Waits for room if the ring is full.
+        '''
+        ring = self.ring
+        while self.tail - self.head >= len(ring):
+            if self.stopping:
+                return
+            os.eventfd_write(self.wakeup_fd, 1)
+            time.sleep(0.001)
+        slot_event = ring[self.tail % len(ring)]
+        slot_event.slot = event.slot
+        slot_event.action = event.action
+        slot_event.x = event.x
+        slot_event.y = event.y
+        slot_event.sec = event.sec
+        self.tail += 1
+
+    def process_events(self, file):
+        r'''This is registered with the traffic_cop module as the read_fn for self.wakeup_fd.
+
+        Returns True if the Touch_dispatcher updated the Screen for any of the events.
+        '''
+        try:
+            os.eventfd_read(self.wakeup_fd)
+        except BlockingIOError:
+            pass
+        return self.generator.dispatch_events(self.gen_slot_events())
+
+    def gen_slot_events(self):
+        r'''Generates the SlotEvents queued by the reader thread, in order.
+
+        A move is skipped if there's a later move for the same slot queued, with no touch or release
+        of that slot in between.
+
+        The SlotEvents in the ring are reused once the caller asks for the next one.
+        '''
+        ring = self.ring
+        size = len(ring)
+        while self.head != self.tail:
+            tail = self.tail    # the reader only touches the ring past here
+            # find the moves to skip, going backwards
+            skip = set()
+            later_moves = set()   # slots with a later move
+            for i in range(tail - 1, self.head - 1, -1):
+                slot_event = ring[i % size]
+                if slot_event.action == 'move':
+                    if slot_event.slot in later_moves:
+                        skip.add(i)
+                    else:
+                        later_moves.add(slot_event.slot)
+                else:
+                    later_moves.discard(slot_event.slot)
+            while self.head < tail:
+                if self.head not in skip:
+                    yield ring[self.head % size]
+                self.head += 1
+
+
+def _IOC_READ(nr, size):
+    r'''Linux's _IOC(_IOC_READ, 'E', nr, size) for the evdev ioctls.
+    '''
+    return (2 << 30) | (size << 16) | (ord('E') << 8) | nr
+
+Absinfo_size = 6 * 4    # struct input_absinfo: value, minimum, maximum, fuzz, flat, resolution
+
+def EVIOCGABS(abs):
+    return _IOC_READ(0x40 + abs, Absinfo_size)
+
+def EVIOCGMTSLOTS(len):
+    return _IOC_READ(0x0a, len)
+
+
+class Raw_touch_generator(Touch_generator):
+    r'''Generates the same SlotEvents as Touch_generator without going through libevdev.
+
+    The struct input_events are read in bulk (with readinto) into a preallocated buffer and decoded
+    through memoryviews on that buffer, dispatching on the integer type and code.
+
+    The SlotEvents are reused!  Each slot has one SlotEvent for moves and another for touches and
+    releases.  So the caller must be done with each SlotEvent before getting the next one from
+    gen_slot_events.
+
+    On SYN_DROPPED, the rest of the dropped frame is discarded and the slot states are reread from
+    the device with the EVIOCGABS and EVIOCGMTSLOTS ioctls (see resync).
+    '''
+    def __init__(self, path, width, height, touch_dispatch, trace=False, buffer_events=64):
+        super().__init__(path, width, height, touch_dispatch, trace)
+        self.buffer = bytearray(Input_event.size * buffer_events)
+        buffer = memoryview(self.buffer)
+        self.longs = buffer.cast('l')     # time.tv_sec, time.tv_usec
+        self.shorts = buffer.cast('H')    # type, code
+        self.ints = buffer.cast('i')      # value
+        self.move_events = {}             # {slot: SlotEvent}
+        self.other_events = {}            # {slot: SlotEvent}
+
+        # for resync
+        self.mt_slots = array('i', bytes(4 * (self.num_slots + 1)))    # code, values[num_slots]
+        self.mt_slots_request = EVIOCGMTSLOTS(4 * (self.num_slots + 1))
+
+    def open_device(self, path):
+        r'''Opens the device at path, non-blocking, as self.device_fd and self.raw_fd (bypassing the
+        BufferedReader), and gets its num_slots (for resync).  Doesn't need libevdev.
+        '''
+        self.device_fd = open(path, "rb")
+        os.set_blocking(self.device_fd.fileno(), False)
+        self.raw_fd = self.device_fd.raw
+        self.absinfo = array('i', bytes(Absinfo_size))
+        fcntl.ioctl(self.raw_fd, EVIOCGABS(ABS_MT_SLOT), self.absinfo, True)
+        self.num_slots = self.absinfo[2] + 1               # maximum + 1
+
+    def gen_slot_events(self):
+        last_moves = {} # {slot: move_event}
+        longs, shorts, ints = self.longs, self.shorts, self.ints
+        long_stride = Input_event.size // Long_size
+        short_stride = Input_event.size // 2
+        int_stride = Input_event.size // 4
+        type_index = Long_size          # index in shorts of type after the two longs
+        value_index = Long_size // 2 + 1
+        dropping = False                # discarding the rest of a dropped frame
+        while True:
+            num_bytes = self.raw_fd.readinto(self.buffer)
+            if not num_bytes:      # None if no more input, 0 on EOF
+                break
+            for i in range(num_bytes // Input_event.size):
+                s = i * short_stride + type_index
+                type = shorts[s]
+                code = shorts[s + 1]
+                value = ints[i * int_stride + value_index]
+                if dropping:
+                    if type == EV_SYN and code == SYN_REPORT:
+                        dropping = False
+                        yield from self.gen_resync_events(last_moves)
+                    continue
+                if type == EV_ABS:
+                    if code == ABS_MT_POSITION_X:
+                        self.x = value
+                    elif code == ABS_MT_POSITION_Y:
+                        self.y = value
+                    elif code == ABS_MT_TRACKING_ID:
+                        self.tracking_id = value
+                        if value == -1:
+                            self.action = 'release'
+                        else:
+                            self.action = 'touch'
+                    elif code == ABS_MT_SLOT:
+                        if self.trace:
+                            print("got event ABS_MT_SLOT", value)
+                        slot_event = self.get_slotevent()
+                        if slot_event is not None:
+                            if slot_event.action == 'move':
+                                last_moves[slot_event.slot] = slot_event
+                            else:
+                                if slot_event.slot in last_moves:
+                                    yield last_moves.pop(slot_event.slot)
+                                yield slot_event
+                        self.last_slot = self.slot = value
+                        l = i * long_stride
+                        self.sec = longs[l] + longs[l + 1] / 1000000
+                        continue
+                    elif code == ABS_X or code == ABS_Y:
+                        continue
+                    else:
+                        print(f"!!!!!!!!! Unexpected code: EV_ABS {code:#x}")
+                        continue
+                    if self.trace:
+                        print(f"got event EV_ABS {code:#x}", value)
+                    if self.slot is None:
+                        self.slot = self.last_slot
+                        l = i * long_stride
+                        self.sec = longs[l] + longs[l + 1] / 1000000
+                elif type == EV_SYN:
+                    if code == SYN_REPORT:
+                        if self.trace:
+                            print("got event SYN_REPORT", value)
+                        if value != 0:
+                            print(f"Expected value == 0 on SYN_REPORT, got {value}")
+                        slot_event = self.get_slotevent()
+                        if slot_event is not None:
+                            if slot_event.action == 'move':
+                                last_moves[slot_event.slot] = slot_event
+                            else:
+                                if slot_event.slot in last_moves:
+                                    yield last_moves.pop(slot_event.slot)
+                                yield slot_event
+                    elif code == SYN_DROPPED:
+                        latency.count("syn_dropped")
+                        if self.trace:
+                            print("got event SYN_DROPPED, resyncing after next SYN_REPORT")
+                        # forget the partial slot event, resync will pick it up.
+                        self.slot = self.sec = self.x = self.y = None
+                        self.action = 'move'
+                        dropping = True
+                    else:
+                        print(f"!!!!!!!!! Unexpected code: EV_SYN {code:#x}")
+                elif (type == EV_KEY and code == BTN_TOUCH) or \
+                     (type == EV_MSC and code == MSC_TIMESTAMP):
+                    # ignore
+                    continue
+                else:
+                    print(f"!!!!!!!!! Unexpected event: type {type:#x}, code {code:#x}")
+        if dropping:
+            # never got the SYN_REPORT, resync now rather than waiting for more input.
+            yield from self.gen_resync_events(last_moves)
+        assert self.slot is None, "gen_slot_events: expected slot is None on loop exit"
+        yield from last_moves.values()
+
+    def gen_resync_events(self, last_moves):
+        r'''Generates the SlotEvents to get from self.slot_states to the device's current state.
+
+        Moves go into last_moves, like gen_slot_events.
+        '''
+        sec = time.time()
+        for slot, action, tracking_id, x, y in self.resync():
+            self.slot = slot
+            self.action = action
+            self.tracking_id = tracking_id
+            self.x = x
+            self.y = y
+            self.sec = sec
+            slot_event = self.get_slotevent()
+            if slot_event is not None:
+                if slot_event.action == 'move':
+                    last_moves[slot_event.slot] = slot_event
+                else:
+                    if slot_event.slot in last_moves:
+                        yield last_moves.pop(slot_event.slot)
+                    yield slot_event
+
+    def resync(self):
+        r'''Rereads the current slot states from the device.
+
+        Sets self.last_slot to the device's current slot.
+
+        Returns a list of (slot, action, tracking_id, x, y) for the changes from self.slot_states.
+        A slot whose tracking_id has changed gets a release followed by a touch.
+        '''
+        fcntl.ioctl(self.raw_fd, EVIOCGABS(ABS_MT_SLOT), self.absinfo, True)
+        self.last_slot = self.absinfo[0]
+        mt_slots = self.mt_slots
+        values = []
+        for code in ABS_MT_TRACKING_ID, ABS_MT_POSITION_X, ABS_MT_POSITION_Y:
+            mt_slots[0] = code
+            fcntl.ioctl(self.raw_fd, self.mt_slots_request, mt_slots, True)
+            values.append(mt_slots[1:])
+        tracking_ids, xs, ys = values
+        changes = []
+        for slot in range(self.num_slots):
+            tracking_id = tracking_ids[slot]
+            state = self.slot_states.get(slot)
+            if state is not None and state[0] != tracking_id:
+                changes.append((slot, 'release', -1, None, None))
+                state = None
+            if tracking_id != -1:
+                if state is None:
+                    changes.append((slot, 'touch', tracking_id, xs[slot], ys[slot]))
+                elif state[1] != xs[slot] or state[2] != ys[slot]:
+                    changes.append((slot, 'move', tracking_id, xs[slot], ys[slot]))
+        if self.trace:
+            print(f"resync: {self.last_slot=}, {changes=}")
+        return changes
+
+    def get_slotevent(self):
+        r'''Checks to see if SlotEvent is soup yet.
+
+        Returns the (reused) SlotEvent for self.slot and self.action, or None.
+        '''
+        if self.slot is not None:
+            if self.sec is None:
+                raise AssertionError("!!!!!!!!! missing sec: Internal Error!")
+            position = self.update_slot_state()
+            if self.action == 'move':
+                pool = self.move_events
+            else:
+                pool = self.other_events
+            slot_event = pool.get(self.slot)
+            if slot_event is None:
+                slot_event = pool[self.slot] = SlotEvent(self.slot, self.action, None, None, None)
+            slot_event.action = self.action
+            slot_event.sec = self.sec
+            if self.action == 'release':
+                slot_event.x = slot_event.y = None
+            elif position is None:
+                slot_event = None
+            else:
+                slot_event.x = int(round(position[0] * self.x_scale))
+                slot_event.y = int(round(position[1] * self.y_scale))
+            self.slot = self.sec = self.x = self.y = None
+            self.action = 'move'
+            if self.trace:
+                print(f"get_slotevent -> {slot_event=}")
+            return slot_event
+        if self.trace:
+            print("get_slotevent -> None")
+        return None
+
 if __name__ == "__main__":
     from collections import Counter
     import argparse
+    import doctest
+
+    # off the Pi: python headless.py touch_input.py
+    doctest.testmod()
 
     from alignment import *
     from shapes import *
@@ -14,19 +14,53 @@ unregister_write(file)
 
 Alarm functions are called with no arguments, and must return True if they've changed the Screen.
 
-set_alarm(delay, fn)     # delay in secs.
+set_alarm(delay, fn, period=None)  # delay in secs, returns an Alarm.  With period (secs), fn is
+                                   # called every period secs after that until cancelled.
+alarm.cancel()                     # fn will not be called (again)
+alarm.reschedule(delay)            # (re)start the alarm to go off delay secs from now
+
+Alarms may be set, cancelled or rescheduled from inside alarm functions (and read_fns/write_fns).
+
+Idle tasks are generators that are stepped (with next) when there's nothing else to do.  Each step
+should be short (a few mSec), and yield True if it changed the Screen.
+
+add_idle_task(task)      # steps task until it's exhausted
+finish_idle_task(task)   # runs the rest of task now
+
+While there are idle tasks, the run loop just polls for input, then runs steps for up to Idle_slice
+secs (or until the next alarm or present is due).  So a touch waits at most Idle_slice secs plus one
+step.
 
 stop()                   # causes run to terminate
 
 run(secs=None)           # runs for secs (forever if None), or until terminated by stop() or ^C
 
+set_frame_rate(fps)      # caps how often run draws the Screen to the framebuffer, None for no cap
+
+End of loop functions are called with no arguments once each time around the run loop, after the
+input, alarms and idle tasks have been handled.  E.g., midi_io registers its flush_output, so that
+the MIDI output sent by the read_fns, write_fns and alarm fns goes out together (see
+midi_io.send_midi_event).
+
+register_end_of_loop(fn)
+unregister_end_of_loop(fn)
+
+All of the Screen changes made by the read_fns, write_fns and alarm fns between presents are shown
+together in the next present.  Presents are never more than 1/fps secs apart while the Screen is
+changing.  Any input already waiting when a present is due is handled first, so that it makes it
+into that present.
+
+If latency.Enabled, run records how long each part of the loop takes (see latency.py).
+
 '''
 
 import time
 import selectors
-from operator import itemgetter
+import heapq
+from itertools import count
+from collections import deque
 import screen
-import midi_io
+import latency
 
 
 def get_time():
@@ -95,20 +129,303 @@ def unregister_write(file):
     else:
         Sel.unregister(file)
 
-Alarms = []  # reverse sorted list of (time, fn)
+Alarms = []          # heapq of [time, seq, Alarm]; next to fire is Alarms[0]
+Alarm_seq = count()  # tie breaker so that alarms set for the same time fire in the order set
+
+class Alarm:
+    r'''Handle returned by set_alarm.
+
+    Cancelling only marks the alarm's heap entry as dead.  Dead entries are discarded when they
+    reach the top of the Alarms heap.
+    '''
+    def __init__(self, fn, period=None):
+        self.fn = fn
+        self.period = period
+        self.entry = None     # [time, seq, self] while pending in Alarms, else None
+
+    def __repr__(self):
+        return f"<Alarm {getattr(self.fn, '__qualname__', self.fn)} pending={self.pending()}>"
+
+    def pending(self):
+        return self.entry is not None
+
+    def schedule_at(self, when):
+        self.cancel()
+        self.entry = [when, next(Alarm_seq), self]
+        heapq.heappush(Alarms, self.entry)
+
+    def reschedule(self, delay):
+        r'''Moves the alarm to delay secs from now.
+
+        Works whether the alarm is pending, has already fired or has been cancelled.
+        '''
+        self.schedule_at(get_time() + delay)
 
-def set_alarm(delay, fn):
-    r'''Set alarm to call fn() in delay secs.
+    def cancel(self):
+        r'''Cancels the alarm.  Does nothing if the alarm is not pending.
+        '''
+        if self.entry is not None:
+            self.entry[2] = None   # marks the heap entry as dead
+            self.entry = None
+
+def set_alarm(delay, fn, period=None):
+    r'''Set alarm to call fn() in delay secs.  Returns an Alarm handle.
 
     The fn is not passed any arguments, and must return True if it has changed the Screen's
     render_template.
 
-    Alarms can not be cancelled.
+    If period is not None, fn is called again every period secs until the Alarm is cancelled.
+    The periodic times are based on when the alarm was due, not when fn actually ran, so they
+    don't drift.  Periods that have already been missed are skipped, rather than run back to back.
+    '''
+    alarm = Alarm(fn, period)
+    alarm.reschedule(delay)
+    return alarm
+
+def next_alarm_time():
+    r'''Returns the time of the next pending alarm, or None.
+
+    Discards cancelled alarms at the top of the heap.
+    '''
+    while Alarms:
+        entry = Alarms[0]
+        if entry[2] is not None:
+            return entry[0]
+        heapq.heappop(Alarms)
+    return None
+
+def run_alarms(now):
+    r'''Calls all alarm fns due at now.
+
+    The due alarms are all taken off the heap before any fn is called.  So alarms set by these fns
+    are not run until the next call, even if they are already due.  This keeps an alarm that
+    resets itself with a 0 delay from locking up the run loop.
+
+    Returns True if any fn changed the screen.
+
+    With a fake get_time (the alarms only go through it, and run_alarms' now):
+
+        >>> import sys
+        >>> me = sys.modules[__name__]
+        >>> real_get_time, me.get_time = me.get_time, lambda: clock
+        >>> del Alarms[:]
+        >>> def fn(name, changed=False):
+        ...     def alarm_fn():
+        ...         print("ran", name, "at", clock)
+        ...         return changed
+        ...     return alarm_fn
+
+    Due alarms run in time order, and alarms due at the same time run in the order they were set:
+
+        >>> clock = 100
+        >>> a = set_alarm(5, fn("a"))
+        >>> b = set_alarm(5, fn("b", changed=True))
+        >>> c = set_alarm(3, fn("c"))
+        >>> next_alarm_time()
+        103
+        >>> run_alarms(102)
+        False
+        >>> clock = 105
+        >>> run_alarms(clock)
+        ran c at 105
+        ran a at 105
+        ran b at 105
+        True
+        >>> a.pending(), next_alarm_time()
+        (False, None)
+
+    Cancel:
+
+        >>> a = set_alarm(1, fn("a"))
+        >>> a.cancel()
+        >>> a.pending()
+        False
+        >>> clock = 110
+        >>> run_alarms(clock)
+        False
+        >>> next_alarm_time()
+
+    Reschedule, while pending and after it has fired:
+
+        >>> a = set_alarm(1, fn("a"))
+        >>> a.reschedule(5)
+        >>> run_alarms(112)
+        False
+        >>> clock = 115
+        >>> run_alarms(clock)
+        ran a at 115
+        False
+        >>> a.reschedule(1)
+        >>> a.pending(), next_alarm_time()
+        (True, 116)
+        >>> a.cancel()
+
+    Periodic, with the missed periods skipped:
+
+        >>> clock = 200
+        >>> p = set_alarm(1, fn("p"), period=2)
+        >>> clock = 201
+        >>> run_alarms(clock)
+        ran p at 201
+        False
+        >>> next_alarm_time()
+        203
+        >>> clock = 208
+        >>> run_alarms(clock)
+        ran p at 208
+        False
+        >>> next_alarm_time()
+        209
+        >>> p.cancel()
+        >>> next_alarm_time()
+
+    Cancelling inside a fn, another due alarm and a periodic alarm itself:
+
+        >>> clock = 300
+        >>> def cancel_b():
+        ...     print("cancelling b")
+        ...     b.cancel()
+        ...     return False
+        >>> a = set_alarm(1, cancel_b)
+        >>> b = set_alarm(1, fn("b"))
+        >>> def cancel_self():
+        ...     print("cancelling p")
+        ...     p.cancel()
+        ...     return False
+        >>> p = set_alarm(1, cancel_self, period=1)
+        >>> clock = 301
+        >>> run_alarms(clock)
+        cancelling b
+        cancelling p
+        False
+        >>> b.pending(), p.pending(), next_alarm_time()
+        (False, False, None)
+
+    An alarm that reschedules itself with 0 delay runs once per call:
+
+        >>> def again():
+        ...     print("again at", clock)
+        ...     r.reschedule(0)
+        ...     return False
+        >>> r = set_alarm(0, again)
+        >>> run_alarms(clock)
+        again at 301
+        False
+        >>> run_alarms(clock)
+        again at 301
+        False
+        >>> r.cancel()
+        >>> me.get_time = real_get_time
+    '''
+    due = []
+    while Alarms and Alarms[0][0] <= now:
+        entry = heapq.heappop(Alarms)
+        if entry[2] is not None:
+            due.append(entry)
+    screen_changed = False
+    for entry in due:
+        when, _, alarm = entry
+        if alarm is None:  # cancelled by an earlier fn in due
+            continue
+        alarm.entry = None
+        if alarm.period is not None:
+            next_time = when + alarm.period
+            if next_time <= now:
+                next_time += ((now - next_time) // alarm.period + 1) * alarm.period
+            alarm.schedule_at(next_time)
+        if latency.Enabled:
+            start_time = latency.now()
+            screen_changed |= alarm.fn()
+            latency.record_fn("alarm", alarm.fn, start_time)
+        else:
+            screen_changed |= alarm.fn()
+    return screen_changed
+
+Idle_tasks = deque()   # generators, see add_idle_task
+Idle_slice = 0.004     # max secs of idle task steps started per trip around the run loop
+
+def add_idle_task(task):
+    r'''Steps the generator, task, when the run loop has nothing else to do, until it's exhausted.
+
+    Each step should yield True if it changed the Screen.
+    '''
+    Idle_tasks.append(task)
+
+def finish_idle_task(task):
+    r'''Runs the rest of the steps of task now.
+
+    Returns True if any step changed the Screen.
+    '''
+    screen_changed = False
+    for step_changed in task:
+        screen_changed |= bool(step_changed)
+    if task in Idle_tasks:
+        Idle_tasks.remove(task)
+    return screen_changed
+
+def run_idle_tasks(deadline):
+    r'''Steps the first idle task until deadline.  Then it goes to the back of the line.
+
+    Returns True if any step changed the Screen.
+    '''
+    screen_changed = False
+    task = Idle_tasks[0]
+    try:
+        while True:
+            screen_changed |= bool(next(task))
+            if get_time() >= deadline:
+                Idle_tasks.rotate(-1)
+                break
+    except StopIteration:
+        Idle_tasks.popleft()
+    return screen_changed
+
+End_of_loop_fns = []
+
+def register_end_of_loop(fn):
+    r'''Registers fn to be called with no arguments at the end of each run loop iteration.
+    '''
+    End_of_loop_fns.append(fn)
+
+def unregister_end_of_loop(fn):
+    End_of_loop_fns.remove(fn)
 
-    Alarms are sorted next to fire last.
+def load_new_screen():
+    r'''Replaced by the application (e.g., exp_console) to switch screens between loop iterations.
+
+    Returns True if the screen was changed.
+    '''
+    return False
+
+Frame_interval = None   # min secs between presents, None for no limit
+Next_frame_time = 0     # earliest get_time() for the next present
+
+def set_frame_rate(fps):
+    r'''Caps presents (Screen.draw_to_framebuffer calls) done by run to fps per second.
+
+    None removes the cap, so that run presents after each loop iteration that changes the Screen.
+    Use this with Screen_class(vsync=True) to let the display's vsync do the pacing instead.
     '''
-    Alarms.append((get_time() + delay, fn))
-    Alarms.sort(reverse=True, key=itemgetter(0))
+    global Frame_interval
+    if fps is None:
+        Frame_interval = None
+    else:
+        Frame_interval = 1 / fps
+
+def present():
+    r'''Draws the Screen's render_texture to the framebuffer and sets Next_frame_time.
+    '''
+    global Next_frame_time
+    start_time = get_time()
+    if latency.Enabled:
+        lat_start_time = latency.now()
+        screen.Screen.draw_to_framebuffer()
+        latency.record("draw_to_framebuffer", lat_start_time)
+        latency.presented()
+    else:
+        screen.Screen.draw_to_framebuffer()
+    if Frame_interval is not None:
+        Next_frame_time = start_time + Frame_interval
 
 Stop = False
 
@@ -124,29 +441,80 @@ def run(secs=None):
 
     screen.Screen.Touch_generator.drain_events()
 
+    screen_changed = False  # since the last present
     while not Stop and (secs is None or get_time() < end):
-        screen_changed = False
         with screen.Screen.update(draw_to_framebuffer=False):
-            waketime = None
-            if Alarms:
-                waketime = Alarms[-1][0]
+            waketime = next_alarm_time()
+            if screen_changed and (waketime is None or waketime > Next_frame_time):
+                # Also covers a present that is already due, the select then just polls for any
+                # input that's already waiting.
+                waketime = Next_frame_time
             if secs is not None and (waketime is None or waketime > end):
                 waketime = end
-            for sk, event in Sel.select(waketime and waketime - get_time()):
-                if event & selectors.EVENT_READ:
-                    screen_changed |= sk.data[0](sk.fileobj)
-                if event & selectors.EVENT_WRITE:
-                    screen_changed |= sk.data[1](sk.fileobj)
-            while Alarms and get_time() >= Alarms[-1][0]:
-                fn = Alarms.pop()[1]
-                screen_changed |= fn()
-        if screen_changed:
-            screen.Screen.draw_to_framebuffer()
-        load_new_screen()
+            timeout = waketime and waketime - get_time()
+            if Idle_tasks:
+                timeout = 0   # just poll, the idle tasks take up the slack
+            if latency.Enabled:
+                screen_changed |= timed_select(timeout)
+            else:
+                for sk, event in Sel.select(timeout):
+                    if event & selectors.EVENT_READ:
+                        screen_changed |= sk.data[0](sk.fileobj)
+                    if event & selectors.EVENT_WRITE:
+                        screen_changed |= sk.data[1](sk.fileobj)
+            screen_changed |= run_alarms(get_time())
+            if Idle_tasks:
+                deadline = get_time() + Idle_slice
+                if waketime is not None and waketime < deadline:
+                    deadline = waketime
+                if latency.Enabled:
+                    start_time = latency.now()
+                    screen_changed |= run_idle_tasks(deadline)
+                    latency.record("idle_tasks", start_time)
+                else:
+                    screen_changed |= run_idle_tasks(deadline)
+            for fn in End_of_loop_fns:
+                fn()
+        if screen_changed and get_time() >= Next_frame_time:
+            present()
+            screen_changed = False
+        if latency.Enabled:
+            start_time = latency.now()
+            if load_new_screen():
+                screen_changed = False  # load_new_screen does its own present
+            latency.record("load_new_screen", start_time)
+        elif load_new_screen():
+            screen_changed = False  # load_new_screen does its own present
+    if screen_changed:
+        present()
+
+def timed_select(timeout):
+    r'''The select and dispatch part of run, with latency recording.
+
+    Returns True if the screen was changed.
+    '''
+    screen_changed = False
+    start_time = latency.now()
+    ready = Sel.select(timeout)
+    latency.record("select", start_time)
+    for sk, event in ready:
+        if event & selectors.EVENT_READ:
+            start_time = latency.now()
+            screen_changed |= sk.data[0](sk.fileobj)
+            latency.record_fn("read", sk.data[0], start_time)
+        if event & selectors.EVENT_WRITE:
+            start_time = latency.now()
+            screen_changed |= sk.data[1](sk.fileobj)
+            latency.record_fn("write", sk.data[1], start_time)
+    return screen_changed
 
 
 
 if __name__ == "__main__":
+    # off the Pi: python headless.py traffic_cop.py
+    import doctest
+    doctest.testmod()
+
     for name in "monotonic perf_counter process_time thread_time time".split():
         info = time.get_clock_info(name)
         print(f"{name=}: adj={info.adjustable}, impl={info.implementation}, "